@@ -0,0 +1,130 @@
+__author__ = 'Antares'
+
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
+import time
+
+
+class QuoteSnapshot(object):
+    """
+    quotes of many exchanges taken at (nearly) the same instant.
+
+    quotes, latency and received are keyed by (exchange name, symbol).
+    """
+
+    def __init__(self, time_stamp, quotes, latency, received, stale):
+        """
+
+        @param time_stamp: when the requests were sent (seconds since epoch)
+        @param quotes: {key: Quote} of the venues that answered before the deadline
+        @param latency: {key: seconds} round trip of every venue that answered
+        @param received: {key: seconds since epoch} when every answer arrived
+        @param stale: set of keys that did not answer in time or answered an empty Quote
+        @return:
+        """
+        self.time_stamp = time_stamp
+        self.quotes = quotes
+        self.latency = latency
+        self.received = received
+        self.stale = stale
+
+    @property
+    def skew(self) -> float:
+        """
+        @return: max difference (seconds) between the arrival times of the fresh quotes
+        """
+        if not self.received:
+            return 0.0
+        return max(self.received.values()) - min(self.received.values())
+
+    def is_complete(self) -> bool:
+        return not self.stale
+
+    def __repr__(self):
+        return "QuoteSnapshot(quotes={}, latency={}, skew={:.6f}, stale={})".format(
+            self.quotes, self.latency, self.skew, self.stale)
+
+
+class QuoteAggregator(object):
+    """
+    take quotes from many exchanges in parallel.
+
+    each exchange gets its own worker thread, so the skew between quotes is the spread of the round trips
+    instead of their sum. a venue still busy with a request from an earlier snapshot is not asked again,
+    it is reported stale until that request is done.
+    """
+
+    def __init__(self, exchanges, deadline=1.0):
+        """
+
+        @param exchanges: list of Exchange instances
+        @param deadline: max time (seconds) to wait for quotes. slow venues are marked stale.
+        @return:
+        """
+        self.exchanges = list(exchanges)
+        self.deadline = deadline
+
+        self.__executor = ThreadPoolExecutor(max_workers=max(len(self.exchanges), 1))
+        self.__in_flight = {}  # {key: Future}
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def key(exchange) -> tuple:
+        return exchange.name, exchange.symbol
+
+    def snapshot(self, deadline=None) -> QuoteSnapshot:
+        """
+        request quotes from all exchanges at once and wait until all answered or the deadline passed.
+
+        @param deadline: overrides self.deadline for this snapshot
+        @return: QuoteSnapshot
+        """
+        if deadline is None:
+            deadline = self.deadline
+
+        start = time.time()
+        stale = set()
+        futures = {}
+        with self.__lock:
+            for exchange in self.exchanges:
+                key = self.key(exchange)
+                previous = self.__in_flight.get(key)
+                if (previous is not None) and (not previous.done()):
+                    stale.add(key)  # still waiting for the last request, do not pile up another one
+                    continue
+                future = self.__executor.submit(self.__fetch, exchange, deadline)
+                self.__in_flight[key] = future
+                futures[key] = future
+
+        wait(futures.values(), timeout=max(deadline - (time.time() - start), 0))
+
+        quotes = {}
+        latency = {}
+        received = {}
+        for key, future in futures.items():
+            if (not future.done()) or (future.exception() is not None):
+                stale.add(key)
+                continue
+            quote, done = future.result()
+            if (quote is None) or (quote.bid is None) or (quote.ask is None):
+                stale.add(key)  # empty Quote: request failed
+                continue
+            quotes[key] = quote
+            latency[key] = done - start
+            received[key] = done
+
+        return QuoteSnapshot(start, quotes, latency, received, stale)
+
+    def close(self):
+        """
+        stop the worker threads. requests in flight are not waited for.
+        """
+        self.__executor.shutdown(wait=False)
+
+    @staticmethod
+    def __fetch(exchange, timeout):
+        """
+        @return: (Quote, time when the answer arrived)
+        """
+        quote = exchange.get_quote(timeout=timeout)
+        return quote, time.time()
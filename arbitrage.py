@@ -0,0 +1,289 @@
+__author__ = 'Antares'
+
+#  cross-venue arbitrage scanner.
+#
+#  the scanner keeps, per symbol, the latest quote of every venue and the fee-adjusted edge of every
+#  (buy venue, sell venue) pair: buy one unit at the ask of one venue, sell what is received at the bid of the
+#  other. fees follow the exchange classes: the fee is taken from what is received, so
+#
+#      edge = bid_sell * (1 - fee_buy) * (1 - fee_sell) / ask_buy - 1
+#
+#  a new quote of a venue only changes the row (the venue buys) and the column (the venue sells) of its symbol,
+#  so an update costs O(venues of the symbol), whatever the number of symbols.
+
+import threading
+
+from exchanges import currencies
+from fixed_point import FastQuote
+
+
+# symbols whose names do not split as 3 + 3 letters: {exchange symbol: canonical symbol}
+SYMBOL_ALIASES = {}
+
+
+def normalize_symbol(symbol) -> str:
+    """
+    @param symbol: trading symbol of any exchange, e.g. "ltc_usd" (BTCe) or "ltcusd" (Bitfinex)
+    @return: canonical symbol "asset_currency" in lower case, e.g. "ltc_usd"
+    """
+    if symbol in SYMBOL_ALIASES:
+        return SYMBOL_ALIASES[symbol]
+    return "{}_{}".format(*currencies(symbol.lower()))
+
+
+class Opportunity(object):
+    """
+    buy a symbol on one venue and sell it on another.
+    """
+
+    def __init__(self, symbol, buy_venue, sell_venue, ask, bid, edge, time_stamp):
+        """
+
+        @param symbol: canonical symbol (see normalize_symbol)
+        @param buy_venue: name of the exchange to buy on
+        @param sell_venue: name of the exchange to sell on
+        @param ask: ask of buy_venue
+        @param bid: bid of sell_venue
+        @param edge: return after fees of the round trip (0.01 for 1%)
+        @param time_stamp: time stamp of the older of both quotes
+        @return:
+        """
+        self.symbol = symbol
+        self.buy_venue = buy_venue
+        self.sell_venue = sell_venue
+        self.ask = ask
+        self.bid = bid
+        self.edge = edge
+        self.time_stamp = time_stamp
+
+    def __repr__(self):
+        return "Opportunity({}: buy {} at {}, sell {} at {}, edge={:.6f})".format(
+            self.symbol, self.buy_venue, self.ask, self.sell_venue, self.bid, self.edge)
+
+
+class _Market(object):
+    """
+    quotes and edge matrix of one symbol. venues get an index in the order they are first seen.
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.venues = []
+        self.index = {}
+        self.keep = []  # 1 - fee rate, per venue
+        self.quotes = []  # latest Quote, per venue. None if empty
+        self.sell = []  # bid * keep: currency received per unit of asset sold, per venue
+        self.buy = []  # keep / ask: asset received per unit of currency paid, per venue
+        self.edges = []  # edges[buy venue][sell venue]. None if a quote is missing
+
+    def add_venue(self, venue, fee_rate) -> int:
+        i = len(self.venues)
+        self.venues.append(venue)
+        self.index[venue] = i
+        self.keep.append(1.0 - float(fee_rate))
+        self.quotes.append(None)
+        self.sell.append(None)
+        self.buy.append(None)
+        for row in self.edges:
+            row.append(None)
+        self.edges.append([None] * (i + 1))
+        return i
+
+    def update(self, i, quote, bid, ask):
+        """
+        set the quote of venue i and recompute its row and column of the edge matrix.
+
+        @param bid: bid of quote as float. None for an empty quote
+        @param ask: ask of quote as float
+        """
+        if (bid is None) or (ask is None) or (ask <= 0):
+            self.quotes[i] = self.sell[i] = self.buy[i] = None
+        else:
+            self.quotes[i] = quote
+            self.sell[i] = bid * self.keep[i]
+            self.buy[i] = self.keep[i] / ask
+
+        sell, buy, edges = self.sell, self.buy, self.edges
+        sell_i, buy_i, row = sell[i], buy[i], edges[i]
+        for j in range(len(self.venues)):
+            if j == i:
+                continue
+            row[j] = None if (buy_i is None) or (sell[j] is None) else sell[j] * buy_i - 1.0
+            edges[j][i] = None if (sell_i is None) or (buy[j] is None) else sell_i * buy[j] - 1.0
+
+    def best(self) -> tuple:
+        """
+        the edge is sell[s] * buy[b] - 1 with s != b, so the best pair is made of the two best sellers and
+        the two best buyers: O(venues) instead of a scan of the matrix.
+
+        @return: (buy venue index, sell venue index) of the highest edge, or None if no pair is quoted
+        """
+        sellers = self.__top_two(self.sell)
+        buyers = self.__top_two(self.buy)
+        candidates = [(b, s) for b in buyers for s in sellers if b != s]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda pair: self.sell[pair[1]] * self.buy[pair[0]])
+
+    @staticmethod
+    def __top_two(values) -> list:
+        first = second = None
+        for i, value in enumerate(values):
+            if value is None:
+                continue
+            if (first is None) or (value > values[first]):
+                first, second = i, first
+            elif (second is None) or (value > values[second]):
+                second = i
+        return [i for i in (first, second) if i is not None]
+
+
+class ArbitrageScanner(object):
+    """
+    fee-adjusted spreads of every symbol across every pair of venues, updated one quote at a time.
+
+    quotes come from exchange quote listeners (see L{watch}), or are given to L{update} directly,
+    e.g. from a quote_board.QuoteBoard. symbols of different exchanges are matched by normalize_symbol.
+    listeners are called with the best Opportunity of a symbol whenever an update leaves it above min_edge.
+    """
+
+    def __init__(self, fee_rates=None, min_edge=0.0):
+        """
+
+        @param fee_rates: {venue: fee rate} or {(venue, canonical symbol): fee rate}, for quotes of venues
+        not watched through an exchange instance
+        @param min_edge: edge (0.01 for 1%) an opportunity must beat to be reported to listeners
+        @return:
+        """
+        self.fee_rates = dict(fee_rates or {})
+        self.min_edge = min_edge
+        self.listeners = []  # functions called with every Opportunity above min_edge
+
+        self.__markets = {}  # {canonical symbol: _Market}
+        self.__symbols = {}  # {exchange symbol: canonical symbol}
+        self.__lock = threading.Lock()
+
+        # metrics
+        self.updates = 0
+        self.reported = 0
+
+    def add_listener(self, listener):
+        """
+        @param listener: function called with an Opportunity
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def watch(self, exchange):
+        """
+        scan every quote exchange receives from now on, with its fee_rate.
+
+        @param exchange: Exchange instance
+        """
+        self.fee_rates[(exchange.name, self.__symbol(exchange.symbol))] = exchange.fee_rate
+        exchange.add_quote_listener(self.update)
+
+    def unwatch(self, exchange):
+        exchange.remove_quote_listener(self.update)
+
+    def update(self, quote):
+        """
+        take a new quote and recompute the edges of its venue for its symbol.
+
+        @param quote: util.Quote or fixed_point.FastQuote. a quote without bid or ask removes
+        its venue from its symbol.
+        @return: best Opportunity of the symbol, or None if fewer than two venues are quoted
+        @raise ValueError: if the fee rate of the venue is unknown
+        """
+        symbol = self.__symbol(quote.symbol)
+        if isinstance(quote, FastQuote):
+            quote = quote.to_quote()
+        if (quote.bid is None) or (quote.ask is None):
+            bid = ask = None
+        else:
+            bid, ask = float(quote.bid), float(quote.ask)
+
+        with self.__lock:
+            market = self.__markets.get(symbol)
+            if market is None:
+                market = self.__markets[symbol] = _Market(symbol)
+            i = market.index.get(quote.exchange)
+            if i is None:
+                i = market.add_venue(quote.exchange, self.__fee_rate(quote.exchange, symbol))
+            market.update(i, quote, bid, ask)
+            self.updates += 1
+            opportunity = self.__opportunity(market)
+
+        if (opportunity is not None) and (opportunity.edge > self.min_edge):
+            self.reported += 1
+            for listener in self.listeners:
+                listener(opportunity)
+        return opportunity
+
+    def best(self, symbol):
+        """
+        @param symbol: trading symbol of any exchange
+        @return: best Opportunity of the symbol, or None if fewer than two venues are quoted
+        """
+        with self.__lock:
+            market = self.__markets.get(self.__symbol(symbol))
+            return None if market is None else self.__opportunity(market)
+
+    def opportunities(self, min_edge=None) -> list:
+        """
+        @param min_edge: see __init__. None for self.min_edge
+        @return: best Opportunity of every symbol above min_edge, highest edge first
+        """
+        if min_edge is None:
+            min_edge = self.min_edge
+        with self.__lock:
+            found = [self.__opportunity(market) for market in self.__markets.values()]
+        found = [opportunity for opportunity in found if (opportunity is not None) and (opportunity.edge > min_edge)]
+        return sorted(found, key=lambda opportunity: opportunity.edge, reverse=True)
+
+    def edges(self, symbol) -> dict:
+        """
+        @param symbol: trading symbol of any exchange
+        @return: {(buy venue, sell venue): edge} of every pair of quoted venues of the symbol
+        """
+        with self.__lock:
+            market = self.__markets.get(self.__symbol(symbol))
+            if market is None:
+                return {}
+            return dict(((market.venues[b], market.venues[s]), edge)
+                        for b, row in enumerate(market.edges) for s, edge in enumerate(row) if edge is not None)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {"symbols": len(self.__markets),
+                    "quotes": sum(len(market.venues) for market in self.__markets.values()),
+                    "updates": self.updates,
+                    "reported": self.reported}
+
+    def __symbol(self, symbol) -> str:
+        canonical = self.__symbols.get(symbol)
+        if canonical is None:
+            canonical = self.__symbols[symbol] = normalize_symbol(symbol)
+        return canonical
+
+    def __fee_rate(self, venue, symbol):
+        if (venue, symbol) in self.fee_rates:
+            return self.fee_rates[(venue, symbol)]
+        if venue in self.fee_rates:
+            return self.fee_rates[venue]
+        raise ValueError("no fee rate for {} {}".format(venue, symbol))
+
+    @staticmethod
+    def __opportunity(market):
+        """
+        @return: Opportunity of the best pair of market, or None
+        """
+        pair = market.best()
+        if pair is None:
+            return None
+        b, s = pair
+        buy, sell = market.quotes[b], market.quotes[s]
+        return Opportunity(market.symbol, market.venues[b], market.venues[s], buy.ask, sell.bid,
+                           market.edges[b][s], min(buy.time_stamp, sell.time_stamp))
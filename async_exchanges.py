@@ -0,0 +1,714 @@
+__author__ = 'Antares'
+
+#  asyncio counterparts of the blocking Exchange classes in exchanges.py.
+#
+#  signing, parsing and order parameters come from BTCeBase and BitfinexBase, so the answers are
+#  exactly the same as the blocking classes. only the I/O differs: requests are sent over asyncio
+#  streams, so one event loop can poll many symbols and venues at once.
+
+from abc import ABCMeta, abstractmethod
+import asyncio
+import ssl
+import urllib.parse
+from decimal import Decimal
+
+from util import Quote
+from exchanges import BTCeBase, BitfinexBase, get_logger
+from retry import RetryPolicy, RetryError, NO_RETRY, PUBLIC, circuit_breaker_for
+from connection_pool import IDEMPOTENT_METHODS
+from rate_limiter import rate_limiter_for, ORDER, ACCOUNT, QUOTE, DEFAULT_MAX_WAITS
+
+
+# errors raised when a pooled keep-alive connection was silently closed by the server.
+STALE_CONNECTION_ERRORS = (ConnectionResetError,
+                           ConnectionAbortedError,
+                           BrokenPipeError,
+                           asyncio.IncompleteReadError)
+
+
+class AsyncConnectionPool(object):
+    """
+    keep-alive HTTPS connections to a single host over asyncio streams.
+
+    a minimal HTTP/1.1 client: enough for the JSON APIs of the exchanges
+    (Content-Length, chunked and read-until-close bodies).
+    """
+
+    def __init__(self, host, size=2, port=443, ssl_context=None):
+        """
+
+        @param host: host name of the server (e.g. "btc-e.com")
+        @param size: max number of idle connections kept open
+        @param port: port of the server
+        @param ssl_context: ssl.SSLContext. None for the default context.
+        @return:
+        """
+        self.host = host
+        self.size = size
+        self.port = port
+        self.ssl_context = ssl_context if ssl_context is not None else ssl.create_default_context()
+
+        self.__idle = []  # [(reader, writer)]
+
+        # metrics
+        self.handshakes = 0
+        self.requests = 0
+        self.reused = 0
+        self.reconnects = 0
+
+    async def request(self, method, url, body=b"", headers=None, timeout=None) -> bytes:
+        """
+        send a request over a pooled connection and return the raw response body.
+
+        @param method: HTTP method (e.g. "POST")
+        @param url: path of the request
+        @param body: request body
+        @param headers: request headers
+        @param timeout: timeout (seconds) of the whole request. None to wait forever.
+        @return: response body
+        """
+        written = False
+
+        async def send(conn):
+            nonlocal written
+            await self.__write(conn, method, url, body, headers)
+            written = True
+            return await self.__read(conn)
+
+        conn, reused = await self.__acquire(timeout)
+        try:
+            try:
+                response_body, will_close = await asyncio.wait_for(send(conn), timeout)
+            except STALE_CONNECTION_ERRORS:
+                # sent again only if the server cannot act on it twice, see connection_pool.IDEMPOTENT_METHODS
+                if (not reused) or (written and method not in IDEMPOTENT_METHODS):
+                    raise
+                # the server dropped the idle connection. reconnect and send again.
+                self.__close(conn)
+                self.reconnects += 1
+                self.reused -= 1  # this request ended up paying for a handshake
+                conn = await self.__connect(timeout)
+                response_body, will_close = await asyncio.wait_for(send(conn), timeout)
+        except BaseException:
+            self.__close(conn)
+            raise
+
+        if will_close or len(self.__idle) >= self.size:
+            self.__close(conn)
+        else:
+            self.__idle.append(conn)
+        return response_body
+
+    def stats(self) -> dict:
+        """
+        @return: a dict contains handshake count, request count and reuse ratio of this pool
+        """
+        return {"host": self.host,
+                "size": self.size,
+                "idle": len(self.__idle),
+                "handshakes": self.handshakes,
+                "requests": self.requests,
+                "reused": self.reused,
+                "reconnects": self.reconnects,
+                "reuse_ratio": self.reused / self.requests if self.requests else 0.0}
+
+    def close(self):
+        """
+        close all idle connections.
+        """
+        while self.__idle:
+            self.__close(self.__idle.pop())
+
+    async def __acquire(self, timeout=None):
+        """
+        @param timeout: timeout (seconds) of the handshake, if a new connection is needed
+        @return: ((reader, writer), True if the connection was reused)
+        """
+        self.requests += 1
+        while self.__idle:
+            conn = self.__idle.pop()  # most recently used connection first
+            if not conn[1].is_closing():
+                self.reused += 1
+                return conn, True
+        return await self.__connect(timeout), False
+
+    async def __connect(self, timeout=None):
+        conn = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=self.ssl_context), timeout)
+        self.handshakes += 1
+        return conn
+
+    @staticmethod
+    def __close(conn):
+        conn[1].close()
+
+    async def __write(self, conn, method, url, body, headers):
+        writer = conn[1]
+        if isinstance(body, str):
+            body = body.encode()
+
+        lines = ["{} {} HTTP/1.1".format(method, url),
+                 "Host: {}".format(self.host),
+                 "Content-Length: {}".format(len(body))]
+        for key, value in (headers or {}).items():
+            if isinstance(value, bytes):
+                value = value.decode()
+            lines.append("{}: {}".format(key, value))
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    @staticmethod
+    async def __read(conn):
+        """
+        @return: (response body, True if the server is going to close the connection)
+        """
+        reader = conn[0]
+
+        # status line and headers
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("remote end closed connection without response")
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            response_headers[key.strip().lower()] = value.strip()
+
+        will_close = (response_headers.get("connection", "").lower() == "close" or
+                      status_line.startswith(b"HTTP/1.0"))
+
+        # body
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # skip trailers
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)  # CRLF after each chunk
+            return b"".join(chunks), will_close
+        if "content-length" in response_headers:
+            return await reader.readexactly(int(response_headers["content-length"])), will_close
+        return await reader.read(), True  # body ends when the server closes the connection
+
+
+class AsyncExchange(object):
+    """
+    asyncio counterpart of exchanges.Exchange. every I/O method is a coroutine.
+    """
+    __metaclass__ = ABCMeta
+
+    retry_policy = None  # retry.RetryPolicy, set by subclass
+    circuit_breaker = None  # retry.CircuitBreaker of balances and orders, shared with the blocking class
+    quote_circuit_breaker = None  # retry.CircuitBreaker of quotes, shared with the blocking class
+    rate_limiter = None  # rate_limiter.RateLimiter of the host, shared with the blocking class. None: not limited
+    rate_limit_waits = DEFAULT_MAX_WAITS  # {priority: max time (seconds) to wait for a token}
+
+    async def _wait_for_rate_limit(self, priority) -> bool:
+        """
+        take a request token of self.rate_limiter without blocking the event loop. see exchanges.Exchange
+
+        @param priority: rate_limiter.ORDER, ACCOUNT or QUOTE
+        @return: False if no token could be taken in time
+        """
+        if self.rate_limiter is None:
+            return True
+        timeout = self.rate_limit_waits.get(priority)
+        if await self.rate_limiter.acquire_async(priority, timeout) is None:
+            self.logger.error("rate limit: no request token within %ss", timeout)
+            return False
+        return True
+
+    async def _retry(self, method, attempt, policy=None, breaker=None):
+        """
+        await attempt under a retry policy and a circuit breaker. see exchanges.Exchange._retry
+
+        @param method: name of the public method, for logs
+        @param attempt: coroutine function with no arguments, returns None if it failed
+        @param policy: retry.RetryPolicy. None for self.retry_policy
+        @param breaker: retry.CircuitBreaker. None for self.circuit_breaker
+        @return: the result of attempt
+        """
+        def on_retry(failures, reason):
+            self.logger.debug("%s() failed %s time(s): %s. retry", method, failures, reason)
+
+        policy = self.retry_policy if policy is None else policy
+        breaker = self.circuit_breaker if breaker is None else breaker
+        return await policy.run_async(attempt, breaker=breaker, on_retry=on_retry)
+
+    @abstractmethod
+    async def start(self):
+        """
+        Do the network initialization that the blocking classes do in __init__.
+        """
+        pass
+
+    @abstractmethod
+    async def get_authenticated_data(self, **kwargs):
+        """
+        Return the raw data from the server.
+        """
+        pass
+
+    @abstractmethod
+    async def get_unauthenticated_data(self, **kwargs):
+        """
+        Return the raw data from the server.
+        """
+        pass
+
+    @abstractmethod
+    async def get_quote(self, retry=False):
+        """
+        Return a Quote instance.
+        """
+        pass
+
+    @abstractmethod
+    async def get_balance(self):
+        """
+        Return a map contains new balance info.
+        """
+        pass
+
+    @abstractmethod
+    async def place_market_order(self, **kwargs):
+        """
+        Place a market order. Return a map contains new balance info.
+        """
+        pass
+
+    @abstractmethod
+    async def market_buy(self, **kwargs):
+        """
+        Place a market buy order. Return a map contains new balance info.
+        """
+        pass
+
+    @abstractmethod
+    async def market_sell(self, **kwargs):
+        """
+        Place a market sell order. Return a map contains new balance info.
+        """
+        pass
+
+    def close(self):
+        """
+        Close all idle connections of this instance.
+        """
+        self.connection_pool.close()
+
+
+class AsyncBTCe(BTCeBase, AsyncExchange):
+    """
+    asyncio client of BTCe. see exchanges.BTCe.
+
+    construction does B{NO} I/O. call (and await) L{start} before trading.
+    """
+
+    def __init__(self, api_key, secret, symbol, fee_rate, master_name=None, wait_time=1, pool_size=2,
+                 nonce_path=None):
+        """
+
+        @param api_key: API key
+        @param secret: API secret
+        @param symbol: trading symbol
+        @param fee_rate: fee rate (0.01 for 1%)
+        @param master_name: name of the master who created this instance. used to setup logger.
+        @param wait_time: how long to wait before retrying when fail to get nonce from BTCe
+        @param pool_size: max number of keep-alive connections kept open
+        @param nonce_path: file to persist nonces in, so that a restart skips the nonce discovery
+        @return:
+        """
+        self._set_credentials(api_key, secret, nonce_path)
+
+        # trade API and public API are served by the same host
+        self.connection_pool = AsyncConnectionPool(self._host, size=pool_size)
+
+        self.symbol = symbol
+        self.fee_rate = Decimal(fee_rate)
+        self.wait_time = wait_time
+        self.most_recent_quote = None
+        self.retry_policy = RetryPolicy()
+        self.circuit_breaker = circuit_breaker_for(self.name)
+        self.quote_circuit_breaker = circuit_breaker_for(self.name, PUBLIC)
+        self.rate_limiter = rate_limiter_for(self._host)
+        self.rate_limit_waits = dict(DEFAULT_MAX_WAITS)
+
+        # set up logger
+        self.logger = get_logger(self.name, master_name)
+
+    async def start(self):
+        """
+        initiate nonce and self.most_recent_quote. see exchanges.BTCe.__init__
+        """
+        while not self.nonce_allocator.known:
+            self.logger.debug("get nonce key from server")
+            answer = await self.get_authenticated_data(method=None, params={})
+            if self._set_nonce_from_error(answer):
+                break
+            await asyncio.sleep(self.wait_time)  # retry after wait_time (seconds)
+
+        self.logger.debug("initialize self.most_recent_quote")
+        self.most_recent_quote = await self.get_quote(retry=True)
+        self.logger.debug("set most_recent_quote: %s", self.most_recent_quote)
+
+    async def get_authenticated_data(self, method, params, timeout=None):
+        """
+        Get authenticated information from the exchange. B{NO retry}.
+
+        @param method: name of the API method. (e.g. "getInfo")
+        @param params: parameters for this API method {"key": <>}
+        @return:
+        """
+        if not await self._wait_for_rate_limit(ORDER if method in self._order_methods else ACCOUNT):
+            return None
+        query, headers = self._sign_request(method, params)  # after waiting, so nonces go out in order
+        try:
+            response = await self.connection_pool.request("POST", self._api_base, query, headers, timeout=timeout)
+            return self.decoder.loads(response)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            self.logger.error("get_authenticated_data() failure. Query: %s. Msg: %s", params, e,
+                              exc_info=False)
+            return None
+
+    async def get_unauthenticated_data(self, method, pair, timeout=None) -> dict:
+        """
+        Get public data from exchange. B{NO retry}.
+
+        @param method: name of the API method.
+        @param pair: trading symbol.
+        @return:
+        """
+        if not await self._wait_for_rate_limit(QUOTE):
+            return None
+        url = urllib.parse.urlsplit(self._public_api_base).path + "/{}/{}".format(method, pair)
+        try:
+            response = await self.connection_pool.request("GET", url, timeout=timeout)
+            return self.decoder.loads(response)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            self.logger.error("get_unauthenticated_data() failure. URL: /%s/%s. Msg: %s", method, pair, e,
+                              exc_info=False)
+            return None
+
+    async def get_quote(self, retry=False, timeout=None, sleep=None) -> Quote:
+        """
+        Get quote from BTCe.
+
+        @param retry: if fail to get quote, retry or not? retries back off as set by self.retry_policy
+        @param timeout:
+        @param sleep: max pause (seconds) after the first failure. None for self.retry_policy.base
+        @return: Quote, empty if it failed
+        """
+        async def attempt():
+            self.logger.debug("start getting quote")
+            answer = await self.get_unauthenticated_data("ticker", self.symbol, timeout=timeout)
+
+            # validate answer
+            quote = self._parse_quote(answer)
+            if quote is None:
+                self.logger.info("get_quote() failed. answer=%s", answer)
+                return None
+            self.logger.debug("successfully got quote: %s", quote)
+            return quote
+
+        if not retry:
+            policy = NO_RETRY
+        else:
+            policy = self.retry_policy if sleep is None else self.retry_policy.with_base(sleep)
+        try:
+            return await self._retry("get_quote", attempt, policy, self.quote_circuit_breaker)
+        except RetryError:
+            return Quote()  # return an empty Quote
+
+    async def get_balance(self) -> dict:
+        """
+        get current account balance.
+
+        this method will keep trying, with backoff, until a valid return has been received
+        or self.retry_policy gives up.
+
+        @return: a dict contains {'currency': Decimal('amount'), ..., 'time_stamp': Decimal('time_stamp')}
+        @raise RetryError: if self.retry_policy gave up
+        @raise FatalError: if BTCe answered with an error retrying will not fix
+        """
+        async def attempt():
+            self.logger.debug("get balance from server")
+            answer = await self.get_authenticated_data("getInfo", {})
+            self.logger.debug("receive balance answer: %s", answer)
+
+            funds = self._parse_balance(answer)
+            if funds is None:
+                self._raise_if_fatal(answer)
+                self._set_nonce_from_error(answer)
+                self.logger.warning("fail to get balance. answer received: %s", answer)
+            return funds
+
+        funds = await self._retry("get_balance", attempt)
+        self.logger.debug("new balance(get_balance): %s", funds)
+        return funds
+
+    async def place_market_order(self, params: dict) -> dict:
+        """
+        place a market order.
+
+        this method will keep trying, with backoff, until a valid return has been received
+        or self.retry_policy gives up.
+
+        @param params: order details
+        @return: new balance of account
+        @raise RetryError: if self.retry_policy gave up
+        @raise FatalError: if BTCe answered with an error retrying will not fix (e.g. not enough funds)
+        """
+        async def attempt():
+            answer = await self.get_authenticated_data("Trade", params)
+            self.logger.info("receive market order answer: %s", answer)
+
+            funds = self._parse_order(answer)
+            if funds is None:
+                self._raise_if_fatal(answer)
+                self._set_nonce_from_error(answer)
+                self.logger.critical("INVALID answer for order: %s. Place order again", answer)
+            return funds
+
+        funds = await self._retry("place_market_order", attempt)
+        self.logger.info("receive new balance(trade): %s", funds)
+        return funds
+
+    async def market_buy(self, amount) -> dict:
+        """
+        place a market BUY order. see exchanges.BTCeBase._market_buy_params
+
+        @param amount: the amount of asset to be B{RECEIVED}
+        @return new balance
+        """
+        params = self._market_buy_params(amount)
+        self.logger.info("place market BUY order w/ params: %s", params)
+        return await self.place_market_order(params)
+
+    async def market_sell(self, amount) -> dict:
+        """
+        place a market SELL order. see exchanges.BTCeBase._market_sell_params
+
+        @param amount: the amount of asset to be B{SOLD}
+        @return new balance
+        """
+        params = self._market_sell_params(amount)
+        self.logger.info("place market SELL order w/ params: %s", params)
+        return await self.place_market_order(params)
+
+
+class AsyncBitfinex(BitfinexBase, AsyncExchange):
+    """
+    asyncio client of Bitfinex. see exchanges.Bitfinex.
+    """
+
+    def __init__(self, api_key, secret, symbol, fee_rate, master_name=None, pool_size=2, poll_interval=0.2,
+                 order_max_wait=60.0):
+        """
+
+        @param api_key: API key
+        @param secret: API secret
+        @param symbol: trading symbol
+        @param fee_rate: fee_rate fee rate (0.01 for 1%)
+        @param master_name: name of the master who created this instance. used to setup logger.
+        @param pool_size: max number of keep-alive connections kept open
+        @param poll_interval: pause (seconds) between two order status checks
+        @param order_max_wait: max time (seconds) to wait for a market order to be filled
+        @return:
+        """
+        self._set_credentials(api_key, secret)
+
+        # authenticated API and public API are served by the same host
+        self.connection_pool = AsyncConnectionPool(self._host, size=pool_size)
+
+        self.symbol = symbol
+        self.fee_rate = Decimal(fee_rate)
+        self.poll_interval = poll_interval
+        self.order_max_wait = order_max_wait
+        self.retry_policy = RetryPolicy()
+        self.circuit_breaker = circuit_breaker_for(self.name)
+        self.quote_circuit_breaker = circuit_breaker_for(self.name, PUBLIC)
+        self.rate_limiter = rate_limiter_for(self._host)
+        self.rate_limit_waits = dict(DEFAULT_MAX_WAITS)
+
+        # set up logger
+        self.logger = get_logger(self.name, master_name)
+
+    async def start(self):
+        """
+        Bitfinex needs no initialization.
+        """
+        pass
+
+    async def get_authenticated_data(self, url, request, timeout=None):
+        """
+        Get authenticated information from the exchange. B{NO retry}.
+
+        @param url: target url of API. (e.g. "/balances")
+        @param request: request parameters for this API method {"key": <>}
+        @return:
+        """
+        if not await self._wait_for_rate_limit(ORDER if url in self._order_methods else ACCOUNT):
+            return None
+        headers = self._sign_request(url, request)
+        try:
+            response = await self.connection_pool.request("POST", self._api_base+url, "", headers, timeout=timeout)
+            return self.decoder.loads(response)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            self.logger.error("get_authenticated_data() failure. Query: %s. Msg: %s", request, e,
+                              exc_info=False)
+            return None
+
+    async def get_unauthenticated_data(self, url, symbol, timeout=None):
+        """
+        Get public data from exchange. NO retry.
+
+        @param url: target url of public API method
+        @param symbol: trading symbol
+        @return:
+        """
+        if not await self._wait_for_rate_limit(QUOTE):
+            return None
+        path = urllib.parse.urlsplit(self._public_api_base).path + "{}/{}".format(url, symbol)
+        try:
+            response = await self.connection_pool.request("GET", path, timeout=timeout)
+            return self.decoder.loads(response)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            self.logger.error("get_unauthenticated_data() failure. URL: /%s/%s. Msg: %s", url, symbol, e,
+                              exc_info=False)
+            return None
+
+    async def get_quote(self, retry=False, timeout=None, sleep=None) -> Quote:
+        """
+        Get quote from Bitfinex.
+
+        @param retry: if fail to get quote, retry or not? retries back off as set by self.retry_policy
+        @param sleep: max pause (seconds) after the first failure. None for self.retry_policy.base
+        @return: Quote, empty if it failed
+        """
+        async def attempt():
+            self.logger.debug("start getting quote")
+            answer = await self.get_unauthenticated_data("/pubticker", self.symbol, timeout=timeout)
+
+            # validate answer
+            quote = self._parse_quote(answer)
+            if quote is None:
+                self.logger.info("get_quote() failed. answer=%s", answer)
+                return None
+            self.logger.debug("successfully got quote: %s", quote)
+            return quote
+
+        if not retry:
+            policy = NO_RETRY
+        else:
+            policy = self.retry_policy if sleep is None else self.retry_policy.with_base(sleep)
+        try:
+            return await self._retry("get_quote", attempt, policy, self.quote_circuit_breaker)
+        except RetryError:
+            return Quote()  # return an empty Quote
+
+    async def get_balance(self, context="get_balance") -> dict:
+        """
+        get current account balance.
+
+        this method will keep trying, with backoff, until a valid return has been received
+        or self.retry_policy gives up.
+
+        @return: a dict contains {'currency': Decimal('amount'), ..., 'time_stamp': Decimal('time_stamp')}
+        @raise RetryError: if self.retry_policy gave up
+        @raise FatalError: if Bitfinex answered with an error retrying will not fix
+        """
+        async def attempt():
+            self.logger.debug("get balance from server")
+            answer = await self.get_authenticated_data("/balances", {})
+            self.logger.debug("receive balance answer: %s", answer)
+
+            funds = self._parse_balance(answer)
+            if funds is None:
+                self._raise_if_fatal(answer)
+                self.logger.warning("fail to get balance. answer received: %s", answer)
+            return funds
+
+        funds = await self._retry("get_balance", attempt)
+        self.logger.debug("new balance(%s): %s", context, funds)
+        return funds
+
+    async def place_market_order(self, params: dict):
+        """
+        place a market order, wait until it is no longer live and return the new balance.
+
+        the order status is checked every self.poll_interval seconds. other coroutines keep running meanwhile.
+        an order still live after self.order_max_wait seconds is given up on, as by exchanges.OrderTracker:
+        its last known status is logged and the balance returned as it is.
+
+        @param params: order details
+        @return: new balance of account
+        @raise RetryError: if self.retry_policy gave up placing the order
+        @raise FatalError: if Bitfinex answered with an error retrying will not fix (e.g. not enough balance)
+        """
+        async def attempt():
+            answer = await self.get_authenticated_data("/order/new", params)
+            self.logger.info("receive market order answer: %s", answer)
+
+            if self._is_order_accepted(answer):
+                return answer
+            self._raise_if_fatal(answer)
+            self.logger.critical("INVALID answer for order: %s. Place order again", answer)
+            return None
+
+        answer = await self._retry("place_market_order", attempt)
+
+        # check if order was filled completely
+        order_id = answer["order_id"]
+        order_status = answer
+        deadline = asyncio.get_running_loop().time() + self.order_max_wait
+        while self._is_order_live(order_status):
+            if asyncio.get_running_loop().time() > deadline:
+                self.logger.critical("Order was NOT filled in time. status = %s", order_status)
+                return await self.get_balance(context="place_market_order")
+            await asyncio.sleep(self.poll_interval)
+            status = await self.get_authenticated_data("/order/status", {"order_id": order_id})
+            if (status is not None) and ("is_live" in status):
+                order_status = status  # keep the last known status otherwise
+
+        # order was filled and no longer live
+        self.logger.info("market order was filled: %s", order_status)
+        return await self.get_balance(context="place_market_order")
+
+    async def market_buy(self, amount):
+        """
+        place a market BUY order.
+
+        @param amount:
+        @return:
+        """
+        params = self._market_order_params("buy", amount)
+        self.logger.info("place market BUY order w/ params: %s", params)
+        return await self.place_market_order(params)
+
+    async def market_sell(self, amount) -> dict:
+        """
+        place a market SELL order.
+
+        @param amount:
+        @return:
+        """
+        params = self._market_order_params("sell", amount)
+        self.logger.info("place market SELL order w/ params: %s", params)
+        return await self.place_market_order(params)
+
+
+async def gather_quotes(exchanges, timeout=None) -> list:
+    """
+    get quotes from many exchanges (symbols and venues) at once.
+
+    @param exchanges: list of started AsyncExchange instances
+    @param timeout: timeout (seconds) of every request
+    @return: list of Quote, in the same order as exchanges
+    """
+    return await asyncio.gather(*(exchange.get_quote(timeout=timeout) for exchange in exchanges))
@@ -0,0 +1,298 @@
+__author__ = 'Antares'
+
+#  backtesting of strategies written against the Exchange interface, on recorded ticks.
+#
+#  BacktestExchange replays ticks one get_quote() at a time and fills market orders at the current tick,
+#  so a strategy runs unchanged. mean_reversion_grid evaluates a whole parameter grid of one strategy
+#  over all ticks at once with NumPy, for sweeps too big to replay tick by tick.
+
+from decimal import Decimal
+
+try:
+    import numpy
+except ImportError:  # numpy is only needed by the vectorized grid
+    numpy = None
+
+from decoding import to_decimal
+from exchanges import Exchange, BTCe, get_logger, currencies
+from recorder import QuoteReader
+from retry import FatalError
+from util import Quote
+
+
+def load_ticks(path, exchange, symbol) -> tuple:
+    """
+    @param path: quote file written by recorder.QuoteRecorder
+    @param exchange: name of the exchange to pick
+    @param symbol: trading symbol to pick
+    @return: (bids, asks, time stamps) of the pair. NumPy float arrays if numpy is installed, lists of Decimal otherwise.
+    """
+    reader = QuoteReader(path)
+    if numpy is not None:
+        records = reader.array()
+        selected = records[(records["exchange"] == reader.exchanges.index(exchange)) &
+                           (records["symbol"] == reader.symbols.index(symbol))]
+        return (selected["bid"] / 10 ** reader.price_places,
+                selected["ask"] / 10 ** reader.price_places,
+                selected["time_stamp"] / 10 ** reader.time_places)
+    quotes = [quote for quote in reader if (quote.exchange == exchange) and (quote.symbol == symbol)]
+    return [quote.bid for quote in quotes], [quote.ask for quote in quotes], [quote.time_stamp for quote in quotes]
+
+
+class BacktestExchange(Exchange):
+    """
+    an exchange replaying historical ticks.
+
+    every get_quote() moves to the next tick; once the ticks are used up it returns an empty Quote,
+    like a failed request. market orders fill completely at the current tick: buys at the ask, sells at the bid.
+
+    fees follow the fee_rate semantics of the live classes: the fee is taken from what is received.
+    with adjust_buy_amount (BTCe), market_buy(amount) buys amount/(1-fee_rate), so that amount is received,
+    see exchanges.BTCeBase._market_buy_params.
+    """
+
+    def __init__(self, bids, asks, time_stamps, symbol, fee_rate, name="Backtest", balance=None,
+                 adjust_buy_amount=None, master_name=None):
+        """
+
+        @param bids: bid of every tick (any sequence of numbers, e.g. a NumPy array)
+        @param asks: ask of every tick
+        @param time_stamps: time stamp (seconds since epoch) of every tick
+        @param symbol: trading symbol
+        @param fee_rate: fee rate (0.01 for 1%)
+        @param name: name reported in quotes. use the name of the live exchange to backtest it.
+        @param balance: starting balance {currency: amount}. missing currencies start at 0.
+        @param adjust_buy_amount: see class doc. None for True if name is BTCe.
+        @param master_name: name of the master who created this instance. used to setup logger.
+        @return:
+        """
+        Exchange.__init__(self)
+        if not (len(bids) == len(asks) == len(time_stamps)):
+            raise ValueError("bids, asks and time stamps differ in length")
+        self.bids = bids
+        self.asks = asks
+        self.time_stamps = time_stamps
+        self.name = name
+        self.symbol = symbol
+        self.fee_rate = Decimal(fee_rate)
+        self.adjust_buy_amount = (name == BTCe.name) if adjust_buy_amount is None else adjust_buy_amount
+
+        self.asset, self.currency = currencies(symbol)
+        self.balance = {self.asset: Decimal(0), self.currency: Decimal(0)}
+        for key, value in (balance or {}).items():
+            self.balance[key] = Decimal(value)
+
+        self.logger = get_logger(self.name, master_name)
+        self.position = -1  # index of the current tick
+        self.trades = []  # (time stamp, side, amount traded, price, fee) of every fill
+
+    @classmethod
+    def from_recording(cls, path, exchange, symbol, fee_rate, **kwargs):
+        """
+        @param path: quote file written by recorder.QuoteRecorder
+        @param exchange: name of the exchange to replay. also the name of the BacktestExchange.
+        @param symbol: trading symbol to replay
+        @param fee_rate: fee rate (0.01 for 1%)
+        @param kwargs: see __init__
+        @return: BacktestExchange
+        """
+        bids, asks, time_stamps = load_ticks(path, exchange, symbol)
+        return cls(bids, asks, time_stamps, symbol, fee_rate, name=exchange, **kwargs)
+
+    def __len__(self):
+        return len(self.bids)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.position >= len(self) - 1
+
+    def get_authenticated_data(self, method, params, timeout=None):
+        return None  # nothing is behind a backtest
+
+    def get_unauthenticated_data(self, method, symbol, timeout=None):
+        return None
+
+    def get_quote(self, retry=False, timeout=None, sleep=None) -> Quote:
+        """
+        move to the next tick.
+
+        @return: Quote of the tick, or an empty Quote after the last tick
+        """
+        if self.exhausted:
+            return Quote()
+        self.position += 1
+        quote = self.current_quote()
+        self._publish_quote(quote)
+        return quote
+
+    def current_quote(self) -> Quote:
+        """
+        @return: Quote of the current tick (without moving)
+        """
+        i = self.position
+        return Quote(to_decimal(float(self.bids[i])),
+                     to_decimal(float(self.asks[i])),
+                     to_decimal(float(self.time_stamps[i])),
+                     self.name,
+                     self.symbol)
+
+    def get_balance(self) -> dict:
+        """
+        @return: a dict contains {'currency': Decimal('amount'), ..., 'time_stamp': Decimal('time_stamp')}
+        """
+        funds = dict(self.balance)
+        funds["time_stamp"] = to_decimal(float(self.time_stamps[max(self.position, 0)]))
+        return funds
+
+    def place_market_order(self, params: dict) -> dict:
+        """
+        fill a market order at the current tick.
+
+        @param params: {"type": "buy" or "sell", "amount": amount of asset ordered}
+        @return: new balance
+        @raise FatalError: if the balance does not cover the order, like the live exchanges answer
+        """
+        if self.position < 0:
+            raise RuntimeError("no tick yet: call get_quote() first")
+        amount = Decimal(params["amount"])
+        i = self.position
+        if params["type"] == "buy":
+            price = to_decimal(float(self.asks[i]))
+            cost = amount * price
+            if cost > self.balance[self.currency]:
+                raise FatalError("not enough {}: {} needed".format(self.currency, cost))
+            fee = amount * self.fee_rate
+            self.balance[self.currency] -= cost
+            self.balance[self.asset] += amount - fee
+        else:
+            price = to_decimal(float(self.bids[i]))
+            if amount > self.balance[self.asset]:
+                raise FatalError("not enough {}: {} needed".format(self.asset, amount))
+            fee = amount * price * self.fee_rate
+            self.balance[self.asset] -= amount
+            self.balance[self.currency] += amount * price - fee
+        self.trades.append((float(self.time_stamps[i]), params["type"], amount, price, fee))
+        return self.get_balance()
+
+    def market_buy(self, amount) -> dict:
+        """
+        @param amount: the amount of asset to be B{RECEIVED} with adjust_buy_amount, to be B{BOUGHT} otherwise
+        @return: new balance
+        """
+        amount = Decimal(amount)
+        if self.adjust_buy_amount:
+            amount = amount / (1 - self.fee_rate)
+        return self.place_market_order({"type": "buy", "amount": amount})
+
+    def market_sell(self, amount) -> dict:
+        """
+        @param amount: the amount of asset to be B{SOLD}
+        @return: new balance
+        """
+        return self.place_market_order({"type": "sell", "amount": Decimal(amount)})
+
+    def run(self, strategy):
+        """
+        feed every remaining tick to strategy.
+
+        @param strategy: function(exchange, quote) called once per tick
+        @return: final balance
+        """
+        while not self.exhausted:
+            strategy(self, self.get_quote())
+        return self.get_balance()
+
+
+def _moving_average(values, window, block=4096):
+    """
+    moving average from running sums, in O(len(values)).
+
+    a single cumsum over all values carries its rounding error, which grows with the sum, into every average.
+    here the sums restart every block ticks, from the first value of the block (re-anchoring),
+    so the error stays that of a sum of block + window small deviations, however long the series.
+
+    @param values: NumPy array
+    @param window: length of the average, from 1 to len(values)
+    @param block: averages computed per running sum
+    @return: NumPy array of the len(values) - window + 1 averages, the first one ending at values[window - 1]
+    """
+    if window == 1:  # exactly the values, so that they are never above or below their own average
+        return numpy.array(values, dtype=numpy.float64)
+    n = len(values)
+    averages = numpy.empty(n - window + 1)
+    step = max(block, window)
+    for end in range(window - 1, n, step):  # the block of averages ending at values[end:end + step]
+        stop = min(end + step, n)
+        segment = values[end - window + 1:stop]
+        anchor = segment[0]
+        sums = numpy.concatenate(([0.0], numpy.cumsum(segment - anchor)))
+        averages[end - window + 1:stop - window + 1] = (sums[window:] - sums[:-window]) / window + anchor
+    return averages
+
+
+def mean_reversion_grid(bids, asks, windows, thresholds, fee_rate, amount=1.0, adjust_buy_amount=False,
+                        chunk=16) -> dict:
+    """
+    evaluate a long-only mean reversion strategy for every (window, threshold) at once.
+
+    the strategy buys amount when the mid price falls below its moving average of window ticks by more than
+    threshold (0.01 for 1%), and sells everything held when the mid rises above it by more than threshold.
+    fills and fees follow BacktestExchange; a position still open after the last tick is sold at the last bid.
+    all ticks of all thresholds of a window are evaluated as arrays; chunk bounds the thresholds per pass
+    (memory is about len(bids) * chunk * 16 bytes).
+
+    @param bids: NumPy array of bids
+    @param asks: NumPy array of asks
+    @param windows: moving average lengths (ticks), each from 1 to len(bids)
+    @param thresholds: relative distances from the moving average
+    @param fee_rate: fee rate (0.01 for 1%)
+    @param amount: amount of every buy. see BacktestExchange.market_buy
+    @param adjust_buy_amount: see BacktestExchange
+    @param chunk: thresholds evaluated per pass
+    @return: {"pnl": profit in currency, "trades": number of fills}, both arrays of shape
+    (len(windows), len(thresholds))
+    @raise ValueError: if a window is out of range
+    """
+    if numpy is None:
+        raise ImportError("numpy is required for vectorized backtests")
+    bids = numpy.asarray(bids, dtype=numpy.float64)
+    asks = numpy.asarray(asks, dtype=numpy.float64)
+    thresholds = numpy.asarray(thresholds, dtype=numpy.float64)
+    fee_rate = float(fee_rate)
+    n = len(bids)
+    for window in windows:
+        if not 1 <= window <= n:
+            raise ValueError("window {} out of range [1, {}]".format(window, n))
+
+    # per buy: currency paid per unit of ask, and asset held afterwards
+    ordered = amount / (1 - fee_rate) if adjust_buy_amount else amount
+    held = ordered * (1 - fee_rate)
+
+    mid = (bids + asks) / 2
+    ticks = numpy.arange(n)[:, None]
+
+    pnl = numpy.zeros((len(windows), len(thresholds)))
+    trades = numpy.zeros((len(windows), len(thresholds)), dtype=numpy.int64)
+    for w, window in enumerate(windows):
+        average = numpy.full(n, numpy.nan)
+        average[window - 1:] = _moving_average(mid, window)
+
+        for start in range(0, len(thresholds), chunk):
+            k = thresholds[start:start + chunk][None, :]
+            # signal: 1 buy, 0 sell, -1 none. nan averages compare False: no signal before the window is full
+            signal = numpy.where(mid[:, None] < average[:, None] * (1 - k), 1,
+                                 numpy.where(mid[:, None] > average[:, None] * (1 + k), 0, -1)).astype(numpy.int8)
+            # position after every tick: the last signal so far (forward fill), flat before the first one
+            last = numpy.maximum.accumulate(numpy.where(signal >= 0, ticks, 0), axis=0)
+            position = numpy.take_along_axis(signal, last, axis=0)
+            position[position < 0] = 0
+            position[-1] = 0  # close at the last tick
+
+            change = numpy.diff(position, axis=0, prepend=numpy.zeros((1, position.shape[1]), dtype=numpy.int8))
+            buys = change == 1
+            sells = change == -1
+            cost = ordered * (asks[:, None] * buys).sum(axis=0)
+            proceeds = held * (1 - fee_rate) * (bids[:, None] * sells).sum(axis=0)
+            pnl[w, start:start + chunk] = proceeds - cost
+            trades[w, start:start + chunk] = buys.sum(axis=0) + sells.sum(axis=0)
+    return {"pnl": pnl, "trades": trades}
@@ -0,0 +1,291 @@
+__author__ = 'Antares'
+
+#  offline benchmarks of the exchange stack. run "python benchmark.py".
+
+import base64
+from decimal import Decimal
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import time
+import urllib.parse
+
+from arbitrage import ArbitrageScanner
+from decoding import Decoder, available_backends
+from log_queue import lean_records, start_queue_logging
+from simulated import SimulatedBTCe, SimulatedBitfinex
+from util import Quote
+
+
+def percentiles(samples, points=(50, 90, 99)) -> dict:
+    """
+    @param samples: list of numbers
+    @param points: percentiles to report
+    @return: {"p50": ..., "p90": ..., "p99": ..., "max": ...} (nearest-rank)
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {}
+    for point in points:
+        index = min(len(ordered) - 1, max(0, int(round(point / 100 * len(ordered))) - 1))
+        result["p{}".format(point)] = ordered[index]
+    result["max"] = ordered[-1]
+    return result
+
+
+def benchmark_quotes(exchange, n=1000) -> dict:
+    """
+    call get_quote() n times in a row.
+
+    @param exchange: Exchange instance
+    @param n: number of quotes
+    @return: {"quotes_per_sec": ..., "failed": ..., "latency": percentiles (seconds)}
+    """
+    latency = []
+    failed = 0
+    start = time.perf_counter()
+    for _ in range(n):
+        t = time.perf_counter()
+        quote = exchange.get_quote()
+        latency.append(time.perf_counter() - t)
+        if quote.bid is None:
+            failed += 1
+    elapsed = time.perf_counter() - start
+    return {"quotes_per_sec": n / elapsed, "failed": failed, "latency": percentiles(latency)}
+
+
+def benchmark_orders(exchange, n=100, amount=Decimal("0.1")) -> dict:
+    """
+    place n market orders, alternating buy and sell, and measure the round trip until the new balance is known.
+
+    @param exchange: Exchange instance
+    @param n: number of orders
+    @param amount: amount of every order
+    @return: {"orders_per_sec": ..., "round_trip": percentiles (seconds)}
+    """
+    round_trip = []
+    start = time.perf_counter()
+    for i in range(n):
+        t = time.perf_counter()
+        if i % 2 == 0:
+            exchange.market_buy(amount)
+        else:
+            exchange.market_sell(amount)
+        round_trip.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    return {"orders_per_sec": n / elapsed, "round_trip": percentiles(round_trip)}
+
+
+def benchmark_decoding(n=20000) -> dict:
+    """
+    decode and parse recorded ticker, balance and order answers n times each,
+    the old way (json.loads(bytes.decode())) and with every installed decoding backend.
+
+    @param n: number of answers per payload and decoder
+    @return: {payload: {decoder: seconds per answer}}
+    """
+    btce = SimulatedBTCe(master_name="benchmark", lazy=True)
+    bitfinex = SimulatedBitfinex(master_name="benchmark")
+    cases = [("BTCe ticker", btce.replay.payloads("ticker")[0], btce._parse_quote),
+             ("BTCe getInfo", btce.replay.payloads("getInfo")[0], btce._parse_balance),
+             ("BTCe Trade", btce.replay.payloads("Trade")[0], btce._parse_order),
+             ("Bitfinex /pubticker", bitfinex.replay.payloads("/pubticker")[0], bitfinex._parse_quote),
+             ("Bitfinex /balances", bitfinex.replay.payloads("/balances")[0], bitfinex._parse_balance),
+             ("Bitfinex /order/new", bitfinex.replay.payloads("/order/new")[0], bitfinex._is_order_accepted)]
+    decoders = [("json.loads(decode())", lambda data: json.loads(data.decode()))]
+    decoders += [(repr(decoder), decoder.loads) for decoder in
+                 [Decoder(backend) for backend in available_backends()] +
+                 [Decoder(backend, decimal=True) for backend in available_backends(decimal=True)]]
+
+    report = {}
+    for name, payload, parse in cases:
+        report[name] = {}
+        for decoder_name, loads in decoders:
+            start = time.perf_counter()
+            for _ in range(n):
+                parse(loads(payload))
+            report[name][decoder_name] = (time.perf_counter() - start) / n
+    return report
+
+
+def _sign_btce_per_request(api_key, secret, method, params, nonce) -> tuple:
+    """
+    BTCe signing as it was before the HMAC was precomputed: key schedule and headers on every request.
+    """
+    params.update({"method": method, "nonce": nonce})
+    query = urllib.parse.urlencode(params)
+    signature = hmac.new(key=secret.encode(), msg=query.encode(), digestmod=hashlib.sha512).hexdigest()
+    return query, {"key": api_key, "Sign": signature, "Content-type": "application/x-www-form-urlencoded"}
+
+
+def _sign_bitfinex_per_request(api_key, secret, url, request) -> dict:
+    """
+    Bitfinex signing as it was before the HMAC was precomputed: key schedule and full json.dumps on every request.
+    """
+    request.update({"request": "/v1" + url, "nonce": str(time.time())})
+    payload = base64.b64encode(json.dumps(request).encode())
+    signature = hmac.new(key=secret.encode(), msg=payload, digestmod=hashlib.sha384).hexdigest()
+    return {"X-BFX-APIKEY": api_key, "X-BFX-SIGNATURE": signature, "X-BFX-PAYLOAD": payload}
+
+
+def benchmark_signing(n=20000) -> dict:
+    """
+    sign n balance requests and n order requests per exchange, per request (the old way) and with
+    the precomputed HMAC of the exchange classes.
+
+    @param n: number of requests per case
+    @return: {case: {"per_request": seconds per signature, "precomputed": seconds per signature}}
+    """
+    api_key, secret = "K" * 64, "S" * 64
+    btce = SimulatedBTCe(master_name="benchmark", lazy=True, api_key=api_key, secret=secret)
+    btce.nonce_allocator.reset(0)
+    bitfinex = SimulatedBitfinex(master_name="benchmark", api_key=api_key, secret=secret)
+    btce_order = {"pair": "ltc_usd", "type": "buy", "rate": "6.000", "amount": "0.10020040"}
+    bitfinex_order = {"symbol": "ltcusd", "amount": "0.1", "price": "1.0", "exchange": "bitfinex",
+                      "side": "buy", "type": "exchange market"}
+    cases = [("BTCe getInfo", lambda: _sign_btce_per_request(api_key, secret, "getInfo", {}, 1),
+              lambda: btce._sign_request("getInfo", {})),
+             ("BTCe Trade", lambda: _sign_btce_per_request(api_key, secret, "Trade", dict(btce_order), 1),
+              lambda: btce._sign_request("Trade", btce_order)),
+             ("Bitfinex /balances", lambda: _sign_bitfinex_per_request(api_key, secret, "/balances", {}),
+              lambda: bitfinex._sign_request("/balances", {})),
+             ("Bitfinex /order/new",
+              lambda: _sign_bitfinex_per_request(api_key, secret, "/order/new", dict(bitfinex_order)),
+              lambda: bitfinex._sign_request("/order/new", bitfinex_order))]
+
+    report = {}
+    for name, per_request, precomputed in cases:
+        report[name] = {}
+        for variant, sign in (("per_request", per_request), ("precomputed", precomputed)):
+            start = time.perf_counter()
+            for _ in range(n):
+                sign()
+            report[name][variant] = (time.perf_counter() - start) / n
+    return report
+
+
+def benchmark_logging(n=20000) -> dict:
+    """
+    log a decoded balance answer n times per case and measure the time spent in the calling thread:
+    eager str.format and lazy %-style arguments with DEBUG off, a file handler written synchronously,
+    and the same handler behind start_queue_logging. in the last case the listener is let to write every
+    record before the next call, like on an order thread where log calls are far apart, and the time it
+    spends per record is reported as "queue_listener". "queue_handler_lean" adds lean_records().
+
+    @param n: number of calls per case
+    @return: {case: seconds per call}
+    """
+    bitfinex = SimulatedBitfinex(master_name="benchmark")
+    answer = bitfinex.decoder.loads(bitfinex.replay.payloads("/balances")[0])
+    logger = logging.getLogger("benchmark.logging")
+    logger.propagate = False
+
+    def run(log, settle=None) -> float:
+        elapsed = 0.0
+        for _ in range(n):
+            start = time.perf_counter()
+            log()
+            elapsed += time.perf_counter() - start
+            if settle is not None:
+                settle()
+        return elapsed / n
+
+    report = {}
+    logger.setLevel(logging.INFO)
+    report["eager_debug_off"] = run(lambda: logger.debug("receive balance answer: {}".format(answer)))
+    report["lazy_debug_off"] = run(lambda: logger.debug("receive balance answer: %s", answer))
+
+    logger.setLevel(logging.DEBUG)
+    handler = logging.FileHandler(os.devnull)
+    handler.setFormatter(logging.Formatter("{asctime}: {name}: {levelname}: {message}", style="{"))
+    logger.addHandler(handler)
+    report["sync_handler"] = run(lambda: logger.debug("receive balance answer: %s", answer))
+
+    listener = start_queue_logging(logger)
+    start = time.perf_counter()
+    report["queue_handler"] = run(lambda: logger.debug("receive balance answer: %s", answer), listener.queue.join)
+    report["queue_listener"] = (time.perf_counter() - start) / n - report["queue_handler"]
+
+    details = dict((key, getattr(logging, key, None)) for key in
+                   ("_srcfile", "logThreads", "logProcesses", "logMultiprocessing", "logAsyncioTasks"))
+    lean_records()
+    report["queue_handler_lean"] = run(lambda: logger.debug("receive balance answer: %s", answer),
+                                       listener.queue.join)
+    for key, value in details.items():
+        setattr(logging, key, value)
+    listener.stop()
+
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+    handler.close()
+    return report
+
+
+def benchmark_arbitrage(venues=30, symbols=300, n=20000) -> dict:
+    """
+    feed n random quotes to an ArbitrageScanner of venues x symbols, after one quote per venue and symbol.
+
+    @param venues: number of venues
+    @param symbols: number of symbols, all quoted by every venue
+    @param n: number of updates measured
+    @return: {"update": percentiles (seconds) of ArbitrageScanner.update}
+    """
+    rng = random.Random(0)
+    names = ["venue{}".format(i) for i in range(venues)]
+    pairs = ["s{:02d}usd".format(i) for i in range(symbols)]
+    scanner = ArbitrageScanner(fee_rates=dict((name, Decimal("0.002")) for name in names))
+
+    def quote(venue, symbol):
+        bid = Decimal(100 + rng.randrange(-100, 100)) / 100
+        return Quote(bid, bid + Decimal("0.02"), Decimal(time.time()), venue, symbol)
+
+    for venue in names:
+        for symbol in pairs:
+            scanner.update(quote(venue, symbol))
+    quotes = [quote(rng.choice(names), rng.choice(pairs)) for _ in range(n)]
+
+    latency = []
+    for q in quotes:
+        t = time.perf_counter()
+        scanner.update(q)
+        latency.append(time.perf_counter() - t)
+    return {"update": percentiles(latency)}
+
+
+def format_report(name, report, scale=1000, unit="ms") -> str:
+    """
+    @param name: title of the report
+    @param report: {key: value}. dict values are times in seconds
+    @param scale: factor converting seconds to unit
+    @param unit: unit of times
+    """
+    lines = [name]
+    for key, value in report.items():
+        if isinstance(value, dict):
+            value = ", ".join("{}={:.3f}{}".format(k, v * scale, unit) for k, v in value.items())
+        elif isinstance(value, float):
+            value = "{:.1f}".format(value)
+        lines.append("    {}: {}".format(key, value))
+    return "\n".join(lines)
+
+
+def main(latency=0.0, jitter=0.0, error_rate=0.0):
+    logging.getLogger("benchmark").addHandler(logging.NullHandler())  # keep injected errors off the report
+
+    exchanges = [SimulatedBTCe(master_name="benchmark", latency=latency, jitter=jitter, error_rate=error_rate),
+                 SimulatedBitfinex(master_name="benchmark", latency=latency, jitter=jitter, error_rate=error_rate)]
+    for exchange in exchanges:
+        print(format_report("{} get_quote".format(exchange.name), benchmark_quotes(exchange)))
+        print(format_report("{} market orders".format(exchange.name), benchmark_orders(exchange)))
+    print(format_report("decode + parse per answer", benchmark_decoding(), scale=1e6, unit="us"))
+    print(format_report("signing per request", benchmark_signing(), scale=1e6, unit="us"))
+    print(format_report("arbitrage scanner, 30 venues x 300 symbols", benchmark_arbitrage(), scale=1e6, unit="us"))
+    print(format_report("log call", {"per call": benchmark_logging()}, scale=1e6, unit="us"))
+
+
+if __name__ == "__main__":
+    main()
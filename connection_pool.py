@@ -0,0 +1,178 @@
+__author__ = 'Antares'
+
+import http.client
+import queue
+import threading
+import time
+
+from instrumentation import NULL_METRICS
+
+
+# errors raised when a pooled keep-alive connection was silently closed by the server.
+# a request that fails with one of these on a B{reused} connection is sent again on a fresh one,
+# if that cannot make the server act on it twice: see IDEMPOTENT_METHODS.
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected,
+                           http.client.CannotSendRequest,
+                           http.client.BadStatusLine,
+                           ConnectionResetError,
+                           ConnectionAbortedError,
+                           BrokenPipeError)
+
+# methods that can be sent again after the server may have received them. a POST (e.g. a trade
+# without nonce, as OKCoin's) is only sent again if it failed before it was completely written:
+# a server does not act on a request it has not received in full.
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS", "TRACE"))
+
+
+class ConnectionPool(object):
+    """
+    a thread-safe pool of reusable keep-alive HTTPS connections to a single host.
+
+    every new connection costs a full TCP and TLS handshake, so connections are kept open
+    and handed out again for following requests. a connection closed by the server while idle
+    is detected on use and replaced transparently.
+    """
+
+    def __init__(self, host, size=2, timeout=None, connection_class=http.client.HTTPSConnection):
+        """
+
+        @param host: host name of the server (e.g. "btc-e.com")
+        @param size: max number of idle connections kept open. extra connections are closed after use.
+        @param timeout: default socket timeout (seconds) for new connections
+        @param connection_class: class used to open new connections
+        @return:
+        """
+        self.host = host
+        self.size = size
+        self.timeout = timeout
+        self.connection_class = connection_class
+
+        self.__idle = queue.LifoQueue()  # most recently used connection first, it is least likely to be stale
+        self.__lock = threading.Lock()
+
+        # metrics
+        self.metrics = NULL_METRICS  # latency of new connections is reported as method "connect"
+        self.metrics_name = host
+        self.handshakes = 0
+        self.requests = 0
+        self.reused = 0
+        self.reconnects = 0
+
+    def request(self, method, url, body=None, headers=None, timeout=None) -> bytes:
+        """
+        send a request over a pooled connection and return the raw response body.
+
+        @param method: HTTP method (e.g. "POST")
+        @param url: path of the request
+        @param body: request body
+        @param headers: request headers
+        @param timeout: socket timeout (seconds) for this request. None to use the pool default.
+        @return: response body
+        """
+        conn, reused = self.__acquire(timeout)
+        written = False
+        try:
+            try:
+                self.__write(conn, method, url, body, headers, timeout)
+                written = True
+                response_body, will_close = self.__read(conn)
+            except STALE_CONNECTION_ERRORS:
+                if (not reused) or (written and method not in IDEMPOTENT_METHODS):
+                    raise
+                # the server dropped the idle connection. reconnect and send again.
+                conn.close()
+                with self.__lock:
+                    self.reconnects += 1
+                    self.reused -= 1  # this request ended up paying for a handshake
+                conn = self.__connect(timeout)
+                self.__write(conn, method, url, body, headers, timeout)
+                response_body, will_close = self.__read(conn)
+        except BaseException:
+            conn.close()
+            raise
+
+        if will_close:
+            conn.close()
+        else:
+            self.__release(conn)
+        return response_body
+
+    def stats(self) -> dict:
+        """
+        @return: a dict contains handshake count, request count and reuse ratio of this pool
+        """
+        with self.__lock:
+            return {"host": self.host,
+                    "size": self.size,
+                    "idle": self.__idle.qsize(),
+                    "handshakes": self.handshakes,
+                    "requests": self.requests,
+                    "reused": self.reused,
+                    "reconnects": self.reconnects,
+                    "reuse_ratio": self.reused / self.requests if self.requests else 0.0}
+
+    def close(self):
+        """
+        close all idle connections.
+        """
+        while True:
+            try:
+                self.__idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __acquire(self, timeout=None):
+        """
+        @param timeout: socket timeout (seconds) of a new connection. None to use the pool default.
+        @return: (connection, True if the connection was reused)
+        """
+        conn = None
+        while conn is None:
+            try:
+                conn = self.__idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn.sock is None:  # closed locally, drop it
+                conn = None
+
+        with self.__lock:
+            self.requests += 1
+            if conn is not None:
+                self.reused += 1
+
+        if conn is None:
+            return self.__connect(timeout), False
+        return conn, True
+
+    def __release(self, conn):
+        if self.__idle.qsize() >= self.size:
+            conn.close()
+        else:
+            self.__idle.put(conn)
+
+    def __connect(self, timeout=None):
+        """
+        @param timeout: socket timeout (seconds) bounding the DNS lookup, TCP and TLS handshakes as well as
+        the request. None to use the pool default.
+        """
+        conn = self.connection_class(self.host, timeout=self.timeout if timeout is None else timeout)
+        start = time.perf_counter()
+        conn.connect()  # DNS, TCP and TLS handshake now so that it is counted here instead of hidden in the first request
+        self.metrics.observe(self.metrics_name, "connect", time.perf_counter() - start)
+        with self.__lock:
+            self.handshakes += 1
+        return conn
+
+    def __write(self, conn, method, url, body, headers, timeout):
+        if conn.sock is not None:
+            conn.sock.settimeout(self.timeout if timeout is None else timeout)
+        conn.request(method, url, body, headers or {})
+
+    @staticmethod
+    def __read(conn):
+        """
+        @return: (response body, True if the server is going to close the connection)
+        """
+        with conn.getresponse() as response:
+            # the response must be read completely before the connection can be used again
+            return response.read(), response.will_close
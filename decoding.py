@@ -0,0 +1,95 @@
+__author__ = 'Antares'
+
+#  decoding of exchange answers.
+#
+#  answers arrive as bytes. the stdlib path json.loads(response.decode()) copies the whole body into a str
+#  before parsing it. the fast backends below parse bytes directly. they are optional: the first one installed
+#  is used, and the stdlib json module is the fallback.
+
+from decimal import Decimal
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
+
+
+# backend names, fastest first
+BACKENDS = ("orjson", "ujson", "simplejson", "json")
+# backends that can build Decimal instead of float from JSON numbers
+DECIMAL_BACKENDS = ("simplejson", "json")
+
+
+def available_backends(decimal=False) -> list:
+    """
+    @param decimal: only backends able to parse numbers into Decimal
+    @return: names of the installed backends, fastest first
+    """
+    modules = {"orjson": orjson, "ujson": ujson, "simplejson": simplejson, "json": json}
+    return [name for name in (DECIMAL_BACKENDS if decimal else BACKENDS) if modules[name] is not None]
+
+
+def to_decimal(value) -> Decimal:
+    """
+    @param value: a number of a decoded answer: Decimal (see Decoder(decimal=True)), str, int or float
+    @return: Decimal of value. floats are converted through their shortest repr, like Decimal(str(value)).
+    """
+    if type(value) is Decimal:
+        return value
+    return Decimal(value) if isinstance(value, (str, int)) else Decimal(str(value))
+
+
+class Decoder(object):
+    """
+    decode JSON answers from bytes with a chosen backend.
+
+    with decimal=True, JSON numbers with a fraction or exponent are parsed straight into Decimal,
+    so prices keep exactly the digits the exchange sent.
+    """
+
+    def __init__(self, backend=None, decimal=False):
+        """
+
+        @param backend: one of BACKENDS. None for the fastest installed one.
+        @param decimal: parse non-integer numbers into Decimal instead of float. see DECIMAL_BACKENDS
+        @return:
+        """
+        candidates = available_backends(decimal)
+        if backend is None:
+            backend = candidates[0]
+        elif backend not in candidates:
+            raise ValueError("JSON backend {} is not installed{}".format(
+                backend, " or cannot parse Decimal" if decimal else ""))
+        self.backend = backend
+        self.decimal = decimal
+
+        # self.loads(data): decode JSON bytes, raise ValueError if invalid
+        if backend == "orjson":
+            self.loads = orjson.loads  # bytes in, no intermediate str
+        elif backend == "ujson":
+            self.loads = ujson.loads
+        else:
+            # both decode bytes to str first anyway, and detecting the encoding of bytes costs more than that
+            module = simplejson if backend == "simplejson" else json
+            if decimal:
+                self.loads = lambda data: module.loads(data.decode(), parse_float=Decimal)
+            else:
+                self.loads = lambda data: module.loads(data.decode())
+
+    def __repr__(self):
+        return "Decoder({}, decimal={})".format(self.backend, self.decimal)
+
+
+# decoder of all exchange answers, unless an exchange is given another one
+default_decoder = Decoder()
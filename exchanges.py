@@ -3,27 +3,146 @@ __author__ = 'Antares'
 #  to install python packages, use "python -m pip install XXX"
 
 from abc import ABCMeta, abstractmethod
-import http.client
 from http.client import HTTPException
-import urllib.request
 import urllib.parse
 import json
 import hmac
 import base64
 import hashlib
+import threading
 import time
 from decimal import Decimal
+from concurrent.futures import Future
 import logging
 import sys
-import requests
-from requests import ConnectionError
 
 from util import Quote
+from fixed_point import FastQuote
+from connection_pool import ConnectionPool
+from nonce import NonceAllocator
+from order_book import OrderBook
+from instrumentation import NULL_METRICS
+from decoding import default_decoder, to_decimal
+from rate_limiter import rate_limiter_for, ORDER, ACCOUNT, QUOTE, DEFAULT_MAX_WAITS
+from order_tracker import OrderTracker
+from retry import RetryPolicy, RetryError, FatalError, NO_RETRY, PUBLIC, is_fatal, circuit_breaker_for
+
+
+class StaleQuoteError(Exception):
+    """
+    raised instead of pricing an order from a quote older than the exchange's max_quote_age, or from no quote.
+    """
+    pass
 
 
 class Exchange(object):
     __metaclass__ = ABCMeta
 
+    def __init__(self):
+        self.quote_listeners = []  # functions called with every new Quote received from the exchange
+        self.metrics = NULL_METRICS  # see instrumentation.Metrics
+        self.rate_limiter = None  # see rate_limiter.RateLimiter. None: not limited
+        self.rate_limit_waits = dict(DEFAULT_MAX_WAITS)  # {priority: max time (seconds) to wait for a token}
+        self.retry_policy = RetryPolicy()  # backoff of get_quote(retry=True), get_balance and place_market_order
+        self.circuit_breaker = None  # see retry.CircuitBreaker of balances and orders. None: always try
+        self.quote_circuit_breaker = None  # see retry.CircuitBreaker of quotes. None: always try
+        self.ledger = None  # see ledger.Ledger. balances from the exchange are recorded in it
+        self.__published = {}  # {symbol: (bid, ask, data time)} of the last quote given to the listeners
+
+    def add_quote_listener(self, listener):
+        """
+        @param listener: function called with every new (non-empty) Quote
+        """
+        self.quote_listeners.append(listener)
+
+    def remove_quote_listener(self, listener):
+        self.quote_listeners.remove(listener)
+
+    def _publish_quote(self, quote):
+        """
+        give quote to the quote listeners, unless it is the quote they got last for its symbol
+        (e.g. parsed again from a cached answer).
+
+        quotes are told apart by prices and the time of their data: quote.updated if the exchange
+        sends it (see L{BTCeBase._updated}), otherwise quote.time_stamp.
+        """
+        updated = getattr(quote, "updated", None)
+        state = (quote.bid, quote.ask, quote.time_stamp if updated is None else updated)
+        if self.__published.get(quote.symbol) == state:
+            return
+        self.__published[quote.symbol] = state
+        for listener in self.quote_listeners:
+            try:
+                listener(quote)
+            except Exception as e:  # a broken listener must not fail the request that got the quote
+                self.logger.error("quote listener %r failure. Msg: %s", listener, e, exc_info=True)
+
+    def _log_fields(self, method, latency=None) -> dict:
+        """
+        @param method: name of the method logging
+        @param latency: duration (seconds) of the request, if any
+        @return: extra={...} fields of a log record, see log_queue.StructuredFormatter
+        """
+        fields = {"venue": self.name, "symbol": self.symbol, "method": method}
+        if latency is not None:
+            fields["latency"] = round(latency, 6)
+        return fields
+
+    def _record_balance(self, funds):
+        """
+        @param funds: balance just received from the exchange
+        """
+        if self.ledger is not None:
+            self.ledger.set_balance(self.name, funds)
+
+    def _wait_for_rate_limit(self, priority) -> bool:
+        """
+        take a request token of self.rate_limiter, waiting for it at most self.rate_limit_waits[priority].
+
+        @param priority: rate_limiter.ORDER, ACCOUNT or QUOTE
+        @return: False if no token could be taken in time
+        """
+        if self.rate_limiter is None:
+            return True
+        timeout = self.rate_limit_waits.get(priority)
+        waited = self.rate_limiter.acquire(priority, timeout)
+        if waited is None:
+            self.metrics.count_error(self.name, "rate_limit")
+            self.logger.error("rate limit: no request token within %ss", timeout)
+            return False
+        self.metrics.observe(self.name, "rate_limit_wait", waited)
+        return True
+
+    def _quote_retry_policy(self, retry, sleep=None) -> RetryPolicy:
+        """
+        @param retry: see get_quote
+        @param sleep: see get_quote
+        @return: the retry.RetryPolicy of get_quote
+        """
+        if not retry:
+            return NO_RETRY
+        return self.retry_policy if sleep is None else self.retry_policy.with_base(sleep)
+
+    def _retry(self, method, attempt, policy=None, breaker=None):
+        """
+        run attempt under a retry policy and a circuit breaker, counting retries.
+
+        @param method: name of the public method, for metrics and logs
+        @param attempt: function with no arguments, returns None if it failed. see retry.RetryPolicy.run
+        @param policy: retry.RetryPolicy. None for self.retry_policy
+        @param breaker: retry.CircuitBreaker. None for self.circuit_breaker
+        @return: the result of attempt
+        @raise RetryError: if policy gave up
+        @raise FatalError: if the exchange answered with a fatal error
+        """
+        def on_retry(failures, reason):
+            self.metrics.count_retry(self.name, method)
+            self.logger.debug("%s() failed %s time(s): %s. retry", method, failures, reason)
+
+        policy = self.retry_policy if policy is None else policy
+        breaker = self.circuit_breaker if breaker is None else breaker
+        return policy.run(attempt, breaker=breaker, on_retry=on_retry)
+
     @abstractmethod
     def get_authenticated_data(self, **kwargs):
         """
@@ -74,20 +193,76 @@ class Exchange(object):
         pass
 
 
-class BTCe(Exchange):
+def get_logger(name, master_name=None):
     """
-    the BTCe class is a communication module to the exchange BTCe (https://btc-e.com).
+    set up the logger of an exchange instance.
 
-    returns of all the public methods are B{STANDARDIZED}, so that the code of the main
-    system does not have to change when it's trading between different exchanges.
+    @param name: name of the exchange
+    @param master_name: name of the master who created this instance.
+    if not given (usually while developing), log DEBUG messages to stdout.
+    @return: logging.Logger
     """
-    name = "BTCe"
+    if master_name is not None:
+        return logging.getLogger("{}.{}".format(master_name, name))
+
+    # master name is not given (usually while developing)
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    formatter = logging.Formatter("{asctime}: {name}: {levelname}: {message}", style="{")
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    stream_handler.setLevel(logging.DEBUG)
+    logger.addHandler(stream_handler)
+    return logger
 
-    __host = "btc-e.com"
-    __api_base = "/tapi"
-    __public_api_base = "https://btc-e.com/api/3"
 
-    def __init__(self, api_key, secret, symbol, fee_rate, master_name=None, wait_time=1):
+def currencies(symbol) -> tuple:
+    """
+    @param symbol: trading symbol, "ltc_usd" (BTCe) or "ltcusd" (Bitfinex)
+    @return: (asset, currency), e.g. ("ltc", "usd")
+    """
+    if "_" in symbol:
+        asset, currency = symbol.split("_")
+        return asset, currency
+    return symbol[:3], symbol[3:]
+
+
+class RestExchange(Exchange, metaclass=ABCMeta):
+    """
+    generic core of the REST exchanges: pooled transport, signing hooks, answer parsing and retry.
+
+    a venue is configured by class attributes (hosts, API paths, method names, answer fields, fatal errors)
+    and implements the abstract hooks below (_signed_request, _parse_balance, ...). the rest is shared: keep-alive
+    connections for both the authenticated and the public API, rate limiting, circuit breaking, retries with
+    backoff, decoding, metrics, quote caching and quote listeners. so every venue takes the same I/O path.
+
+    returns of all the public methods are B{STANDARDIZED}, so that the code of the main
+    system does not have to change when it's trading between different exchanges.
+    """
+    name = None
+
+    _host = None  # host of the authenticated API
+    _api_base = ""  # path of the authenticated API
+    _public_api_base = None  # URL of the public API (e.g. "https://btc-e.com/api/3")
+
+    _ticker_method = None  # public method answering quotes
+    _depth_method = None  # public method answering the order book. None if not supported
+    _balance_method = None  # authenticated method answering the balance
+    _order_methods = ()  # authenticated methods placing orders. the first one is the default, see _order_method
+    _fatal_errors = ()  # lower case substrings of error messages that will not get better by retrying
+
+    # fields of the answers read by the default _parse_quote, _parse_fast_quote and _parse_depth
+    _ticker_field = None  # key of the ticker in the answer of _ticker_method. None: the answer is the ticker
+    _bid_field = "bid"  # key of the highest bid in the ticker
+    _ask_field = "ask"  # key of the lowest ask in the ticker
+    _bids_field = "bids"  # key of the bids, [[price, amount], ...], in the answer of _depth_method
+    _asks_field = "asks"  # key of the asks in the answer of _depth_method
+
+    decoder = default_decoder  # decoding.Decoder of all answers
+    order_book = None  # order_book.OrderBook of self.symbol, once update_order_book() was called
+
+    def __init__(self, api_key, secret, symbol, fee_rate, master_name=None, pool_size=2, quote_cache=None,
+                 ledger=None):
         """
 
         @param api_key: API key
@@ -95,508 +270,1415 @@ class BTCe(Exchange):
         @param symbol: trading symbol
         @param fee_rate: fee rate (0.01 for 1%)
         @param master_name: name of the master who created this instance. used to setup logger.
-        @param wait_time: how long to wait before retrying when fail to get nonce from BTCe
+        @param pool_size: max number of keep-alive connections kept open per API (authenticated and public)
+        @param quote_cache: quote_cache.QuoteCache shared with other instances. None to always request.
+        @param ledger: ledger.Ledger to record balances in
         @return:
         """
         Exchange.__init__(self)
+        self._set_credentials(api_key, secret)
+        self._setup(symbol, fee_rate, master_name, pool_size, quote_cache, ledger)
 
-        self.__api_key = api_key
-        self.__secret = secret
+    def _setup(self, symbol, fee_rate, master_name=None, pool_size=2, quote_cache=None, ledger=None):
+        """
+        everything of __init__ but the credentials. see __init__ for the parameters.
+        """
+        # keep-alive connections. see self.connection_pool.stats() and self.public_pool.stats() for metrics
+        self.connection_pool = ConnectionPool(self._host, size=pool_size)
+        public = urllib.parse.urlsplit(self._public_api_base)
+        self.public_pool = ConnectionPool(public.netloc, size=pool_size)
+        self.__public_path = public.path
+        # shared by all instances talking to the same host. see self.rate_limiter.stats() for queue depths
+        self.rate_limiter = rate_limiter_for(self._host)
+        self.circuit_breaker = circuit_breaker_for(self.name)
+        self.quote_circuit_breaker = circuit_breaker_for(self.name, PUBLIC)
 
         self.symbol = symbol
         self.fee_rate = Decimal(fee_rate)
-
-        self.__nonce = None
+        self.quote_cache = quote_cache
+        self.ledger = ledger
 
         # set up logger
-        if master_name is not None:
-            self.logger = logging.getLogger("{}.{}".format(master_name, self.name))
-        else:
-            # master name is not given (usually while developing)
-            self.logger = logging.getLogger(self.name)
-            self.logger.setLevel(logging.DEBUG)
-            formatter = logging.Formatter("{asctime}: {name}: {levelname}: {message}", style="{")
-            stream_handler = logging.StreamHandler(sys.stdout)
-            stream_handler.setFormatter(formatter)
-            stream_handler.setLevel(logging.DEBUG)
-            self.logger.addHandler(stream_handler)
-
-        # initiate nonce
-        while True:
-            self.logger.debug("get nonce key from server")
-            answer = self.get_authenticated_data(method=None, params={})
-            if (answer is not None) and ("error" in answer):
-                # get valid nonce from error message
-                print(answer)
-                error_info = answer["error"].split(";")[1].strip()
-                error_dict = dict((k.strip(), v.strip()) for k, v in (p.split(":") for p in error_info.split(",")))
-                self.__nonce = int(error_dict["on key"])
-                self.logger.debug("set nonce key to {}".format(self.__nonce))
-                break
-            time.sleep(wait_time)  # retry after wait_time (seconds)
-
-        # initialize self.most_recent_quote
-            # BTCe B{DO NOT} have market orders. To mimic market order,
-            # order price will be set based on most recent quote.
-        self.logger.debug("initialize self.most_recent_quote")
-        self.most_recent_quote = self.get_quote(retry=True)
-        self.logger.debug("set most_recent_quote: {}".format(self.most_recent_quote))
+        self.logger = get_logger(self.name, master_name)
 
-    def get_authenticated_data(self, method, params, timeout=None):
+    # hooks of the venues
+
+    @abstractmethod
+    def _set_credentials(self, api_key, secret):
         """
-        Get authenticated information from the exchange. B{NO retry}.
+        keep what signing needs. precompute what does not change between requests.
+        """
+        pass
 
-        BTCe Trade API v1 U{https://btc-e.com/tapi/docs#main}
+    @abstractmethod
+    def _signed_request(self, method, params) -> tuple:
+        """
+        @param method: authenticated API method
+        @param params: parameters of the method
+        @return: (path, body, headers) of the signed POST request
+        """
+        pass
 
-        @param method: name of the API method. (e.g. "getInfo")
-        @param params: parameters for this API method {"key": <>}
-        @return:
+    def _public_path(self, method, symbol) -> str:
         """
+        @return: path of a public request, after the path of _public_api_base
+        """
+        return "/{}/{}".format(method, symbol)
 
-        # get nonce
-        if self.__nonce is not None:
-            self.__nonce += 1
-        nonce = self.__nonce
+    def _ticker(self, answer):
+        """
+        @param answer: answer of _ticker_method
+        @return: the ticker in answer (see _ticker_field), or None if answer is invalid
+        """
+        if answer is None:
+            return None
+        if self._ticker_field is not None:
+            answer = answer.get(self._ticker_field)
+        if (not isinstance(answer, dict)) or (self._bid_field not in answer) or (self._ask_field not in answer):
+            return None
+        return answer
 
-        # prepare components
-        params.update({"method": method, "nonce": nonce})
-        query = urllib.parse.urlencode(params)
-        signature = hmac.new(key=self.__secret.encode(),
-                             msg=query.encode(),
-                             digestmod=hashlib.sha512).hexdigest()
-        headers = {"key": self.__api_key,
-                   "Sign": signature,
-                   "Content-type": "application/x-www-form-urlencoded"}
+    def _parse_quote(self, answer):
+        """
+        the venues answering no time stamp, the time stamp is local time.
 
-        # connect exchange
-        conn = None
-        try:
-            conn = http.client.HTTPSConnection(self.__host, timeout=timeout)
-            conn.request("POST", self.__api_base, query, headers)
-            with conn.getresponse() as response:
-                return json.loads(response.read().decode())
-        except OSError as e:
-            self.logger.error("get_authenticated_data() failure. Query: {}. Msg: {}".format(params, e),
-                              exc_info=False)
+        @param answer: answer of _ticker_method
+        @return: Quote, or None if answer is invalid
+        """
+        info = self._ticker(answer)
+        if info is None:
             return None
-        finally:
-            if conn is not None:
-                conn.close()
 
-    def get_unauthenticated_data(self, method, pair, timeout=None) -> dict:
+        return Quote(to_decimal(info[self._bid_field]),
+                     to_decimal(info[self._ask_field]),
+                     Decimal(str(time.time())),
+                     self.name,
+                     self.symbol)
+
+    def _parse_fast_quote(self, answer):
+        """
+        @param answer: answer of _ticker_method
+        @return: fixed_point.FastQuote, or None if answer is invalid
         """
-        Get public data from exchange. B{NO retry}.
+        info = self._ticker(answer)
+        if info is None:
+            return None
 
-        BTCe Public API v3 U{https://btc-e.com/api/3/docs}
-        "All information is cached every 2 seconds, so there's no point in making more frequent requests."
+        return FastQuote.from_prices(info[self._bid_field], info[self._ask_field], self.name, self.symbol)
 
-        @param method: name of the API method.
-        @param pair: trading symbol.
-        @return:
+    def _parse_depth(self, answer):
+        """
+        @param answer: answer of _depth_method
+        @return: (bids, asks) lists of (Decimal price, Decimal amount), or None if answer is invalid
+        """
+        if (answer is None) or (self._bids_field not in answer) or (self._asks_field not in answer):
+            return None
+
+        return ([(to_decimal(price), to_decimal(amount)) for price, amount in answer[self._bids_field]],
+                [(to_decimal(price), to_decimal(amount)) for price, amount in answer[self._asks_field]])
+
+    @abstractmethod
+    def _parse_balance(self, answer):
+        """
+        @param answer: answer of _balance_method
+        @return: a dict contains {'currency': Decimal('amount'), ..., 'time_stamp': Decimal('time_stamp')},
+        or None if answer is invalid
+        """
+        pass
+
+    @abstractmethod
+    def _parse_order(self, answer):
+        """
+        @param answer: answer of an order method
+        @return: what _balance_after_order needs (e.g. order id), or None if answer is invalid
+        """
+        pass
+
+    @abstractmethod
+    def _market_order_params(self, side, amount) -> dict:
+        """
+        @param side: "buy" or "sell"
+        @param amount: the amount of asset to be traded
+        @return: params of the order method
+        """
+        pass
+
+    def _order_method(self, params) -> str:
+        """
+        @param params: see _market_order_params
+        @return: the order method to send params to
+        """
+        return self._order_methods[0]
+
+    def _error_message(self, answer):
+        """
+        @return: error message of answer, or None if it is not an error
+        """
+        return None
+
+    def _raise_if_fatal(self, answer):
+        """
+        @param answer: answer of the authenticated API
+        @raise FatalError: if answer is an error retrying will not fix (see _fatal_errors)
+        """
+        message = self._error_message(answer)
+        if (message is not None) and is_fatal(message, self._fatal_errors):
+            raise FatalError("{}: {}".format(self.name, message), answer)
+
+    def _prepare(self):
+        """
+        called before the authenticated requests of get_balance and place_market_order (e.g. to get a nonce).
+        """
+        pass
+
+    def _recover(self, answer):
+        """
+        called with every invalid answer of an authenticated request before it is retried (e.g. to fix a nonce).
+        """
+        pass
+
+    def _request_ticker(self, timeout=None):
+        """
+        @return: answer of _ticker_method for self.symbol, or None if the request failed
+        """
+        return self.get_unauthenticated_data(self._ticker_method, self.symbol, timeout=timeout)
+
+    def _balance_after_order(self, order) -> dict:
+        """
+        @param order: what _parse_order returned
+        @return: new balance of account. requested, unless the venue overrides this.
+        """
+        return self.get_balance(context="place_market_order")
+
+    # transport
+
+    def get_authenticated_data(self, method, params, timeout=None):
+        """
+        Get authenticated information from the exchange. B{NO retry}.
+
+        @param method: authenticated API method
+        @param params: parameters of the method
+        @param timeout:
+        @return: decoded answer, or None if the request failed
+        """
+        if not self._wait_for_rate_limit(ORDER if method in self._order_methods else ACCOUNT):
+            return None
+        path, body, headers = self._signed_request(method, params)  # after waiting, so nonces go out in order
+        return self.__send(self.connection_pool, "POST", path, body, headers, timeout, "get_authenticated_data",
+                           params)
+
+    def get_unauthenticated_data(self, method, symbol, timeout=None):
+        """
+        Get public data from the exchange. B{NO retry}.
+
+        @param method: public API method
+        @param symbol: trading symbol
+        @param timeout:
+        @return: decoded answer, or None if the request failed
+        """
+        if not self._wait_for_rate_limit(QUOTE):
+            return None
+        path = self.__public_path + self._public_path(method, symbol)
+        return self.__send(self.public_pool, "GET", path, None, None, timeout, "get_unauthenticated_data", path)
+
+    def __send(self, pool, method, path, body, headers, timeout, context, request):
         """
+        @param pool: ConnectionPool of the API
+        @param context: name of the calling method, for metrics and logs
+        @param request: what to log about the request if it fails
+        @return: decoded answer, or None if the request failed or its answer could not be decoded
+        """
+        start = time.perf_counter()
+        try:
+            response = pool.request(method, path, body, headers, timeout=timeout)
+        except (OSError, HTTPException) as e:
+            self.metrics.count_error(self.name, context)
+            self.logger.error("%s() failure. Request: %s. Msg: %s", context, request, e, exc_info=False,
+                              extra=self._log_fields(context, time.perf_counter() - start))
+            return None
+        received = time.perf_counter()
         try:
-            with urllib.request.urlopen(self.__public_api_base + "/{}/{}".format(method, pair),
-                                        timeout=timeout) as response:
-                return json.loads(response.read().decode())
-        except OSError as e:
-            self.logger.error("get_unauthenticated_data() failure. URL: /{}/{}. Msg: {}".format(method, pair, e),
-                              exc_info=False)
+            answer = self.decoder.loads(response)
+        except ValueError as e:  # e.g. an HTML error page
+            self.metrics.count_error(self.name, "decode")
+            self.logger.error("%s() failure. Request: %s. Invalid answer: %s (%s)", context, request,
+                              response[:200], e, exc_info=False, extra=self._log_fields(context, received - start))
             return None
+        self.metrics.observe(self.name, context, received - start)
+        self.metrics.observe(self.name, "decode", time.perf_counter() - received)
+        if self.logger.isEnabledFor(logging.DEBUG):  # skip building the fields of a record nobody wants
+            self.logger.debug("%s() answered in %.6fs", context, received - start,
+                              extra=self._log_fields(context, received - start))
+        return answer
+
+    # public methods
 
-    def get_quote(self, retry=False, timeout=None, sleep=0.5) -> Quote:
+    def get_quote(self, retry=False, timeout=None, sleep=None) -> Quote:
         """
-        Get quote from BTCe.
+        Get quote from the exchange.
 
         Bid, ask and time stamp are stored in class decimal.Decimal.
-        "All information is cached every 2 seconds, so there's no point in making more frequent requests."
+        if self.quote_cache is set, a quote younger than its TTL is served from the cache,
+        and concurrent calls for the same symbol share one request.
+
+        @param retry: if fail to get quote, retry or not? retries back off as set by self.retry_policy
+        @param timeout: timeout (seconds) of a request. a call sharing the request of another call waits
+        as long, or with retry, until the deadline of self.retry_policy (plus timeout) as that call's retries may.
+        @param sleep: max pause (seconds) after the first failure. None for self.retry_policy.base
+        @return: Quote, empty if it failed
+        """
+        with self.metrics.timer(self.name, "get_quote"):
+            if self.quote_cache is not None:
+                wait = timeout
+                if retry:
+                    deadline = self.retry_policy.deadline
+                    wait = None if deadline is None else deadline + (timeout or 0)
+                return self.quote_cache.get(self.name, self.symbol,
+                                            lambda: self.__request_quote(retry, timeout, sleep),
+                                            retry=retry, timeout=wait)
+            return self.__request_quote(retry, timeout, sleep)
+
+    def __request_quote(self, retry, timeout, sleep) -> Quote:
+        def attempt():
+            self.logger.debug("start getting quote")
+            answer = self._request_ticker(timeout=timeout)
+
+            # validate answer
+            quote = self._parse_quote(answer)
+            if quote is None:
+                self.logger.info("get_quote() failed. answer=%s", answer, extra=self._log_fields("get_quote"))
+                return None
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("successfully got quote: %s", quote, extra=self._log_fields("get_quote"))
+            self._publish_quote(quote)
+            return quote
+
+        try:
+            return self._retry("get_quote", attempt, self._quote_retry_policy(retry, sleep),
+                               self.quote_circuit_breaker)
+        except RetryError:
+            return Quote()  # return an empty Quote
+
+    def get_fast_quote(self, timeout=None):
+        """
+        Get quote as a fixed_point.FastQuote: scaled ints, B{NO} Decimal. B{NO retry}.
+
+        meant for strategy hot paths, so the quote is neither cached nor published to quote listeners.
 
-        @param retry: if fail to get quote, retry or not?
         @param timeout:
-        @param sleep: pause (seconds) before retry
-        @return: Quote
+        @return: FastQuote, or None if the request failed
         """
-        while True:
-            self.logger.debug("start getting quote")
+        return self._parse_fast_quote(self._request_ticker(timeout=timeout))
 
-            # get ticker from BTCe
-            answer = self.get_unauthenticated_data("ticker", self.symbol, timeout=timeout)
+    def update_order_book(self, timeout=None):
+        """
+        Get the order book of self.symbol and apply it to self.order_book. B{NO retry}.
 
-            # validate answer
-            if (answer is not None) and (self.symbol in answer):
-                info = answer[self.symbol]
-                quote = Quote(Decimal(str(info["sell"])),
-                              Decimal(str(info["buy"])),
-                              Decimal(str(time.time())),
-                              self.name,
-                              self.symbol)
-                self.logger.debug("successfully got quote: {}".format(quote))
-                return quote
-
-            # invalid answer
-            self.logger.info("get_quote() failed. answer={}".format(answer))
-            if retry:
-                time.sleep(sleep)
-                continue  # try again
-            else:
-                return Quote()  # return an empty Quote
-
-    def get_balance(self) -> dict:
+        only the levels that changed since the last update are touched.
+
+        @param timeout:
+        @return: order_book.OrderBook, or None if the request failed
+        """
+        if self._depth_method is None:
+            raise NotImplementedError("{} has no order book method".format(self.name))
+        depth = self._parse_depth(self.get_unauthenticated_data(self._depth_method, self.symbol, timeout=timeout))
+        if depth is None:
+            return None
+        if self.order_book is None:
+            self.order_book = OrderBook(self.name, self.symbol)
+        self.order_book.apply_snapshot(*depth)
+        return self.order_book
+
+    def get_balance(self, context="get_balance") -> dict:
         """
         get current account balance.
 
-        this method will keep trying until a valid return has been received.
+        this method will keep trying, with backoff, until a valid return has been received
+        or self.retry_policy gives up.
 
+        @param context: what the balance is for, for logs
         @return: a dict contains {'currency': Decimal('amount'), ..., 'time_stamp': Decimal('time_stamp')}
+        @raise RetryError: if self.retry_policy gave up
+        @raise FatalError: if the exchange answered with an error retrying will not fix
         """
-        answer = None
-        while True:
+        def attempt():
             self.logger.debug("get balance from server")
-            answer = self.get_authenticated_data("getInfo", {})
-            self.logger.debug("receive balance answer: {}".format(answer))
+            answer = self.get_authenticated_data(self._balance_method, {})
+            self.logger.debug("receive balance answer: %s", answer)
 
             # validate answer
-            if ("success" in answer) and (answer["success"] == 1):
-                break
-
-            # got invalid answer
-            self.logger.warning("fail to get balance. answer received: {}".format(answer))
-
-        # prepare and return new balance
-        funds = answer["return"]["funds"]
-        for key, value in funds.items():  # convert numbers to Decimal
-            funds[key] = Decimal(str(value))
-        funds["time_stamp"] = Decimal(str(answer["return"]["server_time"]))
-
-        self.logger.debug("new balance(get_balance): {}".format(funds))
+            funds = self._parse_balance(answer)
+            if funds is None:
+                self._raise_if_fatal(answer)
+                self._recover(answer)
+                self.logger.warning("fail to get balance. answer received: %s", answer)
+            return funds
+
+        self._prepare()
+        start = time.perf_counter()
+        funds = self._retry("get_balance", attempt)
+        latency = time.perf_counter() - start
+        self.metrics.observe(self.name, "get_balance", latency)
+        self._record_balance(funds)
+        self.logger.debug("new balance(%s): %s", context, funds, extra=self._log_fields("get_balance", latency))
         return funds
 
     def place_market_order(self, params: dict) -> dict:
         """
         place a market order.
 
-        this method will keep trying until a valid return has been received.
+        this method will keep trying, with backoff, until a valid return has been received
+        or self.retry_policy gives up.
 
-        @param params: order details
+        @param params: order details. see _market_order_params
         @return: new balance of account
+        @raise RetryError: if self.retry_policy gave up
+        @raise FatalError: if the exchange answered with an error retrying will not fix (e.g. not enough funds)
         """
-        answer = None
-        while True:
+        method = self._order_method(params)
+
+        def attempt():
             # place the order
-            answer = self.get_authenticated_data("Trade", params)
-            self.logger.info("receive market order answer: {}".format(answer))
+            answer = self.get_authenticated_data(method, params)
+            self.logger.info("receive market order answer: %s", answer, extra=self._log_fields(method))
 
             # validate answer
-            if ("success" in answer) and (answer["success"] == 1):
-                break
+            order = self._parse_order(answer)
+            if order is None:
+                self._raise_if_fatal(answer)
+                self._recover(answer)
+                self.logger.critical("INVALID answer for order: %s. Place order again", answer)
+            return order
+
+        self._prepare()
+        start = time.perf_counter()
+        order = self._retry("place_market_order", attempt)
+        latency = time.perf_counter() - start
+        self.metrics.observe(self.name, "place_market_order", latency)
+        funds = self._balance_after_order(order)
+        self.logger.info("receive new balance(trade): %s", funds,
+                         extra=self._log_fields("place_market_order", latency))
+        return funds
+
+    def market_buy(self, amount) -> dict:
+        """
+        place a market BUY order.
+
+        @param amount: the amount of asset to be traded. see _market_order_params of the venue
+        @return: new balance
+        """
+        params = self._market_order_params("buy", amount)
+        self.logger.info("place market BUY order w/ params: %s", params)
+        return self.place_market_order(params)
+
+    def market_sell(self, amount) -> dict:
+        """
+        place a market SELL order.
+
+        @param amount: the amount of asset to be B{SOLD}
+        @return: new balance
+        """
+        params = self._market_order_params("sell", amount)
+        self.logger.info("place market SELL order w/ params: %s", params)
+        return self.place_market_order(params)
+
+
+class BTCeBase(object):
+    """
+    request signing, answer parsing and order parameters of BTCe.
+
+    B{NO} I/O happens here, so that the blocking L{BTCe} and the asyncio client
+    (async_exchanges.AsyncBTCe) share exactly the same logic.
+    subclass must set self.symbol, self.fee_rate, self.most_recent_quote and self.logger.
+    """
+    name = "BTCe"
+
+    _host = "btc-e.com"
+    _api_base = "/tapi"
+    _public_api_base = "https://btc-e.com/api/3"
+
+    _ticker_method = "ticker"
+    _depth_method = "depth"
+    _balance_method = "getInfo"
+    _order_methods = ("Trade",)
+
+    decoder = default_decoder  # decoding.Decoder of all answers
+    order_book = None  # order_book.OrderBook of self.symbol, once update_order_book() was called
+    book_price_margin = Decimal("1.01")  # market orders priced from the book may go this far past the worst level
+    max_quote_age = None  # seconds. refuse to price orders from an older most_recent_quote. None: no limit
+    max_book_age = 5.0  # seconds. an older order_book is not used to price orders. None: no limit
+
+    # error messages of the Trade API that will not get better by retrying
+    _fatal_errors = ("invalid api key", "api key dont have", "invalid sign", "it is not enough", "must be greater",
+                     "invalid pair")
+
+    @property
+    def quote_age(self) -> float:
+        """
+        @return: seconds since self.most_recent_quote was received. infinite if there is none.
+        """
+        quote = self.most_recent_quote
+        if (quote is None) or (quote.time_stamp is None):
+            return float("inf")
+        return time.time() - float(quote.time_stamp)
+
+    def _check_quote_age(self):
+        """
+        @raise StaleQuoteError: if self.most_recent_quote is empty or older than self.max_quote_age
+        """
+        quote = self.most_recent_quote
+        if (quote is None) or (quote.bid is None) or (quote.ask is None):
+            raise StaleQuoteError("no quote to price the order from: {}".format(quote))
+        if self.max_quote_age is None:
+            return
+        age = self.quote_age
+        if age > self.max_quote_age:
+            raise StaleQuoteError("most_recent_quote is {:.3f}s old (max {}s): {}".format(
+                age, self.max_quote_age, self.most_recent_quote))
+
+    def _fresh_order_book(self):
+        """
+        @return: self.order_book if it is set and not older than self.max_book_age, otherwise None
+        """
+        book = self.order_book
+        if (book is None) or (book.time_stamp is None):
+            return None
+        if (self.max_book_age is not None) and (time.time() - book.time_stamp > self.max_book_age):
+            return None
+        return book
+
+    def _set_credentials(self, api_key, secret, nonce_path=None):
+        """
+        @param api_key: API key
+        @param secret: API secret
+        @param nonce_path: file to persist nonces in (see nonce.NonceAllocator). None to discover them on start.
+        """
+        self.nonce_allocator = NonceAllocator(nonce_path)
+
+        # HMAC with the key already absorbed. every request signs a copy, skipping the key schedule
+        self.__hmac = hmac.new(key=secret.encode(), digestmod=hashlib.sha512)
+        self.__headers = {"key": api_key,
+                          "Content-type": "application/x-www-form-urlencoded"}
+
+    def _set_nonce_from_error(self, answer) -> bool:
+        """
+        BTCe answers a request with invalid nonce with an error message contains the valid nonce.
+
+        @param answer: answer of a request sent with no nonce
+        @return: True if nonce was set
+        """
+        if (answer is None) or ("invalid nonce" not in answer.get("error", "")):
+            return False
+
+        # get valid nonce from error message
+        error_info = answer["error"].split(";")[1].strip()
+        error_dict = dict((k.strip(), v.strip()) for k, v in (p.split(":") for p in error_info.split(",")))
+        self.nonce_allocator.reset(int(error_dict["on key"]))
+        self.logger.debug("set nonce key to %s", error_dict["on key"])
+        return True
+
+    def _raise_if_fatal(self, answer):
+        """
+        @param answer: answer of the Trade API
+        @raise FatalError: if answer is an error retrying will not fix (see _fatal_errors)
+        """
+        if isinstance(answer, dict) and (answer.get("success") == 0) and is_fatal(answer.get("error"),
+                                                                                 self._fatal_errors):
+            raise FatalError("{}: {}".format(self.name, answer["error"]), answer)
+
+    def _sign_request(self, method, params) -> tuple:
+        """
+        build the query of params plus method and nonce, and sign it. params is left unchanged.
+
+        @param method: name of the API method. (e.g. "getInfo")
+        @param params: parameters for this API method {"key": <>}
+        @return: (query, headers)
+        """
+        # get nonce. safe to call from many threads at once
+        nonce = self.nonce_allocator.next()
+
+        # prepare components. method and nonce go last, as if added to params
+        query = "method={}&nonce={}".format(method, nonce)
+        if params:
+            query = urllib.parse.urlencode(params) + "&" + query
+        signature = self.__hmac.copy()
+        signature.update(query.encode())
+        headers = dict(self.__headers)
+        headers["Sign"] = signature.hexdigest()
+        return query, headers
+
+    def _parse_quote(self, answer, symbol=None):
+        """
+        @param answer: answer of the public "ticker" method
+        @param symbol: pair to pick from the answer. None for self.symbol.
+        @return: Quote, or None if answer is invalid
+        """
+        if symbol is None:
+            symbol = self.symbol
+        if (answer is None) or (symbol not in answer):
+            return None
+
+        info = answer[symbol]
+        quote = Quote(to_decimal(info["sell"]),
+                      to_decimal(info["buy"]),
+                      Decimal(str(time.time())),
+                      self.name,
+                      symbol)
+        quote.updated = self._updated(info)
+        return quote
+
+    def _parse_fast_quote(self, answer, symbol=None):
+        """
+        @param answer: answer of the public "ticker" method
+        @param symbol: pair to pick from the answer. None for self.symbol.
+        @return: fixed_point.FastQuote, or None if answer is invalid
+        """
+        if symbol is None:
+            symbol = self.symbol
+        if (answer is None) or (symbol not in answer):
+            return None
+
+        info = answer[symbol]
+        return FastQuote.from_prices(info["sell"], info["buy"], self.name, symbol)
+
+    @staticmethod
+    def _updated(info):
+        """
+        time of the data, set as quote.updated by L{_parse_quote}. quote.time_stamp stays the time it was received.
+        the same answer served again (see L{BTCeTicker}) so keeps its updated time, and is not published again.
+
+        @param info: ticker of one pair
+        @return: Decimal seconds since epoch, "updated" by BTCe. None if it is missing.
+        """
+        if "updated" in info:
+            return to_decimal(info["updated"])
+        return None
+
+    def _parse_depth(self, answer):
+        """
+        @param answer: answer of the public "depth" method
+        @return: (bids, asks) lists of (Decimal price, Decimal amount), or None if answer is invalid
+        """
+        if (answer is None) or (self.symbol not in answer):
+            return None
+
+        info = answer[self.symbol]
+        return ([(to_decimal(price), to_decimal(amount)) for price, amount in info["bids"]],
+                [(to_decimal(price), to_decimal(amount)) for price, amount in info["asks"]])
+
+    @staticmethod
+    def _parse_balance(answer):
+        """
+        @param answer: answer of the "getInfo" method
+        @return: a dict contains {'currency': Decimal('amount'), ..., 'time_stamp': Decimal('time_stamp')},
+        or None if answer is invalid
+        """
+        if (answer is None) or (answer.get("success") != 1):
+            return None
+
+        funds = answer["return"]["funds"]
+        for key, value in funds.items():  # convert numbers to Decimal
+            funds[key] = to_decimal(value)
+        funds["time_stamp"] = to_decimal(answer["return"]["server_time"])
+        return funds
 
-            # got invalid answer
-            self.logger.critical("INVALID answer for order: {}. Place order again".format(answer))
+    def _parse_order(self, answer):
+        """
+        @param answer: answer of the "Trade" method
+        @return: new balance, or None if answer is invalid
+        """
+        if (answer is None) or (answer.get("success") != 1):
+            return None
 
         # check if order was filled completely
         order_id = answer["return"]["order_id"]
         if order_id != 0:
-            self.logger.critical("Order was NOT filled completely. order_id = {}".format(order_id))
+            self.logger.critical("Order was NOT filled completely. order_id = %s", order_id)
 
-        # prepare and return new balance
         funds = answer["return"]["funds"]
         for key, value in funds.items():  # convert numbers to Decimal
-            funds[key] = Decimal(str(value))
+            funds[key] = to_decimal(value)
         funds["time_stamp"] = Decimal(str(time.time()))
-
-        self.logger.info("receive new balance(trade): {}".format(funds))
         return funds
 
-    def market_buy(self, amount) -> dict:
+    def _market_order_params(self, side, amount) -> dict:
         """
-        place a market BUY order.
+        @param side: "buy" or "sell"
+        @param amount: see _market_buy_params and _market_sell_params
+        @return: params of the "Trade" method
+        """
+        if side == "buy":
+            return self._market_buy_params(amount)
+        return self._market_sell_params(amount)
 
+    def _market_buy_params(self, amount) -> dict:
+        """
         1. BTCe B{DO NOT} have market orders. To mimic market order,
         order price will be set based on most recent quote.
         price can only has 3 decimal places.
+        if self.order_book is kept, fresh (see max_book_age) and deep enough for the amount,
+        price is set just past the worst level the order takes instead.
 
         2. BTCe takes fee from the currency received in a transaction,
         so in order to buy the right amount of asset, amount must be adjusted to amount/(1-feeRate).
         amount can only has 8 decimal places
 
         @param amount: the amount of asset to be B{RECEIVED}
-        @return new balance
+        @return: params of the "Trade" method
+        @raise StaleQuoteError: see max_quote_age
         """
-        params = {"pair": self.symbol,
-                  "type": "buy",
-                  "rate": "{:0.3f}".format(self.most_recent_quote.ask * Decimal("1.5")),  # see 1
-                  "amount": "{:0.8f}".format(amount/(1-self.fee_rate))}  # see 2
-        self.logger.info("place market BUY order w/ params: {}".format(params))
-        return self.place_market_order(params)
-
-    def market_sell(self, amount) -> dict:
+        self._check_quote_age()
+        amount = amount/(1-self.fee_rate)  # see 2
+        rate = self.most_recent_quote.ask * Decimal("1.5")  # see 1
+        book = self._fresh_order_book()
+        if book is not None:
+            filled, _, worst = book.fill("buy", amount)
+            if filled >= amount:
+                rate = worst * self.book_price_margin
+        return {"pair": self.symbol,
+                "type": "buy",
+                "rate": "{:0.3f}".format(rate),
+                "amount": "{:0.8f}".format(amount)}
+
+    def _market_sell_params(self, amount) -> dict:
         """
-        place a market SELL order.
-
         1. BTCe B{DO NOT} have market orders. To mimic market order,
         order price will be set based on most recent quote.
         price can only has 3 decimal places.
+        if self.order_book is kept, fresh (see max_book_age) and deep enough for the amount,
+        price is set just past the worst level the order takes instead.
 
         2. BTCe takes fee from the currency received in a transaction,
         so no need to adjust sell amount.
         amount can only has 8 decimal places
 
         @param amount: the amount of asset to be B{SOLD}
-        @return new balance
+        @return: params of the "Trade" method
+        @raise StaleQuoteError: see max_quote_age
         """
-        params = {"pair": self.symbol,
-                  "type": "sell",
-                  "rate": "{:0.3f}".format(self.most_recent_quote.bid * Decimal("0.6")),  # see 1
-                  "amount": "{:0.8f}".format(amount)}  # see 2
-        self.logger.info("place market SELL order w/ params: {}".format(params))
-        return self.place_market_order(params)
-
-
-class Bitfinex(Exchange):
+        self._check_quote_age()
+        rate = self.most_recent_quote.bid * Decimal("0.6")  # see 1
+        book = self._fresh_order_book()
+        if book is not None:
+            filled, _, worst = book.fill("sell", amount)
+            if filled >= amount:
+                rate = worst * (2 - self.book_price_margin)
+        return {"pair": self.symbol,
+                "type": "sell",
+                "rate": "{:0.3f}".format(rate),
+                "amount": "{:0.8f}".format(amount)}  # see 2
+
+
+class BTCe(BTCeBase, RestExchange):
     """
-    the Bitfinex class is a communication module to the exchange Bitfinex (https://www.bitfinex.com).
+    the BTCe class is a communication module to the exchange BTCe (https://btc-e.com).
 
     returns of all the public methods are B{STANDARDIZED}, so that the code of the main
     system does not have to change when it's trading between different exchanges.
     """
-    name = "Bitfinex"
 
-    __host = "api.bitfinex.com"
-    __api_base = "/v1"
-    __public_api_base = "https://api.bitfinex.com/v1"
-
-    def __init__(self, api_key, secret, symbol, fee_rate, master_name=None):
+    def __init__(self, api_key, secret, symbol, fee_rate, master_name=None, wait_time=1, pool_size=2,
+                 quote_cache=None, ticker=None, nonce_path=None, lazy=False, ledger=None):
         """
 
         @param api_key: API key
         @param secret: API secret
         @param symbol: trading symbol
-        @param fee_rate: fee_rate fee rate (0.01 for 1%)
+        @param fee_rate: fee rate (0.01 for 1%)
         @param master_name: name of the master who created this instance. used to setup logger.
+        @param wait_time: how long to wait before retrying when fail to get nonce from BTCe
+        @param pool_size: max number of keep-alive connections kept open per API (authenticated and public)
+        @param quote_cache: quote_cache.QuoteCache shared with other instances. None to always request.
+        @param ticker: BTCeTicker shared with instances of other pairs. None to request this pair alone.
+        @param nonce_path: file to persist nonces in, so that a restart skips the nonce discovery.
+        B{one} file per API key.
+        @param lazy: do B{NO} I/O here. nonce and most_recent_quote are fetched on first use,
+        or ahead of time by warm_up(background=True).
+        @param ledger: ledger.Ledger to record balances in. BTCe answers orders with the new balance,
+        so the ledger is kept exact without extra requests.
         @return:
         """
+        start = time.perf_counter()
         Exchange.__init__(self)
+        self._set_credentials(api_key, secret, nonce_path)
+        self._setup(symbol, fee_rate, master_name, pool_size, quote_cache, ledger)
+
+        self.ticker = ticker
+        if ticker is not None:
+            ticker.subscribe(symbol)
+
+        self.wait_time = wait_time
+        self.warm_up_time = None
+        self.__most_recent_quote = None
+        self.__nonce_lock = threading.Lock()
+        self.__quote_lock = threading.Lock()
+
+        if not lazy:
+            self.warm_up()
+        self.startup_time = time.perf_counter() - start
+        self.logger.debug("started in %.6fs (lazy=%s)", self.startup_time, lazy)
+
+    @property
+    def most_recent_quote(self) -> Quote:
+        """
+        BTCe B{DO NOT} have market orders. To mimic market order,
+        order price will be set based on most recent quote.
+        requested on first use if not set yet. an empty Quote (the request failed) is returned
+        but not kept, so the next use requests it again.
+        """
+        if self.__most_recent_quote is None:
+            with self.__quote_lock:
+                if self.__most_recent_quote is None:
+                    self.logger.debug("initialize self.most_recent_quote")
+                    quote = self.get_quote(retry=True)
+                    if (quote.bid is None) or (quote.ask is None):
+                        self.logger.warning("fail to initialize most_recent_quote")
+                        return quote
+                    self.__most_recent_quote = quote
+                    self.logger.debug("set most_recent_quote: %s", quote)
+        return self.__most_recent_quote
+
+    @most_recent_quote.setter
+    def most_recent_quote(self, quote):
+        self.__most_recent_quote = quote
+
+    @property
+    def cached_quote(self) -> Quote:
+        """
+        most_recent_quote if it is set, None otherwise. B{NO} request is sent for it.
+        """
+        return self.__most_recent_quote
 
-        self.__api_key = api_key
-        self.__secret = secret
+    def warm_up(self, background=False):
+        """
+        initiate nonce and self.most_recent_quote now instead of on first use.
 
-        self.symbol = symbol
-        self.fee_rate = Decimal(fee_rate)
+        @param background: do it in a daemon thread and return at once
+        @return: the thread if background, otherwise None
+        """
+        if background:
+            thread = threading.Thread(target=self.warm_up, name="{}.warm_up".format(self.name), daemon=True)
+            thread.start()
+            return thread
+
+        start = time.perf_counter()
+        self.__ensure_nonce()
+        self.most_recent_quote  # requested if not set yet
+        self.warm_up_time = time.perf_counter() - start
+        self.logger.debug("warmed up in %.6fs", self.warm_up_time)
+
+    def __ensure_nonce(self):
+        """
+        initiate nonce, unless it is known already (e.g. persisted by an earlier run).
 
-        # set up logger
-        if master_name is not None:
-            self.logger = logging.getLogger("{}.{}".format(master_name, self.name))
-        else:
-            # master name is not given (usually while developing)
-            self.logger = logging.getLogger(self.name)
-            self.logger.setLevel(logging.DEBUG)
-            formatter = logging.Formatter("{asctime}: {name}: {levelname}: {message}", style="{")
-            stream_handler = logging.StreamHandler(sys.stdout)
-            stream_handler.setFormatter(formatter)
-            stream_handler.setLevel(logging.DEBUG)
-            self.logger.addHandler(stream_handler)
+        @raise RetryError: if no nonce was received within the deadline of self.retry_policy
+        """
+        if self.nonce_allocator.known:
+            return
+        with self.__nonce_lock:
+            deadline = self.retry_policy.deadline
+            start = time.monotonic()
+            attempts = 0
+            while not self.nonce_allocator.known:
+                self.logger.debug("get nonce key from server")
+                answer = self.get_authenticated_data(method=None, params={})
+                attempts += 1
+                if self._set_nonce_from_error(answer):
+                    break
+                if (deadline is not None) and (time.monotonic() - start + self.wait_time > deadline):
+                    raise RetryError("no nonce from {} after {:.3f}s ({} attempts)".format(
+                        self.name, time.monotonic() - start, attempts), attempts, answer)
+                time.sleep(self.wait_time)  # retry after wait_time (seconds)
+
+    def _prepare(self):
+        self.__ensure_nonce()
+
+    def _recover(self, answer):
+        self._set_nonce_from_error(answer)
+
+    def _signed_request(self, method, params) -> tuple:
+        query, headers = self._sign_request(method, params)
+        return self._api_base, query, headers
+
+    def _request_ticker(self, timeout=None):
+        """
+        "All information is cached every 2 seconds, so there's no point in making more frequent requests."
+        the answer is shared by all pairs subscribed to self.ticker, if set.
+        """
+        if self.ticker is not None:
+            return self.ticker.get_answer(self, timeout=timeout)
+        return self.get_unauthenticated_data(self._ticker_method, self.symbol, timeout=timeout)
 
-    def get_authenticated_data(self, url, request, timeout=None):
+    def _balance_after_order(self, funds) -> dict:
         """
-        Get authenticated information from the exchange. B{NO retry}.
+        BTCe answers orders with the new balance: no extra request.
+        """
+        self._record_balance(funds)
+        return funds
 
-        Bitfinex API v1 U{https://www.bitfinex.com/pages/api}
+    def get_quotes(self, symbols, timeout=None) -> dict:
+        """
+        Get quotes of many pairs from BTCe in B{one} request. B{NO retry}.
 
-        @param url: target url of API. (e.g. "/balances")
-        @param request: request parameters for this API method {"key": <>}
-        @return:
+        BTCe Public API v3 accepts pairs joined by "-" (e.g. "ticker/ltc_usd-btc_usd").
+
+        @param symbols: list of trading symbols
+        @param timeout:
+        @return: {symbol: Quote}. pairs missing from the answer are left out.
         """
+        answer = self.get_unauthenticated_data("ticker", "-".join(symbols), timeout=timeout)
+        quotes = {}
+        for symbol in symbols:
+            quote = self._parse_quote(answer, symbol)
+            if quote is not None:
+                self._publish_quote(quote)
+                quotes[symbol] = quote
+        return quotes
 
-        # prepare components
-        request.update({"request": self.__api_base+url, "nonce": str(time.time())})
-        payload = base64.b64encode(json.dumps(request).encode())
-        signature = hmac.new(key=self.__secret.encode(),
-                             msg=payload,
-                             digestmod=hashlib.sha384).hexdigest()
-        headers = {"X-BFX-APIKEY": self.__api_key,
-                   "X-BFX-SIGNATURE": signature,
-                   "X-BFX-PAYLOAD": payload}
+    def market_buy(self, amount) -> dict:
+        """
+        place a market BUY order.
 
-        # connect exchange
-        conn = None
-        try:
-            conn = http.client.HTTPSConnection(self.__host, timeout=timeout)
-            conn.request("POST", self.__api_base+url, "", headers)
-            with conn.getresponse() as response:
-                return json.loads(response.read().decode())
-        except OSError as e:
-            self.logger.error("get_authenticated_data() failure. Query: {}. Msg: {}".format(request, e),
-                              exc_info=False)
-            return None
-        finally:
-            if conn is not None:
-                conn.close()
+        see L{BTCeBase._market_buy_params} for how price and amount are set.
 
-    def get_unauthenticated_data(self, url, symbol, timeout=None):
+        @param amount: the amount of asset to be B{RECEIVED}
+        @return new balance
+        """
+        params = self._market_buy_params(amount)
+        self.logger.info("place market BUY order w/ params: %s", params)
+        return self.place_market_order(params)
+
+    def market_sell(self, amount) -> dict:
         """
-        Get public data from exchange. NO retry.
+        place a market SELL order.
 
-        Bitfinex API v1 U{https://www.bitfinex.com/pages/api}
+        see L{BTCeBase._market_sell_params} for how price and amount are set.
 
-        @param url: target url of public API method
-        @param symbol: trading symbol
+        @param amount: the amount of asset to be B{SOLD}
+        @return new balance
+        """
+        params = self._market_sell_params(amount)
+        self.logger.info("place market SELL order w/ params: %s", params)
+        return self.place_market_order(params)
+
+
+class BTCeTicker(object):
+    """
+    one "ticker" request for all subscribed BTCe pairs.
+
+    BTCe instances of different pairs that share a ticker get their quotes from the same answer,
+    so N pairs cost one round trip per refresh instead of N.
+    the answer is requested again once it is older than ttl, by whichever instance asks first.
+    """
+
+    def __init__(self, ttl=2.0):
+        """
+
+        @param ttl: max age (seconds) of the shared answer. BTCe caches its data every 2 seconds anyway.
         @return:
         """
-        try:
-            with urllib.request.urlopen(self.__public_api_base + "{}/{}".format(url, symbol),
-                                        timeout=timeout) as response:
-                return json.loads(response.read().decode())
-        except OSError as e:
-            self.logger.error("get_unauthenticated_data() failure. URL: /{}/{}. Msg: {}".format(url, symbol, e),
-                              exc_info=False)
-            return None
+        self.ttl = ttl
+
+        self.__symbols = []
+        self.__answer = None
+        self.__time = 0.0
+        self.__lock = threading.Lock()
+
+    def subscribe(self, symbol):
+        with self.__lock:
+            if symbol not in self.__symbols:
+                self.__symbols.append(symbol)
+                self.__answer = None  # next call requests the new pair too
 
-    def get_quote(self, retry=False, timeout=None, sleep=0.5) -> Quote:
+    def unsubscribe(self, symbol):
+        with self.__lock:
+            if symbol in self.__symbols:
+                self.__symbols.remove(symbol)
+
+    def get_answer(self, exchange, timeout=None):
         """
-        Get quote from Bitfinex.
+        get the shared answer of the "ticker" method, requesting it if it is missing or too old.
 
-        Bid, ask and time stamp are stored in class decimal.Decimal.
+        @param exchange: BTCe instance used to send the request
+        @param timeout:
+        @return: raw answer {symbol: {...}} of all subscribed pairs, or None if the request failed
+        """
+        with self.__lock:  # callers waiting here get the answer requested by the first one
+            if (self.__answer is not None) and (time.time() - self.__time < self.ttl):
+                return self.__answer
 
-        @param retry: if fail to get quote, retry or not?
-        @param sleep: pause (seconds) before retry
-        @return: Quote
+            answer = exchange.get_unauthenticated_data("ticker", "-".join(self.__symbols), timeout=timeout)
+            if answer is not None:  # failures are not shared, the next caller tries again
+                self.__answer = answer
+                self.__time = time.time()
+            return answer
+
+
+class BitfinexBase(object):
+    """
+    request signing, answer parsing and order parameters of Bitfinex.
+
+    B{NO} I/O happens here, so that the blocking L{Bitfinex} and the asyncio client
+    (async_exchanges.AsyncBitfinex) share exactly the same logic.
+    subclass must set self.symbol, self.fee_rate and self.logger.
+    """
+    name = "Bitfinex"
+
+    _host = "api.bitfinex.com"
+    _api_base = "/v1"
+    _public_api_base = "https://api.bitfinex.com/v1"
+
+    _ticker_method = "/pubticker"
+    _depth_method = "/book"
+    _balance_method = "/balances"
+    _order_methods = ("/order/new",)
+
+    decoder = default_decoder  # decoding.Decoder of all answers
+    order_book = None  # order_book.OrderBook of self.symbol, once update_order_book() was called
+
+    # error messages of the authenticated API that will not get better by retrying
+    _fatal_errors = ("invalid order", "not enough", "minimum size", "could not find a key", "invalid x-bfx")
+
+    def _raise_if_fatal(self, answer):
         """
-        while True:
-            self.logger.debug("start getting quote")
+        @param answer: answer of the authenticated API
+        @raise FatalError: if answer is an error retrying will not fix (see _fatal_errors)
+        """
+        if isinstance(answer, dict) and ("message" in answer) and is_fatal(answer["message"], self._fatal_errors):
+            raise FatalError("{}: {}".format(self.name, answer["message"]), answer)
 
-            # get ticker from Bitfinex
-            answer = self.get_unauthenticated_data("/pubticker", self.symbol, timeout=timeout)
+    def _set_credentials(self, api_key, secret):
+        self.__api_key = api_key
 
-            # validate answer
-            if (answer is not None) and ("bid" in answer) and ("ask" in answer) and ("timestamp" in answer):
-                quote = Quote(Decimal(answer["bid"]),
-                              Decimal(answer["ask"]),
-                              Decimal(str(time.time())),
-                              self.name,
-                              self.symbol)
-                self.logger.debug("successfully got quote: {}".format(quote))
-                return quote
-
-            # invalid answer
-            self.logger.info("get_quote() failed. answer={}".format(answer))
-            if retry:
-                time.sleep(sleep)
-                continue  # try again
-            else:
-                return Quote()  # return an empty Quote
+        # HMAC with the key already absorbed. every request signs a copy, skipping the key schedule
+        self.__hmac = hmac.new(key=secret.encode(), digestmod=hashlib.sha384)
 
-    def get_balance(self, context="get_balance") -> dict:
+    def _sign_request(self, url, request) -> dict:
         """
-        get current account balance.
+        build the payload of request plus request url and nonce, and sign it. request is left unchanged.
 
-        this method will keep trying until a valid return has been received.
+        @param url: target url of API. (e.g. "/balances")
+        @param request: request parameters for this API method {"key": <>}
+        @return: headers
+        """
+        # same JSON as json.dumps() of request with "request" and "nonce" added, without encoding the fixed part
+        body = '{{"request": "{}{}", "nonce": "{}"'.format(self._api_base, url, time.time())
+        if request:
+            body += ", " + json.dumps(request)[1:]
+        else:
+            body += "}"
+        payload = base64.b64encode(body.encode())
+        signature = self.__hmac.copy()
+        signature.update(payload)
+        return {"X-BFX-APIKEY": self.__api_key,
+                "X-BFX-SIGNATURE": signature.hexdigest(),
+                "X-BFX-PAYLOAD": payload}
+
+    def _parse_quote(self, answer):
+        """
+        @param answer: answer of "/pubticker"
+        @return: Quote, or None if answer is invalid
+        """
+        if (answer is None) or ("bid" not in answer) or ("ask" not in answer) or ("timestamp" not in answer):
+            return None
 
-        1. Bitfinex does not provide time stamp in the answer,
-        so the "time_stamp" in the returned dict is actually local time
+        return Quote(Decimal(answer["bid"]),
+                     Decimal(answer["ask"]),
+                     Decimal(str(time.time())),
+                     self.name,
+                     self.symbol)
 
-        @return: a dict contains {'currency': Decimal('amount'), ..., 'time_stamp': Decimal('time_stamp')}
+    def _parse_fast_quote(self, answer):
         """
-        answer = None
-        while True:
-            self.logger.debug("get balance from server")
-            answer = self.get_authenticated_data("/balances", {})
-            self.logger.debug("receive balance answer: {}".format(answer))
+        @param answer: answer of "/pubticker"
+        @return: fixed_point.FastQuote, or None if answer is invalid
+        """
+        if (answer is None) or ("bid" not in answer) or ("ask" not in answer) or ("timestamp" not in answer):
+            return None
 
-            # validate answer
-            if isinstance(answer, list) and ("available" in answer[0]):
-                break
+        return FastQuote.from_prices(answer["bid"], answer["ask"], self.name, self.symbol)
 
-            # got invalid answer
-            self.logger.warning("fail to get balance. answer received: {}".format(answer))
+    def _parse_depth(self, answer):
+        """
+        @param answer: answer of "/book"
+        @return: (bids, asks) lists of (Decimal price, Decimal amount), or None if answer is invalid
+        """
+        if (answer is None) or ("bids" not in answer) or ("asks" not in answer):
+            return None
+
+        return ([(Decimal(entry["price"]), Decimal(entry["amount"])) for entry in answer["bids"]],
+                [(Decimal(entry["price"]), Decimal(entry["amount"])) for entry in answer["asks"]])
+
+    @staticmethod
+    def _parse_balance(answer):
+        """
+        1. Bitfinex does not provide time stamp in the answer,
+        so the "time_stamp" in the returned dict is actually local time
+
+        @param answer: answer of "/balances"
+        @return: a dict contains {'currency': Decimal('amount'), ..., 'time_stamp': Decimal('time_stamp')},
+        or None if answer is invalid
+        """
+        if not (isinstance(answer, list) and answer and ("available" in answer[0])):
+            return None
 
-        # prepare and return new balance
         funds = {}
-        for entry in list(answer):  # collect all balance associated with account type 'exchange'
+        for entry in answer:  # collect all balance associated with account type 'exchange'
             if entry["type"] == "exchange":
                 funds[entry["currency"]] = Decimal(entry["available"])  # convert string to Decimal
         funds["time_stamp"] = Decimal(int(time.time()))  # see 1
-
-        self.logger.debug("new balance({1}): {0}".format(funds, context))
         return funds
 
+    @staticmethod
+    def _is_order_accepted(answer) -> bool:
+        """
+        @param answer: answer of "/order/new"
+        """
+        return (answer is not None) and ("order_id" in answer)
+
+    def _parse_order(self, answer):
+        """
+        @param answer: answer of "/order/new"
+        @return: answer, or None if the order was not accepted
+        """
+        return answer if self._is_order_accepted(answer) else None
+
+    @staticmethod
+    def _is_order_live(order_status) -> bool:
+        """
+        @param order_status: answer of "/order/new" or "/order/status"
+        @return: True if the order may still be filled (or the status is unknown)
+        """
+        return (order_status is None) or ("is_live" not in order_status) or (order_status["is_live"] is True)
+
+    def _market_order_params(self, side, amount) -> dict:
+        """
+        Bitfinex ignores the price of "exchange market" orders, but the key must be present.
+
+        @param side: "buy" or "sell"
+        @param amount: the amount of asset to be traded
+        @return: request parameters of "/order/new"
+        """
+        return {"symbol": self.symbol,
+                "amount": "{:f}".format(amount),  # Key amount should be a decimal string.
+                "price": "0.01" if side == "buy" else "100000.00",
+                "exchange": "bitfinex",
+                "side": side,
+                "type": "exchange market"}
+
+
+class Bitfinex(BitfinexBase, RestExchange):
+    """
+    the Bitfinex class is a communication module to the exchange Bitfinex (https://www.bitfinex.com).
+
+    returns of all the public methods are B{STANDARDIZED}, so that the code of the main
+    system does not have to change when it's trading between different exchanges.
+    """
+
+    def __init__(self, api_key, secret, symbol, fee_rate, master_name=None, pool_size=2, quote_cache=None,
+                 order_max_wait=60.0, ledger=None):
+        """
+
+        @param api_key: API key
+        @param secret: API secret
+        @param symbol: trading symbol
+        @param fee_rate: fee_rate fee rate (0.01 for 1%)
+        @param master_name: name of the master who created this instance. used to setup logger.
+        @param pool_size: max number of keep-alive connections kept open per API (authenticated and public)
+        @param quote_cache: quote_cache.QuoteCache shared with other instances. None to always request.
+        @param order_max_wait: max time (seconds) to wait for a market order to be filled
+        @param ledger: ledger.Ledger. if set, the balance after an order is computed from the fill
+        instead of requested (see L{_balance_after_order})
+        @return:
+        """
+        RestExchange.__init__(self, api_key, secret, symbol, fee_rate, master_name, pool_size, quote_cache, ledger)
+
+        # polls outstanding orders with backoff from a background thread
+        self.order_tracker = OrderTracker(self, max_wait=order_max_wait)
+
+    def _signed_request(self, url, request) -> tuple:
+        return self._api_base + url, "", self._sign_request(url, request)
+
+    def _public_path(self, url, symbol) -> str:
+        return "{}/{}".format(url, symbol)
+
     def place_market_order(self, params: dict):
         """
         place a market order.
 
-        this method will keep trying until a valid return has been received.
+        this method will keep trying, with backoff, until the order has been accepted
+        or self.retry_policy gives up (see L{place_market_order_async}).
         (1) Bitfinex returns orderID and time stamp in the answer, instead of returning new balance.
-        So this method check the order status explicitly and get new balance after order was fully filled.
+        So this method waits for self.order_tracker to see the order is no longer live and get new balance.
         (2) Bitfinex offers the option to choose the fee currency.
 
         @param params: order details
         @return: new balance of account
         """
-        answer = None
-        while True:
+        start = time.perf_counter()
+        fill = self.place_market_order_async(params).result()
+        latency = time.perf_counter() - start
+        self.metrics.observe(self.name, "place_market_order", latency)
+
+        # order was filled and no longer live (or it was given up after order_tracker.max_wait)
+        if fill.complete:
+            self.logger.info("market order was filled: %s", fill.status,
+                             extra=self._log_fields("place_market_order", latency))
+        else:
+            self.logger.critical("Order was NOT filled completely: %s", fill,
+                                 extra=self._log_fields("place_market_order", latency))
+        return fill.balance
+
+    def place_market_order_async(self, params: dict) -> Future:
+        """
+        place a market order and return without waiting for the fill.
+
+        this method will keep trying, with backoff, until the order has been accepted
+        or self.retry_policy gives up.
+
+        @param params: order details
+        @return: Future resolving to an order_tracker.OrderFill (final order status and new balance)
+        @raise RetryError: if self.retry_policy gave up
+        @raise FatalError: if Bitfinex answered with an error retrying will not fix (e.g. not enough balance)
+        """
+        def attempt():
             # place the order
             answer = self.get_authenticated_data("/order/new", params)
-            self.logger.info("receive market order answer: {}".format(answer))
+            self.logger.info("receive market order answer: %s", answer, extra=self._log_fields("/order/new"))
 
             # validate answer
-            if "order_id" in answer:
-                break
+            order = self._parse_order(answer)
+            if order is not None:
+                return order
+            self._raise_if_fatal(answer)
+            self.logger.critical("INVALID answer for order: %s. Place order again", answer)
+            return None
 
-            # got invalid answer
-            self.logger.critical("INVALID answer for order: {}. Place order again".format(answer))
+        answer = self._retry("place_market_order", attempt)
+        return self.order_tracker.track(answer["order_id"], answer)
 
-        # check if order was filled completely
-        order_id = answer["order_id"]
-        order_status = answer
-        while ("is_live" not in answer) or (order_status["is_live"] is True):
-            # check again
-            order_status = self.get_authenticated_data("/order/status", {"order_id": order_id})
+    def _balance_after_order(self, status) -> dict:
+        """
+        balance after an order stopped being tracked.
 
-        # order was filled and no longer live
-        self.logger.info("market order was filled: {}".format(order_status))
+        without self.ledger, it is requested. with it, the fill is applied to the ledger, which asks the exchange
+        only when a reconciliation is due (see ledger.Ledger).
 
-        # prepare and return new balance
-        return self.get_balance(context="place_market_order")
+        @param status: last order status (answer of "/order/status" or "/order/new")
+        @return: new balance of account
+        """
+        if self.ledger is None:
+            return self.get_balance(context="order_tracker")
+
+        if ("executed_amount" in status) and ("avg_execution_price" in status) and ("side" in status):
+            asset, currency = currencies(self.symbol)
+            self.ledger.apply_fill(self.name, asset, currency, status["side"],
+                                   to_decimal(status["executed_amount"]), to_decimal(status["avg_execution_price"]),
+                                   self.fee_rate, certain=not self._is_order_live(status))
+        else:
+            self.ledger.invalidate(self.name)
+        return self.ledger.balance_of(self)
 
-    def market_buy(self, amount):
+
+class BTCChina(RestExchange):
+    """
+    the BTCChina class is a communication module to the exchange BTCChina (https://www.btcchina.com).
+
+    built on L{RestExchange}: only signing and parsing are specific to BTCChina.
+    the trade API is JSON-RPC. a request is signed with HMAC-SHA1 of its method, params and tonce
+    (microseconds, increasing), sent as HTTP basic authentication.
+
+    returns of all the public methods are B{STANDARDIZED}, so that the code of the main
+    system does not have to change when it's trading between different exchanges.
+    """
+    name = "BTCChina"
+
+    _host = "api.btcchina.com"
+    _api_base = "/api_trade_v1.php"
+    _public_api_base = "https://data.btcchina.com/data"
+
+    _ticker_method = "ticker"
+    _depth_method = "orderbook"
+    _balance_method = "getAccountInfo"
+    _order_methods = ("buyOrder2", "sellOrder2")
+
+    # "buy" is the highest bid, "sell" the lowest ask
+    _ticker_field = "ticker"
+    _bid_field = "buy"
+    _ask_field = "sell"
+
+    # error messages of the trade API that will not get better by retrying
+    _fatal_errors = ("unauthorized", "insufficient", "invalid amount", "invalid price", "invalid market")
+
+    def _set_credentials(self, api_key, secret):
+        self.__api_key = api_key
+        # tonces count up from the current time in microseconds
+        self.nonce_allocator = NonceAllocator()
+        self.nonce_allocator.reset(time.time_ns() // 1000)
+
+        # HMAC with the key already absorbed. every request signs a copy, skipping the key schedule
+        self.__hmac = hmac.new(key=secret.encode(), digestmod=hashlib.sha1)
+
+    def _signed_request(self, method, params) -> tuple:
         """
-        place a market BUY order.
+        @param params: JSON-RPC params, by name in their positional order. "side" is left out (see _order_method).
+        """
+        tonce = self.nonce_allocator.next()
+        values = [value for key, value in params.items() if key != "side"]
+        # in the signed string, null is empty and booleans are 1 or empty
+        signed = ",".join("" if value in (None, False) else "1" if value is True else str(value) for value in values)
+        signature = self.__hmac.copy()
+        signature.update("tonce={0}&accesskey={1}&requestmethod=post&id={0}&method={2}&params={3}".format(
+            tonce, self.__api_key, method, signed).encode())
+        credentials = base64.b64encode("{}:{}".format(self.__api_key, signature.hexdigest()).encode()).decode()
+        body = json.dumps({"method": method, "params": values, "id": tonce})
+        return self._api_base, body, {"Authorization": "Basic " + credentials,
+                                      "Json-Rpc-Tonce": str(tonce),
+                                      "Content-type": "application/json-rpc"}
+
+    def _public_path(self, method, symbol) -> str:
+        return "/{}?market={}".format(method, symbol)
+
+    def _error_message(self, answer):
+        if isinstance(answer, dict) and isinstance(answer.get("error"), dict):
+            return answer["error"].get("message")
+        return None
+
+    def _parse_balance(self, answer):
+        """
+        BTCChina does not provide time stamp in the answer, so the "time_stamp" is local time.
 
-        @param amount:
-        @return:
+        @param answer: answer of "getAccountInfo"
         """
-        # set params
-        params = {"symbol": self.symbol,
-                  "amount": "{:f}".format(amount),  # Key amount should be a decimal string.
-                  "price": "0.01",
-                  "exchange": "bitfinex",
-                  "side": "buy",
-                  "type": "exchange market"}
-        self.logger.info("place market BUY order w/ params: {}".format(params))
-        return self.place_market_order(params)
+        if (answer is None) or ("result" not in answer) or ("balance" not in answer["result"]):
+            return None
 
-    def market_sell(self, amount) -> dict:
+        funds = {}
+        for currency, entry in answer["result"]["balance"].items():
+            funds[currency] = to_decimal(entry["amount"])
+        funds["time_stamp"] = Decimal(int(time.time()))
+        return funds
+
+    def _parse_order(self, answer):
         """
-        place a market SELL order.
+        @param answer: answer of "buyOrder2" or "sellOrder2"
+        @return: order id, or None if answer is invalid
+        """
+        if (answer is None) or (answer.get("result") in (None, False)):
+            return None
+        return answer["result"]
 
-        @param amount:
-        @return:
+    def _market_order_params(self, side, amount) -> dict:
         """
-        # set params
-        params = {"symbol": self.symbol,
-                  "amount": "{:f}".format(amount),  # Key amount should be a decimal string.
-                  "price": "100000.00",
-                  "exchange": "bitfinex",
-                  "side": "sell",
-                  "type": "exchange market"}
-        self.logger.info("place market SELL order w/ params: {}".format(params))
-        return self.place_market_order(params)
+        a null price makes a market order.
 
+        @param side: "buy" or "sell"
+        @param amount: the amount of asset to be traded
+        @return: params of "buyOrder2" or "sellOrder2"
+        """
+        return {"side": side,
+                "price": None,
+                "amount": "{:f}".format(amount),
+                "market": self.symbol.upper()}
 
-class BTCChina(Exchange):
-    pass
+    def _order_method(self, params) -> str:
+        return "buyOrder2" if params["side"] == "buy" else "sellOrder2"
 
 
-class OKCoin(Exchange):
-    pass
+class OKCoin(RestExchange):
+    """
+    the OKCoin class is a communication module to the exchange OKCoin (https://www.okcoin.cn).
+
+    built on L{RestExchange}: only signing and parsing are specific to OKCoin.
+    a trade API request is signed with the upper case MD5 of its sorted parameters followed by the secret key.
+
+    returns of all the public methods are B{STANDARDIZED}, so that the code of the main
+    system does not have to change when it's trading between different exchanges.
+    """
+    name = "OKCoin"
+
+    _host = "www.okcoin.cn"
+    _api_base = "/api/v1"
+    _public_api_base = "https://www.okcoin.cn/api/v1"
+
+    _ticker_method = "ticker.do"
+    _depth_method = "depth.do"
+    _balance_method = "userinfo.do"
+    _order_methods = ("trade.do",)
+
+    # "buy" is the highest bid, "sell" the lowest ask
+    _ticker_field = "ticker"
+    _bid_field = "buy"
+    _ask_field = "sell"
+
+    # OKCoin answers errors with a code only
+    _error_codes = {10005: "secretkey does not exist", 10007: "signature does not match",
+                    10010: "insufficient funds", 10016: "insufficient coins"}
+    # error messages (see _error_codes) that will not get better by retrying
+    _fatal_errors = ("secretkey", "signature", "insufficient")
+
+    def _set_credentials(self, api_key, secret):
+        self.__api_key = api_key
+        self.__secret = "&secret_key=" + secret  # the secret is appended to what is signed, nothing to precompute
+
+    def _signed_request(self, method, params) -> tuple:
+        fields = dict(params)
+        fields["api_key"] = self.__api_key
+        query = "&".join("{}={}".format(key, fields[key]) for key in sorted(fields))
+        sign = hashlib.md5((query + self.__secret).encode()).hexdigest().upper()
+        return ("{}/{}".format(self._api_base, method),
+                "{}&sign={}".format(query, sign),
+                {"Content-type": "application/x-www-form-urlencoded"})
+
+    def _public_path(self, method, symbol) -> str:
+        return "/{}?symbol={}".format(method, symbol)
+
+    def _error_message(self, answer):
+        if isinstance(answer, dict) and (answer.get("result") is False):
+            code = answer.get("error_code")
+            return self._error_codes.get(code, "error code {}".format(code))
+        return None
+
+    def _parse_balance(self, answer):
+        """
+        only free funds are reported. OKCoin does not provide time stamp in the answer,
+        so the "time_stamp" is local time.
+
+        @param answer: answer of "userinfo.do"
+        """
+        if (answer is None) or (answer.get("result") is not True) or ("info" not in answer):
+            return None
+
+        funds = {}
+        for currency, amount in answer["info"]["funds"]["free"].items():
+            funds[currency] = to_decimal(amount)
+        funds["time_stamp"] = Decimal(int(time.time()))
+        return funds
+
+    def _parse_order(self, answer):
+        """
+        @param answer: answer of "trade.do"
+        @return: order id, or None if answer is invalid
+        """
+        if (answer is None) or (answer.get("result") is not True) or ("order_id" not in answer):
+            return None
+        return answer["order_id"]
+
+    def _market_order_params(self, side, amount) -> dict:
+        """
+        a market sell order takes the amount of asset, a market buy order the amount of currency to spend
+        (as "price"). so a buy spends amount times the ask of a quote requested now.
+
+        @param side: "buy" or "sell"
+        @param amount: the amount of asset to be traded
+        @return: params of "trade.do"
+        """
+        if side == "sell":
+            return {"symbol": self.symbol, "type": "sell_market", "amount": "{:f}".format(amount)}
+        quote = self.get_quote(retry=True)
+        if quote.ask is None:
+            raise RetryError("{}: no quote to price a market buy".format(self.name), 0)
+        return {"symbol": self.symbol, "type": "buy_market", "price": "{:0.2f}".format(amount * quote.ask)}
 
 
 def main():
@@ -640,7 +1722,7 @@ def main():
     if 0:
         start = time.time()
         for i in range(0, 10000):
-            logger.info("test %s" % i)
+            logger.info("test %s", i)
         end = time.time()
         print(end-start)
 
@@ -655,3 +1737,4 @@ def main():
 
 if __name__ == "__main__":
     # main()
+    pass
@@ -0,0 +1,155 @@
+__author__ = 'Antares'
+
+#  compact fixed-point quotes for the strategy hot path.
+#
+#  prices are plain ints scaled by 10**places, so comparing and subtracting them is int arithmetic
+#  instead of Decimal arithmetic. conversion to and from util.Quote is exact: a value with more
+#  decimal places than its symbol allows raises ValueError instead of being rounded.
+
+from decimal import Decimal
+import time
+
+from util import Quote
+
+
+DEFAULT_PRICE_PLACES = 8  # the finest price step of BTCe and Bitfinex
+TIME_PLACES = 9  # time stamps in nanoseconds, enough for Decimal(str(time.time()))
+
+# decimal places of prices per symbol. symbols not listed use DEFAULT_PRICE_PLACES
+PRICE_PLACES = {}
+
+
+def price_places(symbol) -> int:
+    return PRICE_PLACES.get(symbol, DEFAULT_PRICE_PLACES)
+
+
+def to_scaled(value, places) -> int:
+    """
+    convert a number to an int scaled by 10**places, exactly.
+
+    strings are parsed directly, without building a Decimal. floats are converted through their
+    shortest repr, which is what json and str() give for exchange answers.
+
+    @param value: str, int, float or Decimal
+    @param places: decimal places to keep
+    @return: int(value * 10**places)
+    @raise ValueError: if value has more than places significant decimal places
+    """
+    if isinstance(value, int):
+        return value * 10 ** places
+    if isinstance(value, Decimal):
+        scaled = value.scaleb(places)
+        if scaled != scaled.to_integral_value():
+            raise ValueError("{} has more than {} decimal places".format(value, places))
+        return int(scaled)
+
+    text = value if isinstance(value, str) else repr(value)
+    if ("e" in text) or ("E" in text):
+        return to_scaled(Decimal(text), places)  # rare: fall back to Decimal
+    whole, _, fraction = text.strip().partition(".")
+    if len(fraction) > places:
+        if fraction[places:].strip("0"):
+            raise ValueError("{} has more than {} decimal places".format(value, places))
+        fraction = fraction[:places]
+    if whole in ("", "-", "+"):
+        whole += "0"
+    return int(whole + fraction.ljust(places, "0"))
+
+
+def from_scaled(value, places) -> Decimal:
+    """
+    @param value: int scaled by 10**places
+    @param places: decimal places
+    @return: Decimal equal to value / 10**places
+    """
+    return Decimal(value).scaleb(-places)
+
+
+class FastQuote(object):
+    """
+    a quote with prices stored as scaled ints (see L{to_scaled}).
+
+    bid and ask are scaled by 10**places, time_stamp by 10**TIME_PLACES (nanoseconds).
+    """
+    __slots__ = ("bid", "ask", "time_stamp", "exchange", "symbol", "places")
+
+    def __init__(self, bid, ask, time_stamp, exchange, symbol, places=DEFAULT_PRICE_PLACES):
+        """
+
+        @param bid: scaled bid
+        @param ask: scaled ask
+        @param time_stamp: nanoseconds since epoch
+        @param exchange: name of the exchange
+        @param symbol: trading symbol
+        @param places: decimal places of bid and ask
+        @return:
+        """
+        self.bid = bid
+        self.ask = ask
+        self.time_stamp = time_stamp
+        self.exchange = exchange
+        self.symbol = symbol
+        self.places = places
+
+    @classmethod
+    def from_prices(cls, bid, ask, exchange, symbol, time_stamp=None):
+        """
+        build a FastQuote from the raw prices of an exchange answer.
+
+        @param bid: bid as str, float or Decimal
+        @param ask: ask as str, float or Decimal
+        @param exchange: name of the exchange
+        @param symbol: trading symbol
+        @param time_stamp: nanoseconds since epoch. None for now.
+        @return: FastQuote
+        """
+        places = price_places(symbol)
+        return cls(to_scaled(bid, places),
+                   to_scaled(ask, places),
+                   time.time_ns() if time_stamp is None else time_stamp,
+                   exchange,
+                   symbol,
+                   places)
+
+    @classmethod
+    def from_quote(cls, quote):
+        """
+        @param quote: non-empty util.Quote
+        @return: FastQuote of the same values
+        @raise ValueError: if a price has more decimal places than its symbol allows
+        """
+        places = price_places(quote.symbol)
+        return cls(to_scaled(quote.bid, places),
+                   to_scaled(quote.ask, places),
+                   to_scaled(quote.time_stamp, TIME_PLACES),
+                   quote.exchange,
+                   quote.symbol,
+                   places)
+
+    def to_quote(self) -> Quote:
+        """
+        @return: util.Quote with Decimal values equal to this quote
+        """
+        return Quote(from_scaled(self.bid, self.places),
+                     from_scaled(self.ask, self.places),
+                     from_scaled(self.time_stamp, TIME_PLACES),
+                     self.exchange,
+                     self.symbol)
+
+    @property
+    def spread(self) -> int:
+        return self.ask - self.bid
+
+    def __eq__(self, other):
+        if not isinstance(other, FastQuote):
+            return NotImplemented
+        return (self.bid == other.bid and self.ask == other.ask and self.time_stamp == other.time_stamp and
+                self.exchange == other.exchange and self.symbol == other.symbol and self.places == other.places)
+
+    def __hash__(self):
+        return hash((self.bid, self.ask, self.time_stamp, self.exchange, self.symbol))
+
+    def __repr__(self):
+        return "FastQuote({}, {}, {}, {}, {})".format(from_scaled(self.bid, self.places),
+                                                       from_scaled(self.ask, self.places),
+                                                       self.time_stamp, self.exchange, self.symbol)
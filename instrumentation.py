@@ -0,0 +1,178 @@
+__author__ = 'Antares'
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+
+
+# upper bounds (seconds) of the latency buckets: 50us to ~100s, 4 buckets per doubling
+BUCKETS = tuple(0.00005 * 2 ** (i / 4) for i in range(85))
+
+
+class Histogram(object):
+    """
+    latency histogram with fixed log-spaced buckets.
+
+    recording is a bisect and three additions. percentiles are answered with the upper bound of the
+    bucket they fall in, so they are accurate to ~19% (one bucket).
+    """
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last bucket: above BUCKETS[-1]
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, point) -> float:
+        """
+        @param point: percentile (e.g. 99)
+        @return: upper bound (seconds) of the bucket the percentile falls in
+        """
+        if self.count == 0:
+            return 0.0
+        rank = point / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class Metrics(object):
+    """
+    per-exchange, per-method latency histograms, retry counts and error counts.
+
+    assign an instance to the "metrics" attribute of exchanges (or use L{attach}); they use a
+    do-nothing NullMetrics otherwise. thread-safe.
+    """
+
+    def __init__(self):
+        self.__histograms = {}  # {(exchange, method): Histogram}
+        self.__retries = {}  # {(exchange, method): int}
+        self.__errors = {}  # {(exchange, method): int}
+        self.__lock = threading.Lock()
+
+    def attach(self, *exchanges):
+        """
+        make the exchanges (and their connection pools) report to this instance.
+        """
+        for exchange in exchanges:
+            exchange.metrics = self
+            for pool in (getattr(exchange, "connection_pool", None), getattr(exchange, "public_pool", None)):
+                if pool is not None:
+                    pool.metrics = self
+                    pool.metrics_name = exchange.name
+
+    def observe(self, exchange, method, seconds):
+        """
+        @param exchange: name of the exchange
+        @param method: name of the method (or phase) measured
+        @param seconds: latency
+        """
+        key = (exchange, method)
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, exchange, method):
+        """
+        measure the latency of a with block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(exchange, method, time.perf_counter() - start)
+
+    def count_retry(self, exchange, method):
+        key = (exchange, method)
+        with self.__lock:
+            self.__retries[key] = self.__retries.get(key, 0) + 1
+
+    def count_error(self, exchange, method):
+        key = (exchange, method)
+        with self.__lock:
+            self.__errors[key] = self.__errors.get(key, 0) + 1
+
+    def snapshot(self) -> dict:
+        """
+        @return: {exchange: {method: {"count", "mean", "p50", "p99", "max", "retries", "errors"}}}, latency in seconds
+        """
+        with self.__lock:
+            keys = set(self.__histograms) | set(self.__retries) | set(self.__errors)
+            result = {}
+            for key in sorted(keys):
+                histogram = self.__histograms.get(key, Histogram())
+                result.setdefault(key[0], {})[key[1]] = {
+                    "count": histogram.count,
+                    "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+                    "p50": histogram.percentile(50),
+                    "p99": histogram.percentile(99),
+                    "max": histogram.max,
+                    "retries": self.__retries.get(key, 0),
+                    "errors": self.__errors.get(key, 0)}
+            return result
+
+    def to_prometheus(self, prefix="exchange_api") -> str:
+        """
+        @param prefix: prefix of the metric names
+        @return: metrics in Prometheus text exposition format
+        """
+        lines = ["# HELP {}_latency_seconds Latency of exchange API calls.".format(prefix),
+                 "# TYPE {}_latency_seconds histogram".format(prefix)]
+        with self.__lock:
+            for (exchange, method), histogram in sorted(self.__histograms.items()):
+                labels = 'exchange="{}",method="{}"'.format(exchange, method)
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    if count:  # empty buckets are implied by the cumulative counts
+                        lines.append('{}_latency_seconds_bucket{{{},le="{:.6g}"}} {}'.format(
+                            prefix, labels, bound, cumulative))
+                lines.append('{}_latency_seconds_bucket{{{},le="+Inf"}} {}'.format(prefix, labels, histogram.count))
+                lines.append("{}_latency_seconds_sum{{{}}} {}".format(prefix, labels, histogram.sum))
+                lines.append("{}_latency_seconds_count{{{}}} {}".format(prefix, labels, histogram.count))
+
+            for name, counters, text in (("retries", self.__retries, "Retries of exchange API calls."),
+                                         ("errors", self.__errors, "Failed exchange API calls.")):
+                lines.append("# HELP {}_{}_total {}".format(prefix, name, text))
+                lines.append("# TYPE {}_{}_total counter".format(prefix, name))
+                for (exchange, method), count in sorted(counters.items()):
+                    lines.append('{}_{}_total{{exchange="{}",method="{}"}} {}'.format(
+                        prefix, name, exchange, method, count))
+        return "\n".join(lines) + "\n"
+
+
+class NullMetrics(object):
+    """
+    metrics that record nothing. the default of every exchange, so instrumentation costs a no-op call.
+    """
+
+    def observe(self, exchange, method, seconds):
+        pass
+
+    @contextmanager
+    def timer(self, exchange, method):
+        yield
+
+    def count_retry(self, exchange, method):
+        pass
+
+    def count_error(self, exchange, method):
+        pass
+
+
+NULL_METRICS = NullMetrics()
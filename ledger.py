@@ -0,0 +1,168 @@
+__author__ = 'Antares'
+
+from decimal import Decimal
+import threading
+import time
+
+
+class Ledger(object):
+    """
+    thread-safe local balances of many exchange accounts, updated from fills instead of balance requests.
+
+    balances are kept per venue (exchange name, one account per exchange) and summed by L{total}.
+    the exchange is asked again (reconciled) when the balance of a venue is first needed,
+    every reconcile_interval seconds, every reconcile_fills fills, and after a fill whose outcome is uncertain.
+    differences found by a reconciliation (drift) are logged and counted.
+    """
+
+    def __init__(self, reconcile_interval=60.0, reconcile_fills=None, tolerance=Decimal("0.00000001")):
+        """
+
+        @param reconcile_interval: max age (seconds) of the last balance from the exchange. None for no limit.
+        @param reconcile_fills: max fills applied since the last balance from the exchange. None for no limit.
+        @param tolerance: differences up to this are not drift
+        @return:
+        """
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_fills = reconcile_fills
+        self.tolerance = Decimal(tolerance)
+
+        self.__balances = {}  # {venue: {currency: Decimal}}
+        self.__synced = {}  # {venue: time of the last balance from the exchange}
+        self.__fills = {}  # {venue: fills since then}
+        self.__applied = {}  # {venue: fills applied ever}. never reset, tells reconcile() a fill came in meanwhile
+        self.__dirty = set()  # venues to reconcile before their balance is used again
+        self.__lock = threading.Lock()
+
+        # metrics
+        self.fills = 0
+        self.reconciliations = 0
+        self.drifts = 0
+
+    def set_balance(self, venue, funds):
+        """
+        take a balance received from the exchange as the truth.
+
+        @param venue: name of the exchange
+        @param funds: {currency: amount, ..., "time_stamp": ...}
+        """
+        with self.__lock:
+            self.__balances[venue] = dict((key, Decimal(value)) for key, value in funds.items() if key != "time_stamp")
+            self.__synced[venue] = time.time()
+            self.__fills[venue] = 0
+            self.__dirty.discard(venue)
+
+    def apply_fill(self, venue, asset, currency, side, amount, price, fee_rate, certain=True):
+        """
+        apply a market order fill. the fee is taken from what is received.
+
+        @param venue: name of the exchange
+        @param asset: asset traded, e.g. "ltc"
+        @param currency: currency paid or received, e.g. "usd"
+        @param side: "buy" or "sell"
+        @param amount: amount of asset executed
+        @param price: average execution price
+        @param fee_rate: fee rate (0.01 for 1%)
+        @param certain: False if the fill may be incomplete (e.g. order still live), to reconcile before next use
+        """
+        amount, price, fee_rate = Decimal(amount), Decimal(price), Decimal(fee_rate)
+        with self.__lock:
+            balance = self.__balances.setdefault(venue, {})
+            if side == "buy":
+                balance[asset] = balance.get(asset, Decimal(0)) + amount * (1 - fee_rate)
+                balance[currency] = balance.get(currency, Decimal(0)) - amount * price
+            else:
+                balance[asset] = balance.get(asset, Decimal(0)) - amount
+                balance[currency] = balance.get(currency, Decimal(0)) + amount * price * (1 - fee_rate)
+            self.__fills[venue] = self.__fills.get(venue, 0) + 1
+            self.__applied[venue] = self.__applied.get(venue, 0) + 1
+            self.fills += 1
+            if not certain:
+                self.__dirty.add(venue)
+
+    def invalidate(self, venue):
+        """
+        reconcile venue before its balance is used again (e.g. an order ended in an unknown state).
+        """
+        with self.__lock:
+            self.__dirty.add(venue)
+
+    def needs_reconcile(self, venue) -> bool:
+        with self.__lock:
+            if (venue not in self.__synced) or (venue in self.__dirty):
+                return True
+            if (self.reconcile_interval is not None) and (time.time() - self.__synced[venue] > self.reconcile_interval):
+                return True
+            return (self.reconcile_fills is not None) and (self.__fills[venue] >= self.reconcile_fills)
+
+    def balance(self, venue) -> dict:
+        """
+        @return: local balance of venue {currency: Decimal, ..., 'time_stamp': Decimal}, B{without} reconciling
+        """
+        with self.__lock:
+            funds = dict(self.__balances.get(venue, {}))
+        funds["time_stamp"] = Decimal(str(time.time()))
+        return funds
+
+    def balance_of(self, exchange) -> dict:
+        """
+        @param exchange: Exchange instance with get_balance()
+        @return: balance of the exchange's venue, reconciled first if due (see needs_reconcile)
+        """
+        if self.needs_reconcile(exchange.name):
+            return self.reconcile(exchange)
+        return self.balance(exchange.name)
+
+    def reconcile(self, exchange) -> dict:
+        """
+        replace the local balance of the exchange's venue by the one of get_balance(), logging any drift.
+        if a fill of the venue was applied while the balance was requested, the exchange may or may not
+        have counted it yet: no drift is reported.
+
+        @param exchange: Exchange instance with get_balance()
+        @return: balance received
+        """
+        venue = exchange.name
+        with self.__lock:
+            expected = dict(self.__balances[venue]) if venue in self.__synced else None
+            applied = self.__applied.get(venue, 0)
+
+        funds = exchange.get_balance()
+        self.set_balance(venue, funds)  # get_balance() may have done it already; no harm
+
+        with self.__lock:
+            self.reconciliations += 1
+            if self.__applied.get(venue, 0) != applied:
+                expected = None  # a fill raced the request
+            drift = self.__drift(expected, funds) if expected is not None else None
+            if drift:
+                self.drifts += 1
+        if drift:
+            exchange.logger.warning("ledger drift on %s: %s", venue, drift)
+        return funds
+
+    def total(self) -> dict:
+        """
+        @return: {currency: Decimal} summed over all venues
+        """
+        totals = {}
+        with self.__lock:
+            for balance in self.__balances.values():
+                for currency, amount in balance.items():
+                    totals[currency] = totals.get(currency, Decimal(0)) + amount
+        return totals
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {"fills": self.fills, "reconciliations": self.reconciliations, "drifts": self.drifts}
+
+    def __drift(self, expected, funds) -> dict:
+        """
+        @return: {currency: received - expected} of the differences above tolerance
+        """
+        drift = {}
+        for currency in set(expected) | set(key for key in funds if key != "time_stamp"):
+            difference = Decimal(funds.get(currency, 0)) - expected.get(currency, Decimal(0))
+            if abs(difference) > self.tolerance:
+                drift[currency] = difference
+        return drift
@@ -0,0 +1,134 @@
+__author__ = 'Antares'
+
+#  low-overhead logging of the exchange classes.
+#
+#  the exchange classes log with lazy %-style arguments: a call below the logger level costs a level check,
+#  nothing is formatted. start_queue_logging() moves what is left off the calling thread: a record is put
+#  on a queue as it is, and a background thread formats and writes it with the real handlers.
+#
+#      listener = start_queue_logging(logging.getLogger("master"), logging.FileHandler("master.log"),
+#                                     structured=True)
+#      ...
+#      listener.stop()  # writes the records still queued
+#
+#  lean_records() further cuts the cost of building every record, for the whole process.
+#
+#  the exchange classes add extra={...} fields to the records of their requests (venue, symbol, method and,
+#  where timed, latency in seconds). StructuredFormatter writes them as fields of their own.
+
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+
+
+# types of the log arguments the caller may still change after logging, see DeferredQueueHandler
+_MUTABLE = (dict, list, set)
+
+# attributes of every LogRecord. the others were given by extra={...} and are added to structured output
+_RECORD_ATTRIBUTES = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime",
+                                                                                          "event"}
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    a QueueHandler that leaves all formatting to the listener thread.
+
+    the stdlib QueueHandler formats the message (and the traceback) in the calling thread before queueing,
+    so that records can be pickled. here the message, its arguments and exc_info are only turned into text
+    by the QueueListener, unless an argument is a dict, list or set: the caller may still change it
+    (e.g. an answer parsed in place right after being logged), so the message is formatted now.
+    formatting once is cheaper than copying the argument. the template is kept as record.event.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        if args and (isinstance(args, _MUTABLE) or any(isinstance(arg, _MUTABLE) for arg in args)):
+            record.event = record.msg
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    format records as one line of key=value pairs, or as one JSON object.
+
+    besides time, level, logger name and message, the output holds the message template (event),
+    so that records of the same call site can be grouped, and every field given by extra={...}.
+    """
+
+    def __init__(self, json_lines=False):
+        """
+
+        @param json_lines: one JSON object per record instead of key=value pairs
+        @return:
+        """
+        logging.Formatter.__init__(self)
+        self.json_lines = json_lines
+
+    def fields(self, record) -> dict:
+        """
+        @return: {field: value} of record
+        """
+        fields = {"time": "{:.6f}".format(record.created),
+                  "level": record.levelname,
+                  "logger": record.name,
+                  "event": str(getattr(record, "event", record.msg)),
+                  "message": record.getMessage()}
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                fields[key] = value
+        if record.exc_info:
+            fields["exception"] = self.formatException(record.exc_info)
+        return fields
+
+    def format(self, record) -> str:
+        fields = self.fields(record)
+        if self.json_lines:
+            return json.dumps(fields, default=str)
+        return " ".join("{}={}".format(key, json.dumps(str(value))) for key, value in fields.items())
+
+
+def lean_records():
+    """
+    stop filling the LogRecord fields that cost most to collect and that the formatters here do not use:
+    source file and line (a walk up the stack), thread, process and asyncio task names.
+    affects every logger of the process; %(filename)s, %(lineno)d, %(threadName)s etc. are then empty.
+    """
+    logging._srcfile = None  # documented way to skip logging.Logger.findCaller()
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    logging.logAsyncioTasks = False  # Python 3.12+
+
+
+def start_queue_logging(logger, *handlers, structured=False, json_lines=False, maxsize=0) -> QueueListener:
+    """
+    make logger write its records from a background thread.
+
+    logger gets a single DeferredQueueHandler. the handlers (by default the ones logger had) are moved
+    behind it, to a QueueListener. give the logger of the master (e.g. logging.getLogger("master")):
+    the loggers of its exchanges ("master.BTCe", ...) propagate to it.
+
+    @param logger: logging.Logger
+    @param handlers: handlers writing the records. none for the current handlers of logger.
+    @param structured: set a StructuredFormatter on the handlers
+    @param json_lines: see StructuredFormatter
+    @param maxsize: max records queued. 0 for no limit. if the queue is full, records are dropped
+    (reported by logging.raiseExceptions) instead of blocking the caller.
+    @return: started QueueListener. call its stop() to write the records still queued and end the thread.
+    """
+    if not handlers:
+        handlers = tuple(handler for handler in logger.handlers if not isinstance(handler, DeferredQueueHandler))
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+    if structured:
+        for handler in handlers:
+            handler.setFormatter(StructuredFormatter(json_lines))
+
+    records = queue.Queue(maxsize)
+    logger.addHandler(DeferredQueueHandler(records))
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,97 @@
+__author__ = 'Antares'
+
+import itertools
+import mmap
+import os
+import struct
+import threading
+
+
+LEASE = struct.Struct("<Q")
+
+
+class NonceAllocator(object):
+    """
+    thread-safe source of increasing nonces.
+
+    L{next} is a single next() on an itertools.count, which is atomic in CPython, so threads never share
+    a nonce and the hot path takes no lock.
+
+    with a path, the allocator persists a lease to a small memory-mapped file: every nonce handed out
+    is below the lease on disk, and the lease is moved forward in blocks, so the file is written once per
+    block instead of once per request. after a restart, counting resumes at the lease and the
+    nonce discovery round trip can be skipped.
+
+    note: the exchange still rejects a nonce that arrives after a bigger one, so requests sent
+    concurrently may have to be retried. the allocator only guarantees they never collide.
+    """
+
+    def __init__(self, path=None, block=1000):
+        """
+
+        @param path: file to persist the lease in. None to keep nonces in memory only.
+        @param block: how many nonces are leased at once
+        @return:
+        """
+        self.path = path
+        self.block = block
+
+        self.__counter = None
+        self.__lease = 0
+        self.__lock = threading.Lock()
+        self.__map = None
+
+        if path is not None:
+            if not os.path.exists(path) or os.path.getsize(path) < LEASE.size:
+                with open(path, "wb") as f:
+                    f.write(LEASE.pack(0))
+            with open(path, "r+b") as f:
+                self.__map = mmap.mmap(f.fileno(), LEASE.size)
+            lease = LEASE.unpack_from(self.__map)[0]
+            if lease:
+                self.reset(lease - 1)  # every nonce below the lease may have been used
+
+    @property
+    def known(self) -> bool:
+        """
+        @return: True if the allocator knows where to count from
+        """
+        return self.__counter is not None
+
+    def reset(self, last):
+        """
+        continue counting after the given nonce.
+
+        @param last: last nonce used (e.g. reported by the exchange)
+        """
+        with self.__lock:
+            self.__counter = itertools.count(last + 1)
+            self.__extend(last + 1)
+
+    def next(self):
+        """
+        @return: a nonce bigger than any returned before, or None if not known yet
+        """
+        counter = self.__counter
+        if counter is None:
+            return None
+        nonce = next(counter)
+        if nonce >= self.__lease:  # rare: once per block
+            with self.__lock:
+                if nonce >= self.__lease:
+                    self.__extend(nonce)
+        return nonce
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+
+    def __extend(self, nonce):
+        """
+        lease nonces up to nonce + block. must hold self.__lock.
+        """
+        self.__lease = nonce + self.block
+        if self.__map is not None:
+            LEASE.pack_into(self.__map, 0, self.__lease)
+            self.__map.flush()
@@ -0,0 +1,216 @@
+__author__ = 'Antares'
+
+from bisect import bisect_left
+from decimal import Decimal
+import threading
+import time
+
+
+class BookSide(object):
+    """
+    one side of an order book: price levels kept sorted best first in plain arrays.
+
+    cumulative amount and notional arrays make "how much does it cost to take this amount" a bisect.
+    they are rebuilt lazily, and only from the first level that changed since the last query,
+    so updates near the top of the book do not re-sum the whole side.
+    """
+
+    def __init__(self, descending):
+        """
+
+        @param descending: True for bids (best = highest price), False for asks
+        @return:
+        """
+        self.descending = descending
+        self.__keys = []  # sort keys, ascending: -price for bids, price for asks
+        self.prices = []
+        self.amounts = []
+        self.__cum_amount = []
+        self.__cum_notional = []
+        self.__valid = 0  # cumulative arrays are valid below this index
+
+    def __len__(self):
+        return len(self.prices)
+
+    @property
+    def best(self):
+        return self.prices[0] if self.prices else None
+
+    def update(self, price, amount):
+        """
+        set the amount of a price level. amount 0 removes the level.
+
+        @param price: Decimal
+        @param amount: Decimal
+        """
+        key = -price if self.descending else price
+        i = bisect_left(self.__keys, key)
+        exists = (i < len(self.__keys)) and (self.__keys[i] == key)
+        if amount:
+            if exists:
+                if self.amounts[i] == amount:
+                    return
+                self.amounts[i] = amount
+            else:
+                self.__keys.insert(i, key)
+                self.prices.insert(i, price)
+                self.amounts.insert(i, amount)
+        elif exists:
+            del self.__keys[i], self.prices[i], self.amounts[i]
+        else:
+            return
+        self.__valid = min(self.__valid, i)
+
+    def replace(self, levels):
+        """
+        replace the side with a snapshot, applying only the levels that differ.
+
+        @param levels: iterable of (price, amount)
+        """
+        new = dict(levels)
+        for price in [price for price in self.prices if price not in new]:
+            self.update(price, 0)
+        for price, amount in new.items():
+            self.update(price, amount)
+
+    def cost(self, amount) -> tuple:
+        """
+        walk the side to take amount.
+
+        @param amount: amount of asset to take
+        @return: (amount available up to the requested amount, notional, worst price touched)
+        """
+        if not self.prices or amount <= 0:
+            return Decimal(0), Decimal(0), None
+        self.__accumulate()
+
+        i = bisect_left(self.__cum_amount, amount)
+        if i >= len(self.prices):  # not enough depth: take everything
+            return self.__cum_amount[-1], self.__cum_notional[-1], self.prices[-1]
+        before_amount = self.__cum_amount[i - 1] if i else Decimal(0)
+        before_notional = self.__cum_notional[i - 1] if i else Decimal(0)
+        return amount, before_notional + (amount - before_amount) * self.prices[i], self.prices[i]
+
+    def __accumulate(self):
+        n = len(self.prices)
+        del self.__cum_amount[self.__valid:], self.__cum_notional[self.__valid:]
+        total_amount = self.__cum_amount[-1] if self.__cum_amount else Decimal(0)
+        total_notional = self.__cum_notional[-1] if self.__cum_notional else Decimal(0)
+        for i in range(self.__valid, n):
+            total_amount += self.amounts[i]
+            total_notional += self.amounts[i] * self.prices[i]
+            self.__cum_amount.append(total_amount)
+            self.__cum_notional.append(total_notional)
+        self.__valid = n
+
+
+class OrderBook(object):
+    """
+    order book of one symbol, updated incrementally from snapshots or diffs.
+    """
+
+    def __init__(self, exchange, symbol):
+        """
+
+        @param exchange: name of the exchange
+        @param symbol: trading symbol
+        @return:
+        """
+        self.exchange = exchange
+        self.symbol = symbol
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.time_stamp = None
+        self.__lock = threading.Lock()
+
+    def apply_snapshot(self, bids, asks):
+        """
+        @param bids: iterable of (price, amount)
+        @param asks: iterable of (price, amount)
+        """
+        with self.__lock:
+            self.bids.replace(bids)
+            self.asks.replace(asks)
+            self.time_stamp = time.time()
+
+    def apply_diff(self, side, price, amount):
+        """
+        @param side: "bid" or "ask"
+        @param price: price level
+        @param amount: new amount of the level, 0 to remove it
+        """
+        with self.__lock:
+            (self.bids if side == "bid" else self.asks).update(price, amount)
+            self.time_stamp = time.time()
+
+    @property
+    def best_bid(self):
+        return self.bids.best
+
+    @property
+    def best_ask(self):
+        return self.asks.best
+
+    def fill(self, side, amount) -> tuple:
+        """
+        @param side: "buy" (takes asks) or "sell" (takes bids)
+        @param amount: amount of asset to trade
+        @return: (fillable amount, notional, worst price touched)
+        """
+        with self.__lock:
+            return (self.asks if side == "buy" else self.bids).cost(amount)
+
+    def vwap(self, side, amount):
+        """
+        @return: volume weighted average price of a market order of amount, or None if the book is empty
+        """
+        filled, notional, _ = self.fill(side, amount)
+        return notional / filled if filled else None
+
+    def slippage(self, side, amount):
+        """
+        @return: relative cost of a market order of amount against the best price (0.001 for 0.1%), or None
+        """
+        vwap = self.vwap(side, amount)
+        best = self.best_ask if side == "buy" else self.best_bid
+        if vwap is None:
+            return None
+        return vwap / best - 1 if side == "buy" else 1 - vwap / best
+
+    def __repr__(self):
+        return "OrderBook({}, {}, bid={}, ask={}, levels={}/{})".format(
+            self.exchange, self.symbol, self.best_bid, self.best_ask, len(self.bids), len(self.asks))
+
+
+class OrderBookPoller(object):
+    """
+    keep exchange.order_book up to date from periodic snapshots in a background thread.
+    """
+
+    def __init__(self, exchange, interval=1.0):
+        """
+
+        @param exchange: exchange with update_order_book()
+        @param interval: pause (seconds) between two snapshots
+        @return:
+        """
+        self.exchange = exchange
+        self.interval = interval
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run, name="OrderBookPoller", daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+
+    def __run(self):
+        while not self.__stop.is_set():
+            try:
+                self.exchange.update_order_book()
+            except Exception as e:
+                self.exchange.logger.error("OrderBookPoller failure. Msg: %s", e, exc_info=True)
+            self.__stop.wait(self.interval)
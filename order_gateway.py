@@ -0,0 +1,211 @@
+__author__ = 'Antares'
+
+from concurrent.futures import Future
+from decimal import Decimal
+import threading
+import time
+
+from exchanges import currencies
+
+
+class OrderGateway(object):
+    """
+    a thread-safe front of an exchange that batches the market orders of concurrent callers.
+
+    the first order of a batch opens a window. orders arriving within the window join the batch.
+    when the window closes, buys and sells are netted and a single market order of the net amount
+    is sent, or none at all if they cancel out. opposing callers are crossed against each other at no fee,
+    and every caller gets the fill of its own order (see L{submit}).
+
+    all orders of a batch share its outcome: if the exchange order fails, every caller of the batch gets the exception.
+    """
+
+    def __init__(self, exchange, window=0.005):
+        """
+
+        @param exchange: exchange with symbol, fee_rate, market_buy(amount) and market_sell(amount).
+        if it keeps a ledger, the price of exchange orders is taken from the balance change,
+        otherwise from the exchange's most_recent_quote, if it has one already.
+        @param window: time (seconds) the first order of a batch waits for others to join
+        @return:
+        """
+        self.exchange = exchange
+        self.window = window
+
+        self.__batch = None  # [(side, amount, Future)] waiting for the window to close
+        self.__lock = threading.Lock()
+
+        # metrics
+        self.orders = 0
+        self.batches = 0
+        self.exchange_orders = 0
+        self.netted = Decimal(0)  # amount crossed between callers instead of being sent to the exchange
+
+    def market_buy(self, amount) -> dict:
+        """
+        @param amount: see exchange.market_buy
+        @return: fill of this order, see L{submit}
+        """
+        return self.submit("buy", amount).result()
+
+    def market_sell(self, amount) -> dict:
+        """
+        @param amount: see exchange.market_sell
+        @return: fill of this order, see L{submit}
+        """
+        return self.submit("sell", amount).result()
+
+    def submit(self, side, amount) -> Future:
+        """
+        add an order to the current batch, opening a new one if needed.
+
+        @param side: "buy" or "sell"
+        @param amount: amount of asset
+        @return: Future resolving to the fill of this order:
+        {"side": side, "amount": amount, "crossed": part crossed with opposing orders of the batch,
+        "price": average price, "fee": share of the exchange fee}.
+        the crossed part is priced at the mark price (mid of the exchange's quote), the rest at the price
+        of the exchange order. like on the exchanges, the fee is in asset for a buy and in currency for a sell.
+        """
+        if side not in ("buy", "sell"):
+            raise ValueError("unknown side: {}".format(side))
+        future = Future()
+        with self.__lock:
+            self.orders += 1
+            leader = self.__batch is None
+            if leader:
+                self.__batch = []
+            self.__batch.append((side, Decimal(amount), future))
+
+        if leader:
+            threading.Thread(target=self.__flush, name="{}.OrderGateway".format(self.exchange.name),
+                             daemon=True).start()
+        return future
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {"orders": self.orders,
+                    "batches": self.batches,
+                    "exchange_orders": self.exchange_orders,
+                    "requests_saved": self.orders - self.exchange_orders,
+                    "netted": self.netted}
+
+    def __flush(self):
+        time.sleep(self.window)
+        bought = sold = Decimal(0)
+        with self.__lock:
+            batch, self.__batch = self.__batch, None
+            for side, amount, _ in batch:
+                if side == "buy":
+                    bought += amount
+                else:
+                    sold += amount
+            net = bought - sold
+            self.batches += 1
+            self.netted += min(bought, sold)
+            if net != 0:
+                self.exchange_orders += 1
+        self.exchange.logger.debug("OrderGateway batch of %s orders: buy %s, sell %s, net %s",
+                                   len(batch), bought, sold, net)
+
+        try:
+            price = fee = None
+            if net != 0:
+                price, fee = self.__exchange_order("buy" if net > 0 else "sell", abs(net))
+            mark = self.__mark_price(price)
+            if price is None:
+                price = mark
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        # callers of the side of net share the exchange order in proportion of their amount, all others are crossed
+        majority = bought if net > 0 else sold
+        for side, amount, future in batch:
+            exchanged = Decimal(0)
+            if (net > 0 and side == "buy") or (net < 0 and side == "sell"):
+                exchanged = amount * abs(net) / majority
+            crossed = amount - exchanged
+            if mark is None:  # nothing to price from
+                average = share = None
+            elif exchanged:
+                average = (crossed * mark + exchanged * price) / amount
+                share = fee * amount / majority
+            else:
+                average = mark
+                share = Decimal(0)
+            future.set_result({"side": side, "amount": amount, "crossed": crossed, "price": average, "fee": share})
+
+    def __exchange_order(self, side, amount) -> tuple:
+        """
+        send the net order of a batch.
+
+        @return: (average price, fee). both None if the price is unknown
+        """
+        exchange = self.exchange
+        fee_rate = Decimal(exchange.fee_rate)
+        ledger = getattr(exchange, "ledger", None)
+        before = ledger.balance(exchange.name) if ledger is not None else None
+        if side == "buy":
+            after = exchange.market_buy(amount)
+        else:
+            after = exchange.market_sell(amount)
+
+        price, executed = self.__balance_price(side, before, after, fee_rate)
+        if price is None:
+            quote = self.__quote()
+            if quote is not None:
+                price = Decimal(quote.ask if side == "buy" else quote.bid)
+        if executed is None:  # as ordered
+            executed = amount
+        if side == "buy":
+            fee = executed * fee_rate
+        else:
+            fee = None if price is None else executed * price * fee_rate
+        return price, fee
+
+    def __balance_price(self, side, before, after, fee_rate) -> tuple:
+        """
+        @return: (average price, amount of asset executed) of an order from the balances before and after it,
+        (None, None) if unknown. the executed amount of a buy includes the fee (e.g. amount/(1-fee_rate) on BTCe).
+        """
+        if (before is None) or (after is None):
+            return None, None
+        asset, currency = currencies(self.exchange.symbol)
+        if any(key not in funds for funds in (before, after) for key in (asset, currency)):
+            return None, None
+        asset_change = Decimal(after[asset]) - Decimal(before[asset])
+        currency_change = Decimal(after[currency]) - Decimal(before[currency])
+        if side == "buy":  # fee taken from the asset received
+            executed = asset_change / (1 - fee_rate)
+            paid = -currency_change
+        else:  # fee taken from the currency received
+            executed = -asset_change
+            paid = currency_change / (1 - fee_rate)
+        if (executed <= 0) or (paid <= 0):
+            return None, None
+        return paid / executed, executed
+
+    def __mark_price(self, price):
+        """
+        @param price: price of the exchange order of the batch, None if there was none
+        @return: mid of the exchange's quote, price if no quote is known
+        """
+        quote = self.__quote()
+        if quote is None:
+            return price
+        return (Decimal(quote.bid) + Decimal(quote.ask)) / 2
+
+    def __quote(self):
+        """
+        @return: the last quote the exchange received, None if it has none. no request is sent for it.
+        """
+        exchange = self.exchange
+        if hasattr(exchange, "cached_quote"):  # BTCe requests most_recent_quote on first use
+            quote = exchange.cached_quote
+        else:  # an attribute of the instance, never a property that could request it
+            quote = vars(exchange).get("most_recent_quote")
+        if (quote is None) or (quote.bid is None) or (quote.ask is None):
+            return None
+        return quote
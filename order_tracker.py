@@ -0,0 +1,180 @@
+__author__ = 'Antares'
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from decimal import Decimal
+import threading
+import time
+
+
+class OrderFill(object):
+    """
+    final state of a tracked order.
+    """
+
+    def __init__(self, order_id, status, balance, timed_out=False):
+        """
+
+        @param order_id: id of the order
+        @param status: last order status received from the exchange
+        @param balance: account balance after the order stopped being tracked
+        @param timed_out: True if the order was still live when the max wait passed
+        @return:
+        """
+        self.order_id = order_id
+        self.status = status
+        self.balance = balance
+        self.timed_out = timed_out
+
+    @property
+    def executed_amount(self) -> Decimal:
+        return Decimal(str(self.status.get("executed_amount", "0")))
+
+    @property
+    def remaining_amount(self) -> Decimal:
+        return Decimal(str(self.status.get("remaining_amount", "0")))
+
+    @property
+    def complete(self) -> bool:
+        return (not self.timed_out) and (self.remaining_amount == 0)
+
+    def __repr__(self):
+        return "OrderFill(order_id={}, executed={}, remaining={}, timed_out={})".format(
+            self.order_id, self.executed_amount, self.remaining_amount, self.timed_out)
+
+
+class OrderTracker(object):
+    """
+    track outstanding Bitfinex orders from a single background thread.
+
+    L{track} returns a Future right away. all outstanding orders are checked with B{one} "/orders" request
+    (the list of live orders), and only orders that left that list get a "/order/status" request.
+    the poll interval starts at min_interval whenever a new order comes in and grows by backoff
+    up to max_interval while nothing changes. the balance after a resolved order is fetched by a small
+    pool of threads, so a slow balance request does not hold up the polling of the other orders.
+    """
+
+    def __init__(self, exchange, min_interval=0.05, max_interval=2.0, backoff=2.0, max_wait=60.0,
+                 balance_workers=2):
+        """
+
+        @param exchange: Bitfinex instance
+        @param min_interval: first pause (seconds) between two polls
+        @param max_interval: longest pause (seconds) between two polls
+        @param backoff: the pause is multiplied by this after every poll that changed nothing
+        @param max_wait: an order still live after this many seconds is resolved as partially filled
+        @param balance_workers: max number of threads fetching balances after resolved orders
+        @return:
+        """
+        self.exchange = exchange
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.balance_workers = balance_workers
+
+        self.__orders = {}  # {order_id: [Future, last status, deadline]}
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__executor = None  # ThreadPoolExecutor fetching balances, started with the polling thread
+        self.__interval = min_interval
+
+        # metrics
+        self.polls = 0
+        self.status_requests = 0
+
+    def track(self, order_id, status=None) -> Future:
+        """
+        start tracking an order.
+
+        @param order_id: id of the order
+        @param status: status already known (e.g. the answer of "/order/new")
+        @return: Future resolving to an OrderFill
+        """
+        future = Future()
+        with self.__condition:
+            self.__orders[order_id] = [future, status, time.time() + self.max_wait]
+            self.__interval = self.min_interval
+            if self.__thread is None:
+                self.__executor = ThreadPoolExecutor(self.balance_workers, thread_name_prefix="OrderTracker.balance")
+                self.__thread = threading.Thread(target=self.__run, name="OrderTracker", daemon=True)
+                self.__thread.start()
+            self.__condition.notify()
+        return future
+
+    def outstanding(self) -> int:
+        with self.__condition:
+            return len(self.__orders)
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__orders:
+                    self.__condition.wait()
+                orders = dict(self.__orders)
+
+            try:
+                changed = self.__poll(orders)
+            except Exception as e:
+                self.exchange.logger.error("OrderTracker poll failure. Msg: %s", e, exc_info=True)
+                changed = False
+
+            with self.__condition:
+                if changed:
+                    self.__interval = self.min_interval
+                else:
+                    self.__interval = min(self.__interval * self.backoff, self.max_interval)
+                if self.__orders:
+                    self.__condition.wait(self.__interval)  # a new order wakes us up early
+
+    def __poll(self, orders) -> bool:
+        """
+        @param orders: snapshot of self.__orders
+        @return: True if any order was resolved
+        """
+        is_live = self.exchange._is_order_live
+        done = [order_id for order_id, (_, status, _) in orders.items()
+                if (status is not None) and (not is_live(status))]
+        now = time.time()
+        expired = [order_id for order_id, (_, _, deadline) in orders.items()
+                   if (order_id not in done) and (now > deadline)]
+
+        if len(done) < len(orders):
+            # one request for all outstanding orders
+            self.polls += 1
+            active = self.exchange.get_authenticated_data("/orders", {})
+            if isinstance(active, list):
+                live_ids = set(order["id"] for order in active)
+                done.extend(order_id for order_id in orders
+                            if (order_id not in live_ids) and (order_id not in done))
+
+        resolved = False
+        for order_id in set(done) | set(expired):
+            status = orders[order_id][1]
+            if is_live(status):
+                self.status_requests += 1
+                answer = self.exchange.get_authenticated_data("/order/status", {"order_id": order_id})
+                if (answer is not None) and ("is_live" in answer):
+                    status = answer
+            if is_live(status) and (order_id not in expired):
+                continue  # not final yet, check again next time
+            self.__resolve(order_id, status or {}, timed_out=is_live(status))
+            resolved = True
+        return resolved
+
+    def __resolve(self, order_id, status, timed_out):
+        with self.__condition:
+            future = self.__orders.pop(order_id)[0]
+
+        if timed_out:
+            self.exchange.logger.critical("Order was NOT filled in time. status = %s", status)
+        self.__executor.submit(self.__settle, future, order_id, status, timed_out)
+
+    def __settle(self, future, order_id, status, timed_out):
+        """
+        get the balance after a resolved order and complete its Future. runs on self.__executor.
+        """
+        try:
+            balance = self.exchange._balance_after_order(status)
+            future.set_result(OrderFill(order_id, status, balance, timed_out))
+        except Exception as e:
+            future.set_exception(e)
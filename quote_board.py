@@ -0,0 +1,270 @@
+__author__ = 'Antares'
+
+#  latest quotes of many (exchange, symbol) pairs in shared memory, written by worker processes.
+#
+#  layout of the board:
+#      header: HEADER (length of the JSON key list), the JSON key list, padded to SLOT_SIZE
+#      slots: one SLOT_SIZE slot per key, in the order of the key list
+#  a slot holds a sequence number and a fixed_point.FastQuote: scaled bid and ask, time stamp in ns, places.
+#
+#  every slot has a single writer (the worker its key is sharded to) and any number of readers.
+#  the writer makes the sequence number odd, writes the quote and makes it even again (seqlock);
+#  a reader retries until it sees the same even sequence number before and after reading.
+
+import json
+import multiprocessing
+from multiprocessing import shared_memory
+import struct
+import time
+
+from exchanges import BTCe, Bitfinex
+from fixed_point import FastQuote
+
+
+HEADER = struct.Struct("<I")
+SLOT = struct.Struct("<QqqqB")  # sequence, bid, ask, time stamp (ns), places
+SLOT_SIZE = 64  # one cache line per slot, so that writers of neighbouring slots do not contend
+
+
+class BusySlotError(Exception):
+    """
+    raised by QuoteBoard.read when a slot stays locked by its writer, e.g. a worker that died while writing.
+    """
+    pass
+
+
+def _attach(name, untrack) -> shared_memory.SharedMemory:
+    """
+    attach to an existing segment.
+
+    @param untrack: keep the segment off the resource tracker of this process, which would unlink it
+    when this process exits. needed in processes that were not started by the creator.
+    """
+    if not untrack:
+        return shared_memory.SharedMemory(name=name)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        from multiprocessing import resource_tracker
+        memory = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(memory._name, "shared_memory")
+        return memory
+
+
+class QuoteBoard(object):
+    """
+    a fixed-layout board of the latest FastQuote per (exchange name, symbol), in shared memory.
+
+    the creator owns the segment and unlinks it on close. other processes attach by name (see L{attach}).
+    reads unpack straight from the shared buffer: no copy of the board, no IPC round trip.
+    """
+
+    def __init__(self, keys, name=None, memory=None):
+        """
+
+        @param keys: list of (exchange name, symbol)
+        @param name: name of the shared memory segment to create. None for a random one.
+        @param memory: existing SharedMemory to use instead of creating one (see L{attach})
+        @return:
+        """
+        self.keys = [tuple(key) for key in keys]
+        self.index = dict((key, i) for i, key in enumerate(self.keys))
+
+        header = json.dumps(self.keys).encode()
+        self.__offset = -(-(HEADER.size + len(header)) // SLOT_SIZE) * SLOT_SIZE
+        self.owner = memory is None
+        if self.owner:
+            memory = shared_memory.SharedMemory(name=name, create=True,
+                                                size=self.__offset + SLOT_SIZE * len(self.keys))
+            HEADER.pack_into(memory.buf, 0, len(header))
+            memory.buf[HEADER.size:HEADER.size + len(header)] = header
+        self.memory = memory
+        self.name = memory.name
+        self.__buffer = memory.buf
+
+        # metrics
+        self.retries = 0
+
+    @classmethod
+    def attach(cls, name, untrack=False):
+        """
+        @param name: name of the segment of a QuoteBoard created by another process
+        @param untrack: True in a process that was not started (directly or not) by the creator of the board.
+        see _attach
+        @return: QuoteBoard on the same memory
+        """
+        memory = _attach(name, untrack)
+        length = HEADER.unpack_from(memory.buf, 0)[0]
+        keys = json.loads(bytes(memory.buf[HEADER.size:HEADER.size + length]))
+        return cls(keys, memory=memory)
+
+    def write(self, quote):
+        """
+        publish a quote. B{only} the single writer of the slot may call this.
+
+        @param quote: FastQuote, or a non-empty util.Quote
+        """
+        if not isinstance(quote, FastQuote):
+            quote = FastQuote.from_quote(quote)
+        offset = self.__offset + SLOT_SIZE * self.index[(quote.exchange, quote.symbol)]
+        buffer = self.__buffer
+        sequence = SLOT.unpack_from(buffer, offset)[0]
+        struct.pack_into("<Q", buffer, offset, sequence + 1)  # odd: write in progress
+        SLOT.pack_into(buffer, offset, sequence + 1, quote.bid, quote.ask, quote.time_stamp, quote.places)
+        struct.pack_into("<Q", buffer, offset, sequence + 2)
+
+    def read(self, exchange, symbol, timeout=0.1):
+        """
+        @param exchange: name of the exchange
+        @param symbol: trading symbol
+        @param timeout: max time (seconds) to wait for a write in progress. a write takes microseconds.
+        @return: consistent FastQuote of the slot, or None if nothing was written yet
+        @raise BusySlotError: if the slot stayed locked for timeout
+        """
+        offset = self.__offset + SLOT_SIZE * self.index[(exchange, symbol)]
+        buffer = self.__buffer
+        deadline = None
+        while True:
+            sequence, bid, ask, time_stamp, places = SLOT.unpack_from(buffer, offset)
+            if (sequence & 1 == 0) and (struct.unpack_from("<Q", buffer, offset)[0] == sequence):
+                break
+            self.retries += 1  # a write was in progress
+            if deadline is None:
+                deadline = time.monotonic() + timeout
+            elif time.monotonic() > deadline:
+                raise BusySlotError("slot of {} {} locked for {}s (sequence {})".format(
+                    exchange, symbol, timeout, sequence))
+        if sequence == 0:
+            return None
+        return FastQuote(bid, ask, time_stamp, exchange, symbol, places)
+
+    def version(self, exchange, symbol) -> int:
+        """
+        @return: number of quotes written to the slot so far. cheap way to poll for changes.
+        """
+        offset = self.__offset + SLOT_SIZE * self.index[(exchange, symbol)]
+        return struct.unpack_from("<Q", self.__buffer, offset)[0] // 2
+
+    def snapshot(self) -> dict:
+        """
+        @return: {(exchange name, symbol): FastQuote} of every slot written so far
+        @raise BusySlotError: see L{read}
+        """
+        quotes = {}
+        for exchange, symbol in self.keys:
+            quote = self.read(exchange, symbol)
+            if quote is not None:
+                quotes[(exchange, symbol)] = quote
+        return quotes
+
+    def close(self):
+        """
+        detach. the owner also unlinks the segment.
+        """
+        self.__buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def public_exchange(exchange, symbol):
+    """
+    default exchange factory of the workers: a client for public data only.
+
+    @param exchange: "BTCe" or "Bitfinex"
+    @param symbol: trading symbol
+    @return: Exchange instance
+    """
+    if exchange == BTCe.name:
+        return BTCe("", "", symbol, "0", master_name="quote_board", lazy=True)
+    if exchange == Bitfinex.name:
+        return Bitfinex("", "", symbol, "0", master_name="quote_board")
+    raise ValueError("unknown exchange: {}".format(exchange))
+
+
+def _run_worker(board_name, keys, factory, interval, stop, sharing):
+    """
+    body of a worker process: poll the quote of every key and write it to the board.
+
+    @param sharing: {exchange name: number of workers polling it}. rate limiters are per process,
+    so every worker takes its share of the limit of the host (see rate_limiter.RateLimiter.share)
+    """
+    board = QuoteBoard.attach(board_name)
+    exchanges = [factory(exchange, symbol) for exchange, symbol in keys]
+    shares = {}  # {id of the limiter of a host: share of it for this worker}
+    for (name, _), exchange in zip(keys, exchanges):
+        limiter = exchange.rate_limiter
+        if (limiter is not None) and (sharing[name] > 1):
+            if id(limiter) not in shares:
+                shares[id(limiter)] = limiter.share(sharing[name])
+            exchange.rate_limiter = shares[id(limiter)]
+    try:
+        while not stop.is_set():
+            start = time.monotonic()
+            for exchange in exchanges:
+                try:
+                    quote = exchange.get_quote(timeout=interval)
+                    if (quote.bid is not None) and (quote.ask is not None):
+                        board.write(quote)
+                except Exception as e:
+                    exchange.logger.error("quote board worker failure. Msg: %s", e, exc_info=True)
+            stop.wait(max(0.0, interval - (time.monotonic() - start)))
+    finally:
+        board.close()
+
+
+class ShardedQuoteFeed(object):
+    """
+    poll the quotes of many (exchange name, symbol) pairs from a pool of worker processes into a QuoteBoard.
+
+    pairs are spread round robin over the workers, so every slot of the board has exactly one writer.
+    strategies in any process read the board (see QuoteBoard.attach) instead of polling themselves.
+    the workers polling the same exchange split its rate limit between them.
+    """
+
+    def __init__(self, keys, processes=None, interval=1.0, factory=public_exchange, name=None):
+        """
+
+        @param keys: list of (exchange name, symbol)
+        @param processes: number of worker processes. None for one per CPU, at most one per key.
+        @param interval: pause (seconds) between two rounds of quotes of a worker
+        @param factory: picklable function(exchange name, symbol) -> Exchange, called in the workers
+        @param name: name of the shared memory segment. None for a random one.
+        @return:
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        processes = max(1, min(processes, len(keys)))
+        self.board = QuoteBoard(keys, name=name)
+        self.shards = [self.board.keys[i::processes] for i in range(processes)]
+        self.interval = interval
+        self.factory = factory
+
+        self.__stop = multiprocessing.Event()
+        self.__workers = []
+
+    def start(self):
+        if self.__workers:
+            return
+        self.__stop.clear()
+        sharing = {}  # {exchange name: number of workers polling it}
+        for shard in self.shards:
+            for name in set(name for name, _ in shard):
+                sharing[name] = sharing.get(name, 0) + 1
+        for i, shard in enumerate(self.shards):
+            worker = multiprocessing.Process(target=_run_worker, name="QuoteBoardWorker-{}".format(i),
+                                             args=(self.board.name, shard, self.factory, self.interval, self.__stop,
+                                                   sharing),
+                                             daemon=True)
+            worker.start()
+            self.__workers.append(worker)
+
+    def stop(self, timeout=None):
+        self.__stop.set()
+        for worker in self.__workers:
+            worker.join(timeout)
+        self.__workers = []
+
+    def close(self):
+        self.stop()
+        self.board.close()
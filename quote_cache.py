@@ -0,0 +1,128 @@
+__author__ = 'Antares'
+
+from concurrent.futures import Future, TimeoutError
+import threading
+import time
+
+from util import Quote
+
+
+class QuoteCache(object):
+    """
+    a thread-safe cache of quotes keyed by (exchange name, symbol).
+
+    a quote is served from the cache while it is younger than the TTL of its exchange.
+    concurrent callers asking for the same missing key are coalesced into a single request:
+    the first caller fetches, the others wait for its answer. callers that retry and callers that do not
+    are coalesced separately, so that a caller asking for retries never gets the failure of a single attempt.
+    """
+
+    # BTCe Public API v3: "All information is cached every 2 seconds, so there's no point in making more frequent requests."
+    DEFAULT_TTL = {"BTCe": 2.0}
+
+    def __init__(self, ttl=None, default_ttl=0.0):
+        """
+
+        @param ttl: {exchange name: seconds}. merged into DEFAULT_TTL.
+        @param default_ttl: TTL (seconds) of exchanges not in ttl. 0 only coalesces concurrent requests.
+        @return:
+        """
+        self.ttl = dict(self.DEFAULT_TTL)
+        if ttl is not None:
+            self.ttl.update(ttl)
+        self.default_ttl = default_ttl
+
+        self.__entries = {}  # {key: (Quote, time cached)}
+        self.__in_flight = {}  # {(key, retry): Future}
+        self.__lock = threading.Lock()
+
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def get(self, exchange, symbol, fetch, retry=False, timeout=None):
+        """
+        get a quote from the cache, or fetch it if it is missing or expired.
+
+        empty quotes (failed requests) are returned to all waiting callers but never cached.
+
+        @param exchange: name of the exchange
+        @param symbol: trading symbol
+        @param fetch: function with no arguments that requests a new Quote
+        @param retry: True if fetch retries. only calls with the same retry share a request.
+        @param timeout: max time (seconds) to wait for the request of another caller. None for no limit.
+        @return: Quote, empty if the request failed or the wait timed out
+        """
+        key = (exchange, symbol)
+        flight = (key, bool(retry))
+        ttl = self.ttl.get(exchange, self.default_ttl)
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if (entry is not None) and (time.time() - entry[1] < ttl):
+                self.hits += 1
+                return entry[0]
+
+            future = self.__in_flight.get(flight)
+            if future is not None:
+                leader = False
+                self.coalesced += 1
+            else:
+                leader = True
+                self.misses += 1
+                future = Future()
+                self.__in_flight[flight] = future
+
+        if not leader:
+            try:
+                return future.result(timeout)
+            except TimeoutError:
+                with self.__lock:
+                    self.timeouts += 1
+                return Quote()
+
+        try:
+            quote = fetch()
+        except BaseException as e:
+            with self.__lock:
+                del self.__in_flight[flight]
+            future.set_exception(e)
+            raise
+
+        with self.__lock:
+            if (quote.bid is not None) and (quote.ask is not None):
+                self.__entries[key] = (quote, time.time())
+            del self.__in_flight[flight]
+        future.set_result(quote)
+        return quote
+
+    def invalidate(self, exchange=None, symbol=None):
+        """
+        drop cached quotes. None matches everything.
+
+        @param exchange: name of the exchange
+        @param symbol: trading symbol
+        """
+        with self.__lock:
+            for key in list(self.__entries):
+                if (exchange is None or key[0] == exchange) and (symbol is None or key[1] == symbol):
+                    del self.__entries[key]
+
+    def stats(self) -> dict:
+        """
+        @return: a dict contains hit/miss counters. every hit or coalesced call is a request saved.
+        """
+        with self.__lock:
+            requests = self.hits + self.misses + self.coalesced
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "coalesced": self.coalesced,
+                    "timeouts": self.timeouts,
+                    "requests_saved": self.hits + self.coalesced,
+                    "hit_ratio": (self.hits + self.coalesced) / requests if requests else 0.0}
+
+
+# cache shared by all exchange instances of this process
+shared_quote_cache = QuoteCache()
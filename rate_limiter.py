@@ -0,0 +1,235 @@
+__author__ = 'Antares'
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+
+# priority classes, most urgent first
+ORDER = 0
+ACCOUNT = 1
+QUOTE = 2
+PRIORITY_NAMES = {ORDER: "order", ACCOUNT: "account", QUOTE: "quote"}
+
+# (requests per second, burst) per host, applied by rate_limiter_for. conservative, so that polling never gets
+# us throttled or banned:
+#   btc-e.com: 5 per second. its public data only changes every 2 seconds anyway.
+#   api.bitfinex.com: 1.5 per second (90 per minute), quotes, balances and orders together.
+# hosts not listed are not limited. change or remove an entry before the first exchange instance is created.
+DEFAULT_LIMITS = {"btc-e.com": (5.0, 10),
+                  "api.bitfinex.com": (1.5, 10)}
+
+# max time (seconds) a request waits for a token, per priority class. None to wait as long as it takes.
+# independent of the HTTP timeout: an order is better refused quickly than sent on a stale decision.
+DEFAULT_MAX_WAITS = {ORDER: 2.0,
+                     ACCOUNT: 10.0,
+                     QUOTE: 10.0}
+
+
+class RateLimiter(object):
+    """
+    a thread-safe token bucket that schedules waiting requests by priority.
+
+    the bucket holds up to burst tokens and refills at rate tokens per second; every request takes one.
+    when the bucket is empty, requests queue up and are served most urgent first (see ORDER, ACCOUNT, QUOTE),
+    in arrival order within a class. besides, the last reserve tokens are kept for ORDER requests,
+    so quote polling running at full rate does not delay an order.
+
+    threads wait with L{acquire}, coroutines with L{acquire_async}. both share the same tokens and queue.
+    """
+
+    def __init__(self, rate, burst=1, reserve=1):
+        """
+
+        @param rate: tokens per second
+        @param burst: capacity of the bucket
+        @param reserve: tokens only ORDER requests may take. must be less than burst.
+        @return:
+        """
+        if reserve >= burst:
+            raise ValueError("reserve ({}) must be less than burst ({})".format(reserve, burst))
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve
+
+        self.__tokens = float(burst)
+        self.__updated = time.monotonic()
+        self.__waiters = []  # heap of (priority, sequence)
+        self.__sequence = itertools.count()
+        self.__condition = threading.Condition()
+
+        # metrics
+        self.queued = dict((priority, 0) for priority in PRIORITY_NAMES)
+        self.max_queued = 0
+        self.acquired = 0
+        self.delayed = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+
+    def acquire(self, priority=QUOTE, timeout=None):
+        """
+        take a token, waiting for it if needed.
+
+        @param priority: ORDER, ACCOUNT or QUOTE
+        @param timeout: max time (seconds) to wait. None to wait as long as it takes.
+        @return: time (seconds) waited, or None if no token could be taken within timeout
+        """
+        need = 1 if priority == ORDER else 1 + self.reserve
+        start = time.monotonic()
+        with self.__condition:
+            if self.__take(start, need):
+                return 0.0
+
+            entry = self.__enqueue(priority)
+            try:
+                while True:
+                    done, waited, wait = self.__poll(entry, need, start, timeout)
+                    if done:
+                        return waited
+                    self.__condition.wait(wait)
+            finally:
+                self.queued[priority] -= 1
+
+    async def acquire_async(self, priority=QUOTE, timeout=None):
+        """
+        coroutine version of L{acquire}: waits with asyncio.sleep, so the event loop keeps running.
+
+        a coroutine is not woken up when the request ahead of it is served, so it checks again
+        at least every 1/rate seconds.
+
+        @param priority: ORDER, ACCOUNT or QUOTE
+        @param timeout: max time (seconds) to wait. None to wait as long as it takes.
+        @return: time (seconds) waited, or None if no token could be taken within timeout
+        """
+        need = 1 if priority == ORDER else 1 + self.reserve
+        start = time.monotonic()
+        with self.__condition:
+            if self.__take(start, need):
+                return 0.0
+            entry = self.__enqueue(priority)
+
+        try:
+            while True:
+                with self.__condition:
+                    done, waited, wait = self.__poll(entry, need, start, timeout)
+                if done:
+                    return waited
+                await asyncio.sleep(1 / self.rate if wait is None else min(wait, 1 / self.rate))
+        finally:
+            with self.__condition:
+                if entry in self.__waiters:  # cancelled while waiting
+                    self.__waiters.remove(entry)
+                    heapq.heapify(self.__waiters)
+                    self.__condition.notify_all()
+                self.queued[priority] -= 1
+
+    def share(self, parts):
+        """
+        @param parts: number of processes sharing the budget of this limiter
+        @return: a new RateLimiter with 1/parts of the rate and burst of this one (burst at least reserve + 1),
+        so that parts processes each limited by one stay within this limit together
+        """
+        return RateLimiter(self.rate / parts, max(self.reserve + 1, self.burst / parts), self.reserve)
+
+    def queue_depth(self) -> int:
+        """
+        @return: number of requests waiting for a token
+        """
+        return len(self.__waiters)
+
+    def stats(self) -> dict:
+        with self.__condition:
+            self.__refill(time.monotonic())
+            return {"rate": self.rate,
+                    "tokens": self.__tokens,
+                    "queue_depth": len(self.__waiters),
+                    "queued": dict((PRIORITY_NAMES[priority], n) for priority, n in self.queued.items()),
+                    "max_queued": self.max_queued,
+                    "acquired": self.acquired,
+                    "delayed": self.delayed,
+                    "timeouts": self.timeouts,
+                    "wait_time": self.wait_time}
+
+    def __take(self, now, need) -> bool:
+        """
+        take a token if one is free and nobody is waiting. must hold self.__condition.
+        """
+        self.__refill(now)
+        if self.__waiters or self.__tokens < need:
+            return False
+        self.__tokens -= 1
+        self.acquired += 1
+        return True
+
+    def __enqueue(self, priority) -> tuple:
+        """
+        must hold self.__condition.
+
+        @return: entry of the new waiter in self.__waiters
+        """
+        entry = (priority, next(self.__sequence))
+        heapq.heappush(self.__waiters, entry)
+        self.queued[priority] += 1
+        self.max_queued = max(self.max_queued, len(self.__waiters))
+        return entry
+
+    def __poll(self, entry, need, start, timeout) -> tuple:
+        """
+        serve the waiter entry if its token is due, drop it if its timeout is over. must hold self.__condition.
+
+        @return: (True, time waited or None if timed out, None) if entry left the queue,
+        (False, None, time (seconds) to wait before polling again or None until notified) otherwise
+        """
+        now = time.monotonic()
+        self.__refill(now)
+        head = self.__waiters[0] == entry
+        if head and self.__tokens >= need:
+            heapq.heappop(self.__waiters)
+            self.__tokens -= 1
+            self.__condition.notify_all()  # the next head may go on
+            waited = now - start
+            self.acquired += 1
+            self.delayed += 1
+            self.wait_time += waited
+            return True, waited, None
+
+        if (timeout is not None) and (now - start >= timeout):
+            self.__waiters.remove(entry)
+            heapq.heapify(self.__waiters)
+            self.__condition.notify_all()
+            self.timeouts += 1
+            return True, None, None
+
+        # the head sleeps until its token is due, the others until the head is served
+        wait = (need - self.__tokens) / self.rate if head else None
+        if timeout is not None:
+            remaining = timeout - (now - start)
+            wait = remaining if wait is None else min(wait, remaining)
+        return False, None, wait
+
+    def __refill(self, now):
+        """
+        must hold self.__condition.
+        """
+        self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+        self.__updated = now
+
+
+# limiters shared by all exchange instances of this process, one per host
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def rate_limiter_for(host) -> RateLimiter:
+    """
+    @param host: host of the exchange API
+    @return: the RateLimiter shared by all requests to host. limits are taken from DEFAULT_LIMITS,
+    hosts not listed are not limited (None).
+    """
+    with _limiters_lock:
+        if host not in _limiters:
+            limit = DEFAULT_LIMITS.get(host)
+            _limiters[host] = RateLimiter(*limit) if limit is not None else None
+        return _limiters[host]
@@ -0,0 +1,258 @@
+__author__ = 'Antares'
+
+#  append-only columnar storage of quotes for backtesting.
+#
+#  every quote is a fixed-width 32-byte little-endian record:
+#      time_stamp  int64   microseconds since epoch
+#      bid         int64   price * 10**price_places
+#      ask         int64   price * 10**price_places
+#      exchange    uint16  index into the "exchanges" list of the header
+#      symbol      uint16  index into the "symbols" list of the header
+#      (4 bytes of padding)
+#  the header is a JSON file next to the data file (<path>.json).
+#  the record layout is NumPy compatible (RECORD_DTYPE), so a file can be memory-mapped and scanned
+#  without parsing.
+
+from decimal import Decimal
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:  # numpy is only needed to read files as arrays
+    numpy = None
+
+from util import Quote
+
+
+RECORD = struct.Struct("<qqqHH4x")
+TIME_PLACES = 6
+
+if numpy is not None:
+    RECORD_DTYPE = numpy.dtype([("time_stamp", "<i8"),
+                                ("bid", "<i8"),
+                                ("ask", "<i8"),
+                                ("exchange", "<u2"),
+                                ("symbol", "<u2"),
+                                ("padding", "V4")])
+else:
+    RECORD_DTYPE = None
+
+
+def _read_header(path) -> dict:
+    with open(path + ".json") as f:
+        return json.load(f)
+
+
+class QuoteRecorder(object):
+    """
+    buffer quotes and append them in batches to a columnar quote file.
+
+    attach it to exchanges with L{attach} to record every quote they receive. thread-safe.
+    a background thread flushes the buffer once it holds batch_size quotes or is flush_interval old,
+    also when no more quotes come in. the files are written outside the lock of the buffer,
+    so recording a quote never waits for the disk.
+    """
+
+    def __init__(self, path, price_places=8, batch_size=4096, flush_interval=1.0):
+        """
+
+        @param path: data file. created if missing, appended to otherwise.
+        @param price_places: decimal places kept of bid and ask. ignored when appending to an existing file.
+        @param batch_size: flush when this many quotes are buffered
+        @param flush_interval: flush when the oldest buffered quote is older than this (seconds).
+        None to flush only on batch_size, flush() and close().
+        @return:
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        if os.path.exists(path + ".json"):
+            self.__header = _read_header(path)
+        else:
+            self.__header = {"version": 1, "price_places": price_places, "time_places": TIME_PLACES,
+                             "exchanges": [], "symbols": []}
+        self.__exchange_ids = dict((name, i) for i, name in enumerate(self.__header["exchanges"]))
+        self.__symbol_ids = dict((name, i) for i, name in enumerate(self.__header["symbols"]))
+        self.__header_dirty = True
+
+        self.__buffer = []
+        self.__buffer_time = None
+        self.__lock = threading.Lock()  # buffer and header
+        self.__due = threading.Condition(self.__lock)  # wakes the flush thread up
+        self.__closing = False
+        self.__write_lock = threading.Lock()  # files. batches are written in the order they were taken
+        self.__file = open(path, "ab")
+
+        # metrics
+        self.recorded = 0
+        self.flushes = 0
+
+        self.__flusher = threading.Thread(target=self.__run_flusher, name="QuoteRecorder.flush", daemon=True)
+        self.__flusher.start()
+
+    def attach(self, exchange):
+        """
+        record every quote the exchange receives from now on.
+
+        @param exchange: Exchange instance
+        """
+        exchange.add_quote_listener(self.record)
+
+    def detach(self, exchange):
+        exchange.remove_quote_listener(self.record)
+
+    def record(self, quote):
+        """
+        buffer a quote. empty quotes are ignored.
+
+        @param quote: Quote
+        """
+        if (quote.bid is None) or (quote.ask is None):
+            return
+
+        places = self.__header["price_places"]
+        with self.__lock:
+            packed = RECORD.pack(int(Decimal(quote.time_stamp).scaleb(TIME_PLACES)),
+                                 int(Decimal(quote.bid).scaleb(places)),
+                                 int(Decimal(quote.ask).scaleb(places)),
+                                 self.__id(self.__exchange_ids, "exchanges", quote.exchange),
+                                 self.__id(self.__symbol_ids, "symbols", quote.symbol))
+            self.__buffer.append(packed)
+            if self.__buffer_time is None:
+                self.__buffer_time = time.time()
+                if self.flush_interval is not None:
+                    self.__due.notify()  # start the clock of the flush thread
+            if len(self.__buffer) == self.batch_size:
+                self.__due.notify()
+
+    def flush(self):
+        """
+        write the buffered quotes now, in the calling thread.
+        """
+        self.__flush()
+
+    def close(self):
+        with self.__lock:
+            self.__closing = True
+            self.__due.notify()
+        self.__flusher.join()
+        self.__flush()
+        with self.__write_lock:
+            self.__file.close()
+
+    def __run_flusher(self):
+        """
+        flush the buffer once it holds batch_size quotes or its oldest quote is flush_interval old, until close().
+        """
+        while True:
+            with self.__lock:
+                while not self.__closing:
+                    if len(self.__buffer) >= self.batch_size:
+                        break
+                    wait = None  # until record() fills a batch
+                    if (self.flush_interval is not None) and (self.__buffer_time is not None):
+                        wait = self.flush_interval - (time.time() - self.__buffer_time)
+                        if wait <= 0:
+                            break
+                    self.__due.wait(wait)
+                if self.__closing:
+                    return  # close() flushes what is left
+            self.__flush()
+
+    def __id(self, ids, key, name) -> int:
+        """
+        @return: index of name in the header list key, added if missing
+        """
+        index = ids.get(name)
+        if index is None:
+            index = len(self.__header[key])
+            self.__header[key].append(name)
+            ids[name] = index
+            self.__header_dirty = True
+        return index
+
+    def __flush(self):
+        """
+        take the buffer (and the header, if it changed) under the lock, write them outside of it.
+        """
+        with self.__write_lock:
+            with self.__lock:
+                batch, self.__buffer = self.__buffer, []
+                self.__buffer_time = None
+                header = json.dumps(self.__header) if self.__header_dirty else None
+                self.__header_dirty = False
+
+            if header is not None:
+                # the header is written first, so every id found in the data file is in it
+                with open(self.path + ".json.tmp", "w") as f:
+                    f.write(header)
+                os.replace(self.path + ".json.tmp", self.path + ".json")
+
+            if batch:
+                self.__file.write(b"".join(batch))
+                self.__file.flush()
+                self.recorded += len(batch)
+                self.flushes += 1
+
+
+class QuoteReader(object):
+    """
+    memory-mapped read access to a quote file written by QuoteRecorder.
+    """
+
+    def __init__(self, path):
+        """
+
+        @param path: data file
+        @return:
+        """
+        self.path = path
+        self.header = _read_header(path)
+        self.exchanges = self.header["exchanges"]
+        self.symbols = self.header["symbols"]
+        self.price_places = self.header["price_places"]
+        self.time_places = self.header["time_places"]
+
+    def __len__(self):
+        return os.path.getsize(self.path) // RECORD.size
+
+    def array(self):
+        """
+        map the file as a NumPy structured array (see RECORD_DTYPE). nothing is read until it is accessed.
+
+        @return: numpy.memmap, read-only
+        """
+        if numpy is None:
+            raise ImportError("numpy is required to read quote files as arrays")
+        if len(self) == 0:
+            return numpy.zeros(0, dtype=RECORD_DTYPE)
+        return numpy.memmap(self.path, dtype=RECORD_DTYPE, mode="r", shape=(len(self),))
+
+    def prices(self, field):
+        """
+        @param field: "bid" or "ask"
+        @return: numpy array of float prices
+        """
+        return self.array()[field] / 10 ** self.price_places
+
+    def __iter__(self):
+        """
+        decode every record into a Quote. slow, for inspection and small files; use L{array} for scans.
+        """
+        if len(self) == 0:
+            return
+        with open(self.path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for offset in range(0, len(self) * RECORD.size, RECORD.size):
+                    time_stamp, bid, ask, exchange, symbol = RECORD.unpack_from(data, offset)
+                    yield Quote(Decimal(bid).scaleb(-self.price_places),
+                                Decimal(ask).scaleb(-self.price_places),
+                                Decimal(time_stamp).scaleb(-self.time_places),
+                                self.exchanges[exchange],
+                                self.symbols[symbol])
@@ -0,0 +1,72 @@
+__author__ = 'Antares'
+
+import threading
+import time
+
+
+class QuoteRefresher(object):
+    """
+    keep exchange.most_recent_quote current from a background thread.
+
+    market orders of BTCe are priced from most_recent_quote, so keeping it fresh takes the quote request
+    off the order placement path. pair it with the exchange's max_quote_age to refuse orders
+    when the refresher falls behind (e.g. the venue stopped answering).
+    """
+
+    def __init__(self, exchange, interval=1.0, timeout=None):
+        """
+
+        @param exchange: exchange with get_quote() and a most_recent_quote attribute
+        @param interval: pause (seconds) between two quotes
+        @param timeout: timeout (seconds) of every quote request. None for interval.
+        @return:
+        """
+        self.exchange = exchange
+        self.interval = interval
+        self.timeout = interval if timeout is None else timeout
+
+        self.__stop = threading.Event()
+        self.__thread = None
+
+        # metrics
+        self.refreshes = 0
+        self.failures = 0
+        self.last_refresh = None
+
+    def start(self):
+        if self.__thread is None:
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__run, name="{}.QuoteRefresher".format(self.exchange.name),
+                                             daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    @property
+    def age(self):
+        """
+        @return: seconds since the last successful refresh, or None if there was none
+        """
+        if self.last_refresh is None:
+            return None
+        return time.time() - self.last_refresh
+
+    def __run(self):
+        while not self.__stop.is_set():
+            try:
+                quote = self.exchange.get_quote(timeout=self.timeout)
+            except Exception as e:
+                self.exchange.logger.error("QuoteRefresher failure. Msg: %s", e, exc_info=True)
+                quote = None
+
+            if (quote is not None) and (quote.bid is not None) and (quote.ask is not None):
+                self.exchange.most_recent_quote = quote
+                self.refreshes += 1
+                self.last_refresh = time.time()
+            else:
+                self.failures += 1  # keep the old quote, its age tells how stale it is
+            self.__stop.wait(self.interval)
@@ -0,0 +1,281 @@
+__author__ = 'Antares'
+
+import asyncio
+from http.client import HTTPException
+import random
+import threading
+import time
+
+
+class FatalError(Exception):
+    """
+    raised for an answer that will not get better by retrying (e.g. invalid API key, not enough funds).
+    """
+
+    def __init__(self, message, answer=None):
+        super().__init__(message)
+        self.answer = answer
+
+
+class RetryError(Exception):
+    """
+    raised when a RetryPolicy gives up (attempts or deadline exhausted).
+    """
+
+    def __init__(self, message, attempts, reason=None):
+        super().__init__(message)
+        self.attempts = attempts
+        self.reason = reason
+
+
+def is_fatal(message, patterns) -> bool:
+    """
+    @param message: error message of an exchange answer
+    @param patterns: lower case substrings of fatal error messages
+    @return: True if message matches any pattern
+    """
+    message = str(message).lower()
+    return any(pattern in message for pattern in patterns)
+
+
+class CircuitBreaker(object):
+    """
+    stop hammering an exchange that keeps failing.
+
+    after failure_threshold consecutive failures the breaker opens and no attempt is allowed for reset_timeout
+    seconds. then a single probe is let through (half open): success closes the breaker, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0):
+        """
+
+        @param failure_threshold: consecutive failures that open the breaker
+        @param reset_timeout: time (seconds) the breaker stays open before letting a probe through
+        @return:
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.__failures = 0
+        self.__opened = None
+        self.__probing = False
+        self.__lock = threading.Lock()
+
+        # metrics
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """
+        @return: True if an attempt may be made now
+        """
+        with self.__lock:
+            if self.state == self.CLOSED:
+                return True
+            if (self.state == self.OPEN) and (time.monotonic() - self.__opened >= self.reset_timeout):
+                self.state = self.HALF_OPEN
+                self.__probing = False
+            if (self.state == self.HALF_OPEN) and not self.__probing:
+                self.__probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self.__lock:
+            self.state = self.CLOSED
+            self.__failures = 0
+            self.__probing = False
+
+    def record_failure(self):
+        with self.__lock:
+            self.__failures += 1
+            if (self.state == self.HALF_OPEN) or (self.__failures >= self.failure_threshold):
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.__opened = time.monotonic()
+                self.__probing = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.__failures, "trips": self.trips, "rejected": self.rejected}
+
+
+# classes of calls that fail independently: the public API (quotes, order books) and the private API
+# (balances, orders) are often served by different hosts or backends. a public API outage must not block orders.
+PUBLIC = "public"
+PRIVATE = "private"
+
+# breakers shared by all exchange instances of this process, one per exchange and class of calls
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker_for(name, calls=PRIVATE) -> CircuitBreaker:
+    """
+    @param name: name of the exchange
+    @param calls: PUBLIC or PRIVATE
+    @return: the CircuitBreaker of the calls shared by all instances of the exchange
+    """
+    key = (name, calls)
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker()
+        return _breakers[key]
+
+
+class RetryPolicy(object):
+    """
+    retry an attempt with exponential backoff and full jitter, within a deadline.
+
+    an attempt fails if it returns None or raises one of retry_on (network and decoding errors).
+    FatalError and any other exception are not retried.
+    """
+
+    def __init__(self, base=0.05, cap=2.0, multiplier=2.0, max_attempts=None, deadline=30.0,
+                 retry_on=(OSError, ValueError, HTTPException), seed=None):
+        """
+
+        @param base: max pause (seconds) after the first failure
+        @param cap: max pause (seconds) after any failure
+        @param multiplier: growth of the max pause per failure
+        @param max_attempts: give up after so many attempts. None for no limit.
+        @param deadline: give up after so many seconds. None for no limit: an exchange that stays down
+        would then block the caller forever.
+        @param retry_on: exceptions of an attempt that are retried
+        @param seed: seed of the jitter, for reproducible runs
+        @return:
+        """
+        self.base = base
+        self.cap = cap
+        self.multiplier = multiplier
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.retry_on = retry_on
+        self.random = random.Random(seed)
+
+    def with_base(self, base):
+        """
+        @param base: see __init__
+        @return: a copy of this policy with another base (and a cap at least as big)
+        """
+        return RetryPolicy(base=base, cap=max(base, self.cap), multiplier=self.multiplier,
+                           max_attempts=self.max_attempts, deadline=self.deadline, retry_on=self.retry_on)
+
+    def delay(self, failures) -> float:
+        """
+        @param failures: failures so far (>= 1)
+        @return: pause (seconds) before the next attempt, uniform in [0, min(cap, base * multiplier ** (failures-1))]
+        """
+        return self.random.uniform(0, min(self.cap, self.base * self.multiplier ** (failures - 1)))
+
+    def run(self, attempt, breaker=None, on_retry=None):
+        """
+        call attempt until it returns something other than None.
+
+        @param attempt: function with no arguments
+        @param breaker: CircuitBreaker of the exchange. attempts it rejects count as failures, without a request.
+        @param on_retry: function(failures, reason) called before every pause
+        @return: the result of attempt
+        @raise RetryError: attempts or deadline exhausted
+        @raise FatalError: see attempt
+        """
+        start = time.monotonic()
+        failures = 0
+        while True:
+            if (breaker is None) or breaker.allow():
+                try:
+                    result = attempt()
+                except Exception as e:
+                    result, reason = None, self.__raised(e, breaker)
+                else:
+                    reason = self.__returned(result, breaker)
+                if reason is None:
+                    return result
+            else:
+                reason = "circuit open"
+            failures += 1
+            delay = self.__next_delay(failures, reason, start)
+            if on_retry is not None:
+                on_retry(failures, reason)
+            time.sleep(delay)
+
+    async def run_async(self, attempt, breaker=None, on_retry=None):
+        """
+        like L{run}, for a coroutine function attempt. pauses do not block the event loop.
+        """
+        start = time.monotonic()
+        failures = 0
+        while True:
+            if (breaker is None) or breaker.allow():
+                try:
+                    result = await attempt()
+                except Exception as e:
+                    result, reason = None, self.__raised(e, breaker)
+                else:
+                    reason = self.__returned(result, breaker)
+                if reason is None:
+                    return result
+            else:
+                reason = "circuit open"
+            failures += 1
+            delay = self.__next_delay(failures, reason, start)
+            if on_retry is not None:
+                on_retry(failures, reason)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def __returned(result, breaker):
+        """
+        record an attempt that returned result.
+
+        @return: None on success, reason of the failure otherwise
+        """
+        if result is not None:
+            if breaker is not None:
+                breaker.record_success()
+            return None
+        if breaker is not None:
+            breaker.record_failure()
+        return "invalid answer"
+
+    def __raised(self, error, breaker):
+        """
+        record an attempt that raised error.
+
+        @return: error, if it is retried
+        @raise: error, if it is not (see retry_on)
+        """
+        if isinstance(error, FatalError):
+            if breaker is not None:
+                breaker.record_success()  # the exchange is up, the request is wrong
+            raise error
+        if breaker is not None:
+            breaker.record_failure()  # e.g. a half open probe must not stay in flight forever
+        if isinstance(error, self.retry_on):
+            return error
+        raise error
+
+    def __next_delay(self, failures, reason, start) -> float:
+        """
+        @raise RetryError: if there is no attempt left
+        """
+        if (self.max_attempts is not None) and (failures >= self.max_attempts):
+            raise RetryError("gave up after {} attempts: {}".format(failures, reason), failures, reason)
+        delay = self.delay(failures)
+        if self.deadline is not None:
+            remaining = self.deadline - (time.monotonic() - start)
+            if remaining <= 0:
+                raise RetryError("gave up after {:.3f}s ({} attempts): {}".format(
+                    time.monotonic() - start, failures, reason), failures, reason)
+            delay = min(delay, remaining)
+        return delay
+
+
+# a single attempt, e.g. get_quote(retry=False)
+NO_RETRY = RetryPolicy(max_attempts=1)
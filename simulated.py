@@ -0,0 +1,188 @@
+__author__ = 'Antares'
+
+import json
+import random
+import threading
+import time
+
+from exchanges import Exchange, BTCe, Bitfinex
+
+
+class Replay(object):
+    """
+    recorded answers of an exchange, keyed by API method (e.g. "ticker", "getInfo", "/order/new").
+
+    answers of a key are replayed in order and start over at the end.
+    they are stored as JSON text and decoded on every replay, so callers may modify what they get
+    (BTCe converts the funds dict in place) and the decode cost of a real answer is kept.
+    """
+
+    def __init__(self, answers=None):
+        """
+
+        @param answers: {key: [answer, ...]}
+        @return:
+        """
+        self.__answers = {}
+        self.__positions = {}
+        self.__lock = threading.Lock()
+        for key, values in (answers or {}).items():
+            for answer in values:
+                self.add(key, answer)
+
+    @classmethod
+    def load(cls, path):
+        """
+        @param path: JSON file {key: [answer, ...]}, e.g. written by L{save}
+        @return: Replay
+        """
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        with self.__lock:
+            answers = dict((key, [json.loads(text) for text in texts]) for key, texts in self.__answers.items())
+        with open(path, "w") as f:
+            json.dump(answers, f, indent=1)
+
+    def add(self, key, answer):
+        """
+        record an answer.
+
+        @param key: API method the answer belongs to
+        @param answer: decoded answer
+        """
+        with self.__lock:
+            self.__answers.setdefault(key, []).append(json.dumps(answer))
+
+    def payloads(self, key) -> list:
+        """
+        @param key: API method
+        @return: the recorded answers of key as JSON bytes, as they come from the network
+        """
+        with self.__lock:
+            return [text.encode() for text in self.__answers.get(key, [])]
+
+    def next(self, key):
+        """
+        @param key: API method
+        @return: the next recorded answer, or None if nothing was recorded for key
+        """
+        with self.__lock:
+            texts = self.__answers.get(key)
+            if not texts:
+                return None
+            position = self.__positions.get(key, 0)
+            self.__positions[key] = (position + 1) % len(texts)
+        return json.loads(texts[position])
+
+
+def btce_replay(symbol="ltc_usd") -> Replay:
+    """
+    @return: Replay of a BTCe account trading symbol, shaped like the answers of BTCe API v3 / Trade API v1
+    """
+    funds = {"usd": 1000.0, symbol.split("_")[0]: 10.0}
+    return Replay({
+        "None": [{"success": 0, "error": "invalid nonce parameter; on key:1000, you sent:0"}],
+        "ticker": [{symbol: {"high": 4.1, "low": 3.9, "avg": 4.0, "vol": 10000.0, "vol_cur": 2500.0,
+                             "last": 4.0, "buy": round(4.001 + i / 1000, 3), "sell": round(3.999 + i / 1000, 3),
+                             "updated": 1400000000 + i}} for i in range(10)],
+        "depth": [{symbol: {"asks": [[4.001, 1.5], [4.002, 3.0], [4.01, 10.0], [4.1, 50.0]],
+                            "bids": [[3.999, 2.0], [3.99, 4.0], [3.95, 12.0], [3.9, 40.0]]}}],
+        "getInfo": [{"success": 1, "return": {"funds": funds, "rights": {"info": 1, "trade": 1},
+                                              "transaction_count": 0, "open_orders": 0,
+                                              "server_time": 1400000000}}],
+        "Trade": [{"success": 1, "return": {"received": 0.1, "remains": 0, "order_id": 0, "funds": funds}}],
+    })
+
+
+def bitfinex_replay(symbol="ltcusd") -> Replay:
+    """
+    @return: Replay of a Bitfinex account trading symbol, shaped like the answers of Bitfinex API v1
+    """
+    order = {"id": 1, "symbol": symbol, "exchange": "bitfinex", "price": "4.0", "avg_execution_price": "4.0",
+             "side": "buy", "type": "exchange market", "timestamp": "1400000000.0", "is_live": False,
+             "is_cancelled": False, "was_forced": False, "original_amount": "0.1",
+             "remaining_amount": "0.0", "executed_amount": "0.1"}
+    return Replay({
+        "/pubticker": [{"mid": "4.0", "bid": "{:.3f}".format(3.999 + i / 1000), "ask": "{:.3f}".format(4.001 + i / 1000),
+                        "last_price": "4.0", "timestamp": "{}.0".format(1400000000 + i)} for i in range(10)],
+        "/book": [{"bids": [{"price": "3.999", "amount": "2.0", "timestamp": "1400000000.0"},
+                            {"price": "3.99", "amount": "4.0", "timestamp": "1400000000.0"}],
+                   "asks": [{"price": "4.001", "amount": "1.5", "timestamp": "1400000000.0"},
+                            {"price": "4.01", "amount": "8.0", "timestamp": "1400000000.0"}]}],
+        "/balances": [[{"type": "exchange", "currency": "usd", "amount": "1000.0", "available": "1000.0"},
+                       {"type": "exchange", "currency": symbol[:3], "amount": "10.0", "available": "10.0"}]],
+        "/order/new": [dict(order, order_id=1)],
+        "/order/status": [order],
+        "/orders": [[]],
+    })
+
+
+class SimulatedExchange(Exchange):
+    """
+    serve the raw answers of an exchange from a Replay instead of the network.
+
+    combine with a real exchange class (see L{SimulatedBTCe}, L{SimulatedBitfinex}),
+    so that everything above get_authenticated_data / get_unauthenticated_data is the production code.
+    latency and errors can be injected to see how the stack copes with a slow or flaky venue.
+    """
+
+    def __init__(self, replay, latency=0.0, jitter=0.0, error_rate=0.0, seed=None, **kwargs):
+        """
+
+        @param replay: Replay to serve answers from
+        @param latency: delay (seconds) added to every answer
+        @param jitter: random extra delay (seconds), uniform in [0, jitter)
+        @param error_rate: probability that a request fails (returns None, like a network error)
+        @param seed: seed of the random generator, for reproducible runs
+        @param kwargs: arguments of the real exchange class
+        @return:
+        """
+        self.replay = replay
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+        # metrics
+        self.requests = 0
+        self.errors = 0
+
+        super().__init__(**kwargs)
+
+    def get_authenticated_data(self, method, params, timeout=None):
+        return self.__answer(str(method))
+
+    def get_unauthenticated_data(self, method, symbol, timeout=None):
+        return self.__answer(method)
+
+    def __answer(self, key):
+        self.requests += 1
+        delay = self.latency + (self.random.random() * self.jitter if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return None
+        return self.replay.next(key)
+
+
+class SimulatedBTCe(SimulatedExchange, BTCe):
+    """
+    BTCe served from a Replay. see SimulatedExchange.
+    """
+
+    def __init__(self, replay=None, symbol="ltc_usd", fee_rate="0.002", api_key="", secret="", **kwargs):
+        SimulatedExchange.__init__(self, replay if replay is not None else btce_replay(symbol),
+                                   api_key=api_key, secret=secret, symbol=symbol, fee_rate=fee_rate, **kwargs)
+
+
+class SimulatedBitfinex(SimulatedExchange, Bitfinex):
+    """
+    Bitfinex served from a Replay. see SimulatedExchange.
+    """
+
+    def __init__(self, replay=None, symbol="ltcusd", fee_rate="0.001", api_key="", secret="", **kwargs):
+        SimulatedExchange.__init__(self, replay if replay is not None else bitfinex_replay(symbol),
+                                   api_key=api_key, secret=secret, symbol=symbol, fee_rate=fee_rate, **kwargs)
@@ -0,0 +1,142 @@
+__author__ = 'Antares'
+
+import asyncio
+from decimal import Decimal
+import json
+
+import pytest
+
+from async_exchanges import AsyncBitfinex, AsyncConnectionPool
+from retry import RetryPolicy
+
+
+class FakeAsyncPool(object):
+    """
+    stands for async_exchanges.AsyncConnectionPool. answers are scripted per path as in
+    test_rest_exchanges.FakePool: bytes, an exception to raise, or a list of those consumed one per request.
+    """
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.sent = []  # (method, path)
+
+    async def request(self, method, url, body=b"", headers=None, timeout=None) -> bytes:
+        self.sent.append((method, url))
+        answer = self.answers[url]
+        if isinstance(answer, list):
+            answer = answer.pop(0) if len(answer) > 1 else answer[0]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def encode(answer) -> bytes:
+    return json.dumps(answer).encode()
+
+
+BALANCES = encode([{"type": "exchange", "currency": "usd", "amount": "12.5", "available": "12.5"}])
+
+
+def make_bitfinex(status, order_max_wait=60.0):
+    exchange = AsyncBitfinex("key", "secret", "ltcusd", "0.001", master_name="tests", poll_interval=0.001,
+                             order_max_wait=order_max_wait)
+    exchange.connection_pool = FakeAsyncPool({"/v1/order/new": encode({"order_id": 5, "is_live": True}),
+                                              "/v1/order/status": status,
+                                              "/v1/balances": BALANCES})
+    exchange.rate_limiter = None
+    exchange.circuit_breaker = None
+    exchange.quote_circuit_breaker = None
+    exchange.retry_policy = RetryPolicy(base=0.001, cap=0.001, max_attempts=5)
+    return exchange
+
+
+def test_bitfinex_order_status_survives_undecodable_answer():
+    exchange = make_bitfinex([b"<html>502</html>", encode({"id": 5, "is_live": False})])
+    balance = asyncio.run(exchange.market_buy(Decimal("0.1")))
+    assert balance["usd"] == Decimal("12.5")
+
+
+def test_bitfinex_order_wait_is_bounded():
+    exchange = make_bitfinex([encode({"id": 5, "is_live": True})], order_max_wait=0.02)
+    balance = asyncio.run(exchange.market_buy(Decimal("0.1")))
+    assert balance["usd"] == Decimal("12.5")
+    assert exchange.connection_pool.sent[-1] == ("POST", "/v1/balances")
+
+
+def test_bitfinex_undecodable_quote_is_empty():
+    exchange = make_bitfinex([encode({"id": 5, "is_live": False})])
+    exchange.connection_pool.answers["/v1/pubticker/ltcusd"] = b"<html>502</html>"
+    quote = asyncio.run(exchange.get_quote())
+    assert quote.bid is None
+
+
+def test_connect_timeout(monkeypatch):
+    async def unreachable(*args, **kwargs):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(asyncio, "open_connection", unreachable)
+    pool = AsyncConnectionPool("example.com")
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(pool.request("GET", "/", timeout=0.01))
+    assert pool.handshakes == 0
+
+
+class FakeStream(object):
+    """
+    stands for the (reader, writer) pair of asyncio.open_connection. answers one request with "ok",
+    then behaves as a connection the server closed while it was idle.
+    """
+
+    def __init__(self):
+        self.lines = [b"HTTP/1.1 200 OK\r\n", b"Content-Length: 2\r\n", b"\r\n"]
+        self.body = b"ok"
+        self.written = []
+
+    async def readline(self):
+        return self.lines.pop(0) if self.lines else b""
+
+    async def readexactly(self, n):
+        body, self.body = self.body, b""
+        return body
+
+    def write(self, data):
+        self.written.append(data)
+
+    async def drain(self):
+        pass
+
+    def is_closing(self):
+        return False
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    opened = []
+
+    async def open_connection(*args, **kwargs):
+        stream = FakeStream()
+        opened.append(stream)
+        return stream, stream
+
+    monkeypatch.setattr(asyncio, "open_connection", open_connection)
+    return opened
+
+
+@pytest.mark.parametrize("method, resent", [("GET", True), ("POST", False)])
+def test_stale_connection_resends_only_idempotent_requests(streams, method, resent):
+    pool = AsyncConnectionPool("example.com")
+
+    async def two_requests():
+        await pool.request(method, "/a")
+        return await pool.request(method, "/b")
+
+    if resent:
+        assert asyncio.run(two_requests()) == b"ok"
+        assert pool.reconnects == 1
+    else:
+        with pytest.raises(ConnectionResetError):
+            asyncio.run(two_requests())
+        assert len(streams) == 1
@@ -0,0 +1,81 @@
+__author__ = 'Antares'
+
+from decimal import Decimal
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from backtest import BacktestExchange, mean_reversion_grid, _moving_average
+
+
+def random_ticks(n=400, seed=7):
+    generator = numpy.random.default_rng(seed)
+    mid = 100 * numpy.exp(numpy.cumsum(generator.normal(0, 0.003, n)))
+    spread = generator.uniform(0.01, 0.05, n)
+    return mid - spread, mid + spread
+
+
+def replay(bids, asks, window, threshold, fee_rate, amount, adjust_buy_amount):
+    """
+    the strategy of mean_reversion_grid, tick by tick on a BacktestExchange.
+
+    @return: (profit in currency, number of fills)
+    """
+    start = Decimal(10 ** 6)
+    exchange = BacktestExchange(bids, asks, numpy.arange(len(bids), dtype=numpy.float64), "ltc_usd", fee_rate,
+                                balance={"usd": start}, adjust_buy_amount=adjust_buy_amount)
+    mids = (numpy.asarray(bids) + numpy.asarray(asks)) / 2
+    holding = [False]
+
+    def strategy(exchange, quote):
+        i = exchange.position
+        if exchange.exhausted:  # close at the last tick
+            if holding[0]:
+                exchange.market_sell(exchange.balance["ltc"])
+            return
+        if i < window - 1:
+            return
+        average = mids[i - window + 1:i + 1].mean()
+        if (not holding[0]) and (mids[i] < average * (1 - threshold)):
+            exchange.market_buy(amount)
+            holding[0] = True
+        elif holding[0] and (mids[i] > average * (1 + threshold)):
+            exchange.market_sell(exchange.balance["ltc"])
+            holding[0] = False
+
+    balance = exchange.run(strategy)
+    return float(balance["usd"] - start), len(exchange.trades)
+
+
+@pytest.mark.parametrize("adjust_buy_amount", [False, True])
+def test_grid_matches_replay(adjust_buy_amount):
+    bids, asks = random_ticks()
+    windows = [1, 5, 20, 50]
+    thresholds = [0.0, 0.002, 0.005]
+    grid = mean_reversion_grid(bids, asks, windows, thresholds, "0.002", amount=2.0,
+                               adjust_buy_amount=adjust_buy_amount, chunk=2)
+
+    for w, window in enumerate(windows):
+        for k, threshold in enumerate(thresholds):
+            pnl, trades = replay(bids, asks, window, threshold, "0.002", Decimal(2), adjust_buy_amount)
+            assert grid["trades"][w, k] == trades
+            assert grid["pnl"][w, k] == pytest.approx(pnl, rel=1e-9, abs=1e-6)
+
+
+@pytest.mark.parametrize("window", [1, 4, 300])
+def test_moving_average_keeps_precision(window):
+    # large prices over many ticks: a single running sum of them is off by far more than this
+    generator = numpy.random.default_rng(1)
+    mid = 1e9 + numpy.cumsum(generator.normal(0, 50, 200000))
+    averages = _moving_average(mid, window)
+    assert len(averages) == len(mid) - window + 1
+    for end in range(window - 1, len(mid), 997):
+        assert averages[end - window + 1] == pytest.approx(mid[end - window + 1:end + 1].mean(), rel=0, abs=1e-5)
+
+
+@pytest.mark.parametrize("window", [0, -1, 11])
+def test_window_out_of_range(window):
+    bids, asks = random_ticks(10)
+    with pytest.raises(ValueError):
+        mean_reversion_grid(bids, asks, [window], [0.01], "0.002")
@@ -0,0 +1,152 @@
+__author__ = 'Antares'
+
+import http.client
+
+import pytest
+
+from connection_pool import ConnectionPool
+
+
+class FakeSocket(object):
+
+    def __init__(self):
+        self.timeout = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+
+class FakeResponse(object):
+
+    def __init__(self, body, will_close=False):
+        self.body = body
+        self.will_close = will_close
+
+    def read(self):
+        return self.body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class FakeConnection(object):
+    """
+    stands for http.client.HTTPSConnection. fail_next makes the next request raise the given error,
+    fail_response makes the next response raise it, after the request was written.
+    """
+    opened = []
+
+    def __init__(self, host, timeout=None):
+        self.host = host
+        self.timeout = timeout
+        self.sock = None
+        self.fail_next = None
+        self.fail_response = None
+        self.requests = 0
+        FakeConnection.opened.append(self)
+
+    def connect(self):
+        self.sock = FakeSocket()
+        self.sock.settimeout(self.timeout)
+
+    def close(self):
+        self.sock = None
+
+    def request(self, method, url, body, headers):
+        if self.fail_next is not None:
+            error, self.fail_next = self.fail_next, None
+            raise error
+        self.requests += 1
+
+    def getresponse(self):
+        if self.fail_response is not None:
+            error, self.fail_response = self.fail_response, None
+            raise error
+        return FakeResponse(b"ok")
+
+
+@pytest.fixture
+def pool():
+    FakeConnection.opened = []
+    return ConnectionPool("example.com", size=2, timeout=None, connection_class=FakeConnection)
+
+
+def test_connection_is_reused(pool):
+    assert pool.request("GET", "/a") == b"ok"
+    assert pool.request("GET", "/b") == b"ok"
+    assert len(FakeConnection.opened) == 1
+    stats = pool.stats()
+    assert stats["handshakes"] == 1
+    assert stats["requests"] == 2
+    assert stats["reused"] == 1
+
+
+def test_stale_connection_is_replaced(pool):
+    pool.request("GET", "/a")
+    FakeConnection.opened[0].fail_next = http.client.RemoteDisconnected("closed")
+    assert pool.request("GET", "/b") == b"ok"
+    assert len(FakeConnection.opened) == 2
+    assert FakeConnection.opened[0].sock is None
+    stats = pool.stats()
+    assert stats["reconnects"] == 1
+    assert stats["reused"] == 0
+    assert stats["handshakes"] == 2
+
+
+def test_idempotent_request_is_resent_after_stale_response(pool):
+    pool.request("GET", "/a")
+    FakeConnection.opened[0].fail_response = http.client.RemoteDisconnected("closed")
+    assert pool.request("GET", "/b") == b"ok"
+    assert pool.stats()["reconnects"] == 1
+
+
+def test_post_is_not_resent_once_written(pool):
+    pool.request("POST", "/a")
+    FakeConnection.opened[0].fail_response = http.client.RemoteDisconnected("closed")
+    with pytest.raises(http.client.RemoteDisconnected):
+        pool.request("POST", "/trade")
+    assert len(FakeConnection.opened) == 1
+    assert pool.stats()["reconnects"] == 0
+
+
+def test_post_is_resent_if_not_written(pool):
+    pool.request("POST", "/a")
+    FakeConnection.opened[0].fail_next = BrokenPipeError()
+    assert pool.request("POST", "/trade") == b"ok"
+    assert FakeConnection.opened[1].requests == 1
+
+
+def test_error_on_new_connection_is_raised(pool):
+    class FailingConnection(FakeConnection):
+        def request(self, method, url, body, headers):
+            raise ConnectionResetError("reset")
+
+    pool.connection_class = FailingConnection
+    with pytest.raises(ConnectionResetError):
+        pool.request("GET", "/a")
+    assert pool.stats()["reconnects"] == 0
+
+
+def test_request_timeout_bounds_new_connections(pool):
+    pool.request("GET", "/a", timeout=3)
+    assert FakeConnection.opened[0].timeout == 3
+
+
+def test_request_timeout_bounds_reconnects(pool):
+    pool.request("GET", "/a", timeout=3)
+    FakeConnection.opened[0].fail_next = BrokenPipeError()
+    pool.request("GET", "/b", timeout=7)
+    assert FakeConnection.opened[1].timeout == 7
+    assert FakeConnection.opened[1].sock.timeout == 7
+
+
+def test_pool_timeout_is_the_default():
+    FakeConnection.opened = []
+    pool = ConnectionPool("example.com", timeout=11, connection_class=FakeConnection)
+    pool.request("GET", "/a")
+    assert FakeConnection.opened[0].timeout == 11
+    pool.request("GET", "/b", timeout=2)
+    assert FakeConnection.opened[0].sock.timeout == 2
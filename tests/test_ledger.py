@@ -0,0 +1,77 @@
+__author__ = 'Antares'
+
+from decimal import Decimal
+import logging
+
+from ledger import Ledger
+
+
+class FakeExchange(object):
+    """
+    answers get_balance() with a scripted balance. during_request is called while the request is in flight.
+    """
+    name = "Fake"
+    logger = logging.getLogger("tests.Fake")
+
+    def __init__(self, funds, during_request=None):
+        self.funds = funds
+        self.during_request = during_request
+        self.requests = 0
+
+    def get_balance(self) -> dict:
+        self.requests += 1
+        if self.during_request is not None:
+            self.during_request()
+        return dict(self.funds, time_stamp=Decimal(0))
+
+
+def test_fills_update_the_balance():
+    ledger = Ledger()
+    ledger.set_balance("Fake", {"ltc": 0, "usd": 100, "time_stamp": 0})
+    ledger.apply_fill("Fake", "ltc", "usd", "buy", Decimal(2), Decimal(10), Decimal("0.01"))
+    ledger.apply_fill("Fake", "ltc", "usd", "sell", Decimal(1), Decimal(20), Decimal("0.01"))
+    balance = ledger.balance("Fake")
+    assert balance["ltc"] == Decimal("0.98")
+    assert balance["usd"] == Decimal(80) + Decimal("19.8")
+    assert ledger.total() == {"ltc": Decimal("0.98"), "usd": Decimal("99.8")}
+
+
+def test_reconcile_is_due():
+    ledger = Ledger(reconcile_interval=None, reconcile_fills=2)
+    assert ledger.needs_reconcile("Fake")  # never synced
+    ledger.set_balance("Fake", {"ltc": 1})
+    ledger.apply_fill("Fake", "ltc", "usd", "sell", 1, 10, 0)
+    assert not ledger.needs_reconcile("Fake")
+    ledger.apply_fill("Fake", "ltc", "usd", "sell", 1, 10, 0, certain=False)
+    assert ledger.needs_reconcile("Fake")
+    ledger.set_balance("Fake", {"ltc": 1})
+    ledger.invalidate("Fake")
+    assert ledger.needs_reconcile("Fake")
+
+
+def test_balance_of_asks_the_exchange_only_when_due():
+    ledger = Ledger(reconcile_interval=None)
+    exchange = FakeExchange({"ltc": Decimal(1)})
+    assert ledger.balance_of(exchange)["ltc"] == Decimal(1)
+    assert ledger.balance_of(exchange)["ltc"] == Decimal(1)
+    assert exchange.requests == 1
+
+
+def test_reconcile_reports_drift():
+    ledger = Ledger()
+    ledger.set_balance("Fake", {"ltc": Decimal(1), "usd": Decimal(10)})
+    ledger.reconcile(FakeExchange({"ltc": Decimal("0.9"), "usd": Decimal(10)}))
+    assert ledger.stats() == {"fills": 0, "reconciliations": 1, "drifts": 1}
+    assert ledger.balance("Fake")["ltc"] == Decimal("0.9")
+
+
+def test_fill_racing_reconcile_is_not_drift():
+    ledger = Ledger()
+    ledger.set_balance("Fake", {"ltc": Decimal(0), "usd": Decimal(100)})
+
+    def fill():  # the exchange may or may not have counted this fill in its answer
+        ledger.apply_fill("Fake", "ltc", "usd", "buy", Decimal(1), Decimal(10), Decimal(0))
+
+    ledger.reconcile(FakeExchange({"ltc": Decimal(1), "usd": Decimal(90)}, during_request=fill))
+    assert ledger.stats()["drifts"] == 0
+    assert ledger.balance("Fake")["ltc"] == Decimal(1)
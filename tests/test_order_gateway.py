@@ -0,0 +1,107 @@
+__author__ = 'Antares'
+
+from decimal import Decimal
+import logging
+
+import pytest
+
+from order_gateway import OrderGateway
+from util import Quote
+
+
+class FakeLedger(object):
+
+    def __init__(self, funds):
+        self.funds = funds
+
+    def balance(self, name) -> dict:
+        return dict(self.funds)
+
+
+class FakeExchange(object):
+    """
+    fills market orders at fixed prices, with the fee taken from what is received.
+    like BTCe, a buy of amount spends amount/(1-fee_rate) at the ask.
+    """
+    name = "Fake"
+    symbol = "ltc_usd"
+    logger = logging.getLogger("tests.Fake")
+
+    def __init__(self, fee_rate="0.002", ledger=None):
+        self.fee_rate = Decimal(fee_rate)
+        self.ledger = ledger
+        self.most_recent_quote = Quote(Decimal(99), Decimal(101), Decimal(0), self.name, self.symbol)
+        self.orders = []  # (side, amount)
+
+    def market_buy(self, amount) -> dict:
+        self.orders.append(("buy", amount))
+        executed = amount / (1 - self.fee_rate)
+        return self.__trade(amount, -executed * 101)
+
+    def market_sell(self, amount) -> dict:
+        self.orders.append(("sell", amount))
+        return self.__trade(-amount, amount * 99 * (1 - self.fee_rate))
+
+    def __trade(self, asset, currency) -> dict:
+        if self.ledger is None:
+            return {}
+        self.ledger.funds["ltc"] += asset
+        self.ledger.funds["usd"] += currency
+        return dict(self.ledger.funds)
+
+
+def run_batch(gateway, orders) -> list:
+    futures = [gateway.submit(side, amount) for side, amount in orders]
+    return [future.result(timeout=5) for future in futures]
+
+
+def test_opposing_orders_are_netted():
+    exchange = FakeExchange()
+    gateway = OrderGateway(exchange, window=0.05)
+    buy, sell = run_batch(gateway, [("buy", 3), ("sell", 1)])
+    assert exchange.orders == [("buy", Decimal(2))]
+    assert gateway.stats()["netted"] == Decimal(1)
+    assert gateway.stats()["requests_saved"] == 1
+    assert (sell["crossed"], sell["price"], sell["fee"]) == (Decimal(1), Decimal(100), Decimal(0))
+    assert buy["crossed"] == Decimal(1)
+    assert buy["price"] == (Decimal(100) + 2 * Decimal(101)) / 3  # no balances: priced at the ask
+
+
+def test_orders_that_cancel_out_send_nothing():
+    exchange = FakeExchange()
+    gateway = OrderGateway(exchange, window=0.05)
+    fills = run_batch(gateway, [("buy", 2), ("sell", 2)])
+    assert exchange.orders == []
+    assert all((fill["crossed"], fill["price"], fill["fee"]) == (Decimal(2), Decimal(100), Decimal(0))
+               for fill in fills)
+
+
+def test_exchange_fill_is_split_in_proportion():
+    exchange = FakeExchange(ledger=FakeLedger({"ltc": Decimal(0), "usd": Decimal(1000)}))
+    gateway = OrderGateway(exchange, window=0.05)
+    small, large = run_batch(gateway, [("buy", 1), ("buy", 3)])
+    assert exchange.orders == [("buy", Decimal(4))]
+    assert small["price"] == large["price"] == pytest.approx(Decimal(101))
+    # the fee is on the amount executed, amount/(1-fee_rate), not on the amount received
+    executed = Decimal(4) / (1 - exchange.fee_rate)
+    assert small["fee"] + large["fee"] == pytest.approx(executed * exchange.fee_rate)
+    assert large["fee"] == pytest.approx(3 * small["fee"])
+
+
+def test_no_quote_is_requested():
+    class LazyExchange(FakeExchange):
+        cached_quote = None
+
+        @property
+        def most_recent_quote(self):
+            raise AssertionError("most_recent_quote must not be requested")
+
+        @most_recent_quote.setter
+        def most_recent_quote(self, quote):
+            pass
+
+    exchange = LazyExchange()
+    gateway = OrderGateway(exchange, window=0.01)
+    fill, = run_batch(gateway, [("sell", 1)])
+    assert exchange.orders == [("sell", Decimal(1))]
+    assert fill["price"] is None
@@ -0,0 +1,41 @@
+__author__ = 'Antares'
+
+import asyncio
+
+from rate_limiter import RateLimiter, ORDER, QUOTE
+
+
+def test_async_acquire_waits_without_blocking_the_loop():
+    limiter = RateLimiter(rate=50.0, burst=2, reserve=1)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(None)
+            await asyncio.sleep(0.001)
+
+    async def main():
+        await limiter.acquire_async(ORDER)
+        await limiter.acquire_async(ORDER)  # bucket empty from here
+        waited, _ = await asyncio.gather(limiter.acquire_async(QUOTE), ticker())
+        return waited
+
+    waited = asyncio.run(main())
+    assert waited > 0
+    assert len(ticks) == 5
+    assert limiter.stats()["queue_depth"] == 0
+
+
+def test_async_acquire_timeout_leaves_the_queue():
+    limiter = RateLimiter(rate=0.1, burst=2, reserve=1)
+    assert limiter.acquire(ORDER) == 0.0
+    assert asyncio.run(limiter.acquire_async(QUOTE, timeout=0.01)) is None
+    stats = limiter.stats()
+    assert (stats["queue_depth"], stats["timeouts"]) == (0, 1)
+
+
+def test_share_splits_the_budget():
+    limiter = RateLimiter(rate=5.0, burst=10, reserve=1)
+    share = limiter.share(4)
+    assert (share.rate, share.burst, share.reserve) == (1.25, 2.5, 1)
+    assert limiter.share(20).burst == 2
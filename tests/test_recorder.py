@@ -0,0 +1,38 @@
+__author__ = 'Antares'
+
+from decimal import Decimal
+import time
+
+from recorder import QuoteRecorder, QuoteReader
+from util import Quote
+
+
+def quote(i) -> Quote:
+    return Quote(Decimal("4.001") + i, Decimal("4.003") + i, Decimal(1400000000 + i), "BTCe", "ltc_usd")
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+
+def test_full_batch_is_flushed_by_the_flush_thread(tmp_path):
+    path = str(tmp_path / "quotes")
+    recorder = QuoteRecorder(path, batch_size=3, flush_interval=None)
+    for i in range(3):
+        recorder.record(quote(i))
+    assert wait_for(lambda: recorder.recorded == 3)
+    assert [q.bid for q in QuoteReader(path)] == [Decimal("4.001"), Decimal("5.001"), Decimal("6.001")]
+    recorder.close()
+
+
+def test_old_quotes_are_flushed_and_close_writes_the_rest(tmp_path):
+    path = str(tmp_path / "quotes")
+    recorder = QuoteRecorder(path, batch_size=100, flush_interval=0.01)
+    recorder.record(quote(0))
+    assert wait_for(lambda: recorder.recorded == 1)
+    recorder.record(quote(1))
+    recorder.close()
+    assert list(QuoteReader(path)) == [quote(0), quote(1)]
@@ -0,0 +1,259 @@
+__author__ = 'Antares'
+
+import base64
+from decimal import Decimal
+import json
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+from exchanges import RestExchange, BTCe, Bitfinex, BTCChina, OKCoin, StaleQuoteError
+from ledger import Ledger
+from quote_cache import QuoteCache
+from retry import RetryPolicy, RetryError, FatalError
+
+
+class FakePool(object):
+    """
+    stands for connection_pool.ConnectionPool. answers are scripted per path (without query string):
+    bytes, an exception to raise, or a list of those consumed one per request.
+    """
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.sent = []  # (method, path, body, headers)
+
+    def request(self, method, url, body=None, headers=None, timeout=None) -> bytes:
+        self.sent.append((method, url, body, headers))
+        answer = self.answers[urllib.parse.urlsplit(url).path]
+        if isinstance(answer, list):
+            answer = answer.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    def stats(self) -> dict:
+        return {"requests": len(self.sent)}
+
+
+def encode(answer) -> bytes:
+    return json.dumps(answer).encode()
+
+
+def offline(exchange, private=None, public=None):
+    """
+    cut exchange off the network: fake pools, no rate limit, no circuit breaker, fast retries.
+    """
+    exchange.connection_pool = FakePool(private or {})
+    exchange.public_pool = FakePool(public or {})
+    exchange.rate_limiter = None
+    exchange.circuit_breaker = None
+    exchange.quote_circuit_breaker = None
+    exchange.retry_policy = RetryPolicy(base=0.001, cap=0.001, max_attempts=5)
+    return exchange
+
+
+def test_hooks_are_abstract():
+    class Incomplete(RestExchange):
+        name = "Incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete("key", "secret", "ltc_usd", "0.002")
+
+
+# BTCe
+
+# "sell" is the price the pair can be sold at (bid), "buy" the price it can be bought at (ask)
+BTCE_TICKER = {"ltc_usd": {"sell": 3.999, "buy": 4.001, "updated": 1400000000}}
+
+
+def make_btce(private=None):
+    exchange = BTCe("key", "secret", "ltc_usd", "0.002", master_name="tests", lazy=True)
+    return offline(exchange, private, {"/api/3/ticker/ltc_usd": encode(BTCE_TICKER)})
+
+
+def test_btce_quote():
+    before = time.time()
+    quote = make_btce().get_quote()
+    assert (quote.bid, quote.ask, quote.updated) == (Decimal("3.999"), Decimal("4.001"), Decimal(1400000000))
+    assert before <= quote.time_stamp <= time.time()  # received, not updated by BTCe
+
+
+def test_btce_same_ticker_is_published_once():
+    exchange = make_btce()
+    published = []
+    exchange.add_quote_listener(published.append)
+    exchange.get_quote()
+    exchange.get_quote()
+    assert len(published) == 1
+
+
+def test_btce_retrying_caller_waits_for_the_shared_request():
+    exchange = make_btce()
+    exchange.quote_cache = QuoteCache(ttl={"BTCe": 0})
+    request = exchange.public_pool.request
+
+    def slow_request(*args, **kwargs):
+        time.sleep(0.2)
+        return request(*args, **kwargs)
+
+    exchange.public_pool.request = slow_request
+    leader = threading.Thread(target=exchange.get_quote, kwargs={"retry": True, "timeout": 0.01})
+    leader.start()
+    time.sleep(0.05)
+    quote = exchange.get_quote(retry=True, timeout=0.01)
+    leader.join()
+    assert quote.bid == Decimal("3.999")
+    assert exchange.quote_cache.stats()["coalesced"] == 1
+
+
+def test_btce_nonce_discovery_and_balance():
+    funds = {"usd": 10, "ltc": 2}
+    exchange = make_btce({"/tapi": [encode({"success": 0, "error": "invalid nonce parameter; on key:41, you sent:0"}),
+                                    encode({"success": 1, "return": {"funds": funds, "server_time": 1400000000}})]})
+    balance = exchange.get_balance()
+    assert (balance["usd"], balance["ltc"]) == (Decimal(10), Decimal(2))
+    assert "nonce=42" in exchange.connection_pool.sent[-1][2]
+
+
+def test_btce_nonce_discovery_gives_up_at_the_deadline():
+    exchange = make_btce({"/tapi": encode({"success": 0, "error": "invalid sign"})})
+    exchange.wait_time = 0.01
+    exchange.retry_policy = RetryPolicy(base=0.001, cap=0.001, deadline=0.05)
+    with pytest.raises(RetryError):
+        exchange.get_balance()
+
+
+def test_btce_empty_quote_is_not_kept():
+    exchange = make_btce()
+    exchange.nonce_allocator.reset(1)
+    exchange.public_pool.answers["/api/3/ticker/ltc_usd"] = [ConnectionResetError()] * 5 + [encode(BTCE_TICKER)]
+    with pytest.raises(StaleQuoteError):
+        exchange.market_buy(Decimal("0.1"))
+    assert exchange.cached_quote is None
+    assert exchange.most_recent_quote.bid == Decimal("3.999")
+
+
+def test_btce_order_balance_goes_to_the_ledger():
+    ledger = Ledger()
+    exchange = make_btce({"/tapi": encode({"success": 1, "return": {"order_id": 0, "received": 0.1,
+                                                                    "funds": {"usd": 9.6, "ltc": 0.1}}})})
+    exchange.ledger = ledger
+    exchange.nonce_allocator.reset(1)
+    exchange.market_buy(Decimal("0.1"))
+    assert not ledger.needs_reconcile("BTCe")
+    assert ledger.balance("BTCe")["ltc"] == Decimal("0.1")
+
+
+def test_btce_ledger_argument():
+    ledger = Ledger()
+    assert BTCe("key", "secret", "ltc_usd", "0.002", master_name="tests", lazy=True, ledger=ledger).ledger is ledger
+
+
+def test_btce_fatal_error():
+    exchange = make_btce({"/tapi": encode({"success": 0, "error": "It is not enough USD for purchase"})})
+    exchange.nonce_allocator.reset(1)
+    exchange.get_quote()
+    with pytest.raises(FatalError):
+        exchange.market_buy(Decimal("0.1"))
+
+
+# Bitfinex
+
+def make_bitfinex(private=None):
+    exchange = Bitfinex("key", "secret", "ltcusd", "0.001", master_name="tests")
+    return offline(exchange, private,
+                   {"/v1/pubticker/ltcusd": [ConnectionResetError(), b"<html>502</html>",
+                                             encode({"bid": "3.99", "ask": "4.01", "timestamp": "1400000000.0"})],
+                    "/v1/book/ltcusd": encode({"bids": [{"price": "3.99", "amount": "5"}],
+                                               "asks": [{"price": "4.01", "amount": "7"}]})})
+
+
+def test_bitfinex_quote_after_network_and_decode_errors():
+    quote = make_bitfinex().get_quote(retry=True)
+    assert (quote.bid, quote.ask) == (Decimal("3.99"), Decimal("4.01"))
+
+
+def test_bitfinex_signed_balance():
+    exchange = make_bitfinex({"/v1/balances": encode([{"type": "exchange", "currency": "usd", "amount": "12.5",
+                                                       "available": "12.5"}])})
+    balance = exchange.get_balance()
+    assert balance["usd"] == Decimal("12.5")
+    headers = exchange.connection_pool.sent[-1][3]
+    assert headers["X-BFX-APIKEY"] == "key"
+    assert json.loads(base64.b64decode(headers["X-BFX-PAYLOAD"]))["request"] == "/v1/balances"
+
+
+def test_bitfinex_fatal_error():
+    exchange = make_bitfinex({"/v1/order/new": encode({"message": "Invalid order: not enough balance"})})
+    with pytest.raises(FatalError):
+        exchange.place_market_order(exchange._market_order_params("buy", Decimal("0.1")))
+
+
+# BTCChina
+
+def make_btcchina(private=None):
+    exchange = BTCChina("key", "secret", "btccny", "0", master_name="tests")
+    return offline(exchange, private,
+                   {"/data/ticker": encode({"ticker": {"buy": "20.01", "sell": "20.03", "last": "20.02"}}),
+                    "/data/orderbook": encode({"bids": [[20.01, 1.5]], "asks": [[20.03, 2]]})})
+
+
+def test_btcchina_quote_and_depth():
+    exchange = make_btcchina()
+    quote = exchange.get_quote()
+    assert (quote.bid, quote.ask) == (Decimal("20.01"), Decimal("20.03"))
+    fast = exchange.get_fast_quote()
+    assert fast.to_quote().bid == Decimal("20.01")
+    assert exchange._parse_depth(exchange.get_unauthenticated_data("orderbook", "btccny")) == \
+        ([(Decimal("20.01"), Decimal("1.5"))], [(Decimal("20.03"), Decimal("2"))])
+    assert exchange.public_pool.sent[0][1] == "/data/ticker?market=btccny"
+
+
+def test_btcchina_market_order():
+    exchange = make_btcchina({"/api_trade_v1.php": [encode({"result": 7, "id": 1}),
+                                                    encode({"result": {"balance": {"cny": {"amount": "5"}}}})]})
+    balance = exchange.market_sell(Decimal("0.5"))
+    assert balance["cny"] == Decimal(5)
+    _, _, body, headers = exchange.connection_pool.sent[0]
+    request = json.loads(body)
+    assert (request["method"], request["params"]) == ("sellOrder2", [None, "0.5", "BTCCNY"])
+    assert headers["Authorization"].startswith("Basic ")
+    assert headers["Json-Rpc-Tonce"] == str(request["id"])
+
+
+def test_btcchina_fatal_error():
+    exchange = make_btcchina({"/api_trade_v1.php": encode({"error": {"code": -32003, "message": "Insufficient CNY"}})})
+    with pytest.raises(FatalError):
+        exchange.market_buy(Decimal("0.5"))
+
+
+# OKCoin
+
+def make_okcoin(private=None):
+    exchange = OKCoin("key", "secret", "ltc_cny", "0", master_name="tests")
+    return offline(exchange, private, {"/api/v1/ticker.do": encode({"ticker": {"buy": "30.1", "sell": "30.3"}})})
+
+
+def test_okcoin_quote():
+    quote = make_okcoin().get_quote()
+    assert (quote.bid, quote.ask) == (Decimal("30.1"), Decimal("30.3"))
+
+
+def test_okcoin_market_buy_spends_amount_at_the_ask():
+    exchange = make_okcoin({"/api/v1/trade.do": encode({"result": True, "order_id": 9}),
+                            "/api/v1/userinfo.do": encode({"result": True,
+                                                           "info": {"funds": {"free": {"ltc": "1", "cny": "0"}}}})})
+    balance = exchange.market_buy(Decimal(1))
+    assert balance["ltc"] == Decimal(1)
+    fields = dict(urllib.parse.parse_qsl(exchange.connection_pool.sent[0][2]))
+    assert (fields["type"], fields["price"]) == ("buy_market", "30.30")
+    assert len(fields["sign"]) == 32 and fields["sign"] == fields["sign"].upper()
+
+
+def test_okcoin_fatal_error():
+    exchange = make_okcoin({"/api/v1/trade.do": encode({"result": False, "error_code": 10010})})
+    with pytest.raises(FatalError):
+        exchange.market_sell(Decimal(1))
@@ -0,0 +1,67 @@
+__author__ = 'Antares'
+
+import asyncio
+
+import pytest
+
+from retry import RetryPolicy, RetryError, FatalError, CircuitBreaker
+
+
+def scripted(outcomes):
+    """
+    @param outcomes: results to return or exceptions to raise, one per attempt
+    @return: (sync attempt, async attempt) sharing the script
+    """
+    outcomes = list(outcomes)
+
+    def attempt():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def attempt_async():
+        return attempt()
+
+    return attempt, attempt_async
+
+
+def run(policy, outcomes, breaker, asynchronous):
+    attempt, attempt_async = scripted(outcomes)
+    if asynchronous:
+        return asyncio.run(policy.run_async(attempt_async, breaker=breaker))
+    return policy.run(attempt, breaker=breaker)
+
+
+def test_default_policy_has_a_deadline():
+    assert RetryPolicy().deadline is not None
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_failures_are_retried_and_recorded(asynchronous):
+    policy = RetryPolicy(base=0.001, cap=0.001)
+    breaker = CircuitBreaker(failure_threshold=3)
+    assert run(policy, [None, ConnectionResetError(), "ok"], breaker, asynchronous) == "ok"
+    assert breaker.stats()["failures"] == 0
+    with pytest.raises(RetryError):
+        run(RetryPolicy(base=0.001, cap=0.001, max_attempts=2), [None, ValueError()], breaker, asynchronous)
+    assert breaker.stats()["failures"] == 2
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_fatal_and_unexpected_errors_are_raised(asynchronous):
+    policy = RetryPolicy(base=0.001, cap=0.001)
+    breaker = CircuitBreaker(failure_threshold=3)
+    with pytest.raises(KeyError):
+        run(policy, [KeyError()], breaker, asynchronous)
+    assert breaker.stats()["failures"] == 1
+    with pytest.raises(FatalError):
+        run(policy, [FatalError("not enough funds")], breaker, asynchronous)
+    assert breaker.stats()["failures"] == 0  # the exchange answered
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_deadline_gives_up(asynchronous):
+    policy = RetryPolicy(base=0.001, cap=0.001, deadline=0.02)
+    with pytest.raises(RetryError):
+        run(policy, [None] * 10000, None, asynchronous)